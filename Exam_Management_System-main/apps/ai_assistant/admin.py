@@ -1,23 +1,263 @@
-from django.contrib import admin
+import time
+from typing import Callable, List, Optional, Tuple
+
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.urls import reverse
+
+from . import sharding
 from .models import ChatSession, ChatMessage
+from .pagination import EstimatedCountPaginator
+
+# Bulk actions work through the selection in batches and stop after a time
+# budget, so "select all" on a huge changelist cannot hang the request.
+BULK_ACTION_BATCH_SIZE = 500
+BULK_ACTION_SECONDS = 10.0
+
+
+def run_in_batches(queryset, handle: Callable[[List[int]], None],
+                   batch_size: Optional[int] = None, seconds: Optional[float] = None) -> Tuple[int, bool]:
+    """Call handle(ids) for id batches of queryset; returns (rows handled, finished)"""
+    batch_size = batch_size or BULK_ACTION_BATCH_SIZE
+    deadline = time.monotonic() + (BULK_ACTION_SECONDS if seconds is None else seconds)
+    ids_query = queryset.order_by('pk').values_list('pk', flat=True)
+    done = 0
+    last_id = 0
+    while True:
+        ids = list(ids_query.filter(pk__gt=last_id)[:batch_size])
+        if not ids:
+            return done, True
+        handle(ids)
+        done += len(ids)
+        last_id = ids[-1]
+        if time.monotonic() >= deadline:
+            return done, not ids_query.filter(pk__gt=last_id).exists()
+
+
+class UserFilter(admin.SimpleListFilter):
+    """
+    Filter by user through the admin's autocomplete view, without listing
+    every user in the sidebar. The value is a user id; a username typed in
+    the URL works too.
+    """
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/ai_assistant/autocomplete_filter.html'
+    user_path = 'user'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        value = (self.value() or '').strip()
+        user = None
+        if value:
+            users = get_user_model().objects.all()
+            user = users.filter(pk=value).first() if value.isdigit() else users.filter(username=value).first()
+        field = ChatSession._meta.get_field('user')
+        yield {
+            'parameter_name': self.parameter_name,
+            'value': user.pk if user else '',
+            'label': str(user) if user else '',
+            'url': reverse('admin:autocomplete'),
+            'app_label': field.model._meta.app_label,
+            'model_name': field.model._meta.model_name,
+            'field_name': field.name,
+            'query_parts': [(k, v) for k, v in changelist.params.items() if k not in (self.parameter_name, PAGE_VAR)],
+            'clear_url': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if not sharding.enabled():
+            if value.isdigit():
+                return queryset.filter(**{f'{self.user_path}_id': int(value)})
+            return queryset.filter(**{f'{self.user_path}__username': value})
+        # Users are in another database: resolve the name first, then read the user's shard
+        user_id = int(value) if value.isdigit() else (
+            get_user_model().objects.filter(username=value).values_list('pk', flat=True).first()
+        )
+        if user_id is None:
+            return queryset.none()
+        return queryset.using(sharding.shard_for_user(user_id)).filter(**{f'{self.user_path}_id': user_id})
+
+
+class MessageUserFilter(UserFilter):
+    user_path = 'session__user'
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Which database's rows are listed, when chat data is sharded (sharding.py)"""
+    title = 'database'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.databases()]
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value()) if self.value() in sharding.databases() else queryset
+
+    def choices(self, changelist):
+        current = self.value() or 'default'
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}, [PAGE_VAR]),
+                'display': title,
+            }
+
+
+def attach_users(owners):
+    """Set the user of each row owning a user_id, from one query on the users' database"""
+    owners = [owner for owner in owners if owner is not None]
+    users = get_user_model().objects.in_bulk({owner.user_id for owner in owners})
+    for owner in owners:
+        if owner.user_id in users:
+            owner._meta.get_field('user').set_cached_value(owner, users[owner.user_id])
+
+
+class ShardedChangeList(ChangeList):
+    """Loads the users of a page of sharded rows at once, as the join to them cannot"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        for path in self.model_admin.user_paths():
+            steps = path.split('__')[:-1]
+            owners = []
+            for row in self.result_list:
+                for step in steps:
+                    row = getattr(row, step) if row is not None else None
+                owners.append(row)
+            attach_users(owners)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings that keep large tables responsive"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'created_at'
+
+    def sharded(self) -> bool:
+        return sharding.enabled() and sharding.is_sharded(self.model)
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        return [ShardFilter, *list_filter] if self.sharded() else list_filter
+
+    @property
+    def media(self):
+        media = super().media
+        if any(isinstance(f, type) and issubclass(f, UserFilter) for f in self.list_filter):
+            media += AutocompleteSelect(ChatSession._meta.get_field('user'), self.admin_site).media
+        return media
+
+    def user_paths(self) -> List[str]:
+        """list_select_related paths ending at a user"""
+        related = self.list_select_related
+        if isinstance(related, bool):
+            return []
+        return [path for path in related if path == 'user' or path.endswith('__user')]
+
+    def get_changelist(self, request, **kwargs):
+        return ShardedChangeList if self.sharded() else super().get_changelist(request, **kwargs)
+
+    def get_list_select_related(self, request):
+        related = super().get_list_select_related(request)
+        if not self.sharded() or isinstance(related, bool):
+            return related
+        # No joins to users: they are in another database than the listed rows
+        return [path[:-len('__user')] if path.endswith('__user') else path for path in related if path != 'user']
+
+    def get_search_fields(self, request):
+        fields = super().get_search_fields(request)
+        if not self.sharded():
+            return fields
+        return [field for field in fields if not field.startswith(('user__', 'session__user__'))]
+
+    def get_object(self, request, object_id, from_field=None):
+        if not self.sharded() or from_field is not None:
+            return super().get_object(request, object_id, from_field)
+        try:
+            object_id = self.model._meta.pk.to_python(object_id)
+        except ValidationError:
+            return None
+        # Ids are unique across shards: look in each
+        return sharding.find(self.get_queryset(request), object_id)
+
+    def get_actions(self, request):
+        # The stock action collects every selected object before deleting
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def report_batches(self, request, verb: str, done: int, finished: bool):
+        name = self.model._meta.verbose_name_plural
+        if finished:
+            self.message_user(request, f'{verb} {done} {name}.', messages.SUCCESS)
+        else:
+            self.message_user(
+                request,
+                f'{verb} {done} {name} before the {BULK_ACTION_SECONDS:g}s limit; run the action again to continue.',
+                messages.WARNING,
+            )
 
 
 @admin.register(ChatSession)
-class ChatSessionAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'title', 'created_at', 'updated_at']
-    list_filter = ['created_at', 'user']
+class ChatSessionAdmin(ScalableAdmin):
+    list_display = ['id', 'user', 'title', 'message_count', 'created_at', 'updated_at']
+    list_filter = ['created_at', UserFilter]
+    list_select_related = ['user']
     search_fields = ['user__username', 'title']
-    readonly_fields = ['created_at', 'updated_at']
+    autocomplete_fields = ['user']
+    readonly_fields = ['created_at', 'updated_at', 'message_count', 'last_message_at', 'last_message_preview']
+    actions = ['delete_in_batches', 'refresh_message_counters']
+
+    @admin.action(description='Delete selected chat sessions (in batches)', permissions=['delete'])
+    def delete_in_batches(self, request, queryset):
+        def delete(ids):
+            with transaction.atomic(using=queryset.db):
+                ChatSession.objects.using(queryset.db).filter(pk__in=ids).delete()
+        self.report_batches(request, 'Deleted', *run_in_batches(queryset, delete))
+
+    @admin.action(description='Recompute message counters', permissions=['change'])
+    def refresh_message_counters(self, request, queryset):
+        def refresh(ids):
+            for session in ChatSession.objects.using(queryset.db).filter(pk__in=ids).only('pk'):
+                session.refresh_counters()
+        self.report_batches(request, 'Refreshed', *run_in_batches(queryset, refresh))
 
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(ScalableAdmin):
     list_display = ['id', 'session', 'role', 'created_at']
-    list_filter = ['role', 'created_at', 'session__user']
+    list_filter = ['role', 'created_at', MessageUserFilter]
+    list_select_related = ['session__user']
     search_fields = ['content', 'session__user__username']
+    raw_id_fields = ['session']
     readonly_fields = ['created_at']
+    actions = ['delete_in_batches']
 
     def get_readonly_fields(self, request, obj=None):
         if obj:
             return self.readonly_fields + ['session', 'role', 'content']
         return self.readonly_fields
+
+    @admin.action(description='Delete selected chat messages (in batches)', permissions=['delete'])
+    def delete_in_batches(self, request, queryset):
+        def delete(ids):
+            with transaction.atomic(using=queryset.db):
+                messages = ChatMessage.objects.using(queryset.db).filter(pk__in=ids)
+                session_ids = set(messages.values_list('session_id', flat=True))
+                messages.delete()
+                for session in ChatSession.objects.using(queryset.db).filter(pk__in=session_ids).only('pk'):
+                    session.refresh_counters()
+        self.report_batches(request, 'Deleted', *run_in_batches(queryset, delete))
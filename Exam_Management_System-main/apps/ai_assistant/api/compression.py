@@ -0,0 +1,42 @@
+"""
+Response compression for the API: brotli when the client accepts it and
+the brotli package is installed, else gzip. Like Django's GZipMiddleware,
+small bodies are left alone and a strong ETag becomes weak once the body
+is re-encoded; conditional requests still match it (weak comparison).
+"""
+import re
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+MIN_SIZE = 200
+BROTLI_QUALITY = 5
+_accepts_br = re.compile(r'\bbr\b')
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def compress_response(request, response):
+    if response.streaming or response.has_header('Content-Encoding') or len(response.content) < MIN_SIZE:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if brotli is not None and _accepts_br.search(accept):
+        encoding, content = 'br', brotli.compress(response.content, quality=BROTLI_QUALITY)
+    elif _accepts_gzip.search(accept):
+        encoding, content = 'gzip', compress_string(response.content)
+    else:
+        return response
+    if len(content) >= len(response.content):
+        return response
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
@@ -0,0 +1,62 @@
+from rest_framework import serializers
+
+from ..models import ChatMessage, ChatSession, PracticeTest, Prediction, WeakArea
+
+
+class SparseFieldsMixin:
+    """?fields=id,content limits each object to the listed fields"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if requested:
+            unknown = requested - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {'fields': [f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(self.fields)}"]}
+                )
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+def requested_fields(request):
+    """The ?fields= set of a request, or None for all fields"""
+    if request is None:
+        return None
+    value = request.query_params.get('fields', '')
+    return {name.strip() for name in value.split(',') if name.strip()} or None
+
+
+class ChatSessionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'title', 'created_at', 'updated_at', 'message_count', 'last_message_at', 'last_message_preview']
+        read_only_fields = fields
+
+
+class ChatMessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ChatMessage
+        fields = ['id', 'session', 'role', 'content', 'created_at']
+        read_only_fields = fields
+
+
+class PredictionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Prediction
+        fields = ['id', 'session', 'exam_id', 'predicted_score', 'confidence', 'model_version', 'created_at']
+        read_only_fields = fields
+
+
+class PracticeTestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PracticeTest
+        fields = ['id', 'session', 'title', 'content', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class WeakAreaSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = WeakArea
+        fields = ['id', 'session', 'topic', 'severity', 'created_at']
+        read_only_fields = fields
@@ -0,0 +1,15 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+router = DefaultRouter()
+router.register('sessions', views.ChatSessionViewSet, basename='session')
+router.register(r'sessions/(?P<session_pk>\d+)/messages', views.ChatMessageViewSet, basename='message')
+router.register('predictions', views.PredictionViewSet, basename='prediction')
+router.register('practice-tests', views.PracticeTestViewSet, basename='practice-test')
+router.register('weak-areas', views.WeakAreaViewSet, basename='weak-area')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
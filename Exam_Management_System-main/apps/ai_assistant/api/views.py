@@ -0,0 +1,197 @@
+"""
+Version 1 of the read API: chat sessions, their messages, predictions,
+practice tests and weak areas of the requesting user.
+
+* Cursor pagination (?cursor=, ?page_size= up to 100): pages stay stable
+  while rows are added, and a client polling a session's messages keeps
+  following the `next` link to receive only new ones.
+* Sparse fieldsets: ?fields=id,content returns (and loads) only those fields.
+* Every GET carries an ETag and Last-Modified derived from cheap counters
+  (the session's denormalized message columns, or one aggregate query), so
+  a conditional request that matches gets a 304 without the rows being
+  read or serialized. Lists are revalidated by ETag only: Last-Modified
+  has whole seconds, and a row added in the same second must not be
+  missed by a client polling with If-Modified-Since.
+* Bodies are rendered with orjson when installed and compressed with
+  brotli or gzip (see renderers.py and compression.py).
+
+Messages still held by the write-behind buffer (writebehind.py) appear
+once they are flushed. Every query goes to the requesting user's shard
+when chat data is sharded (sharding.py).
+"""
+import hashlib
+from abc import ABCMeta, abstractmethod
+
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django_filters import rest_framework as filters
+from rest_framework import permissions, viewsets
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import BrowsableAPIRenderer
+
+from .. import sharding
+from ..models import ChatSession, PracticeTest, Prediction, WeakArea
+from . import serializers
+from .compression import compress_response
+from .renderers import FastJSONRenderer
+
+
+class NewestFirstPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SessionPagination(NewestFirstPagination):
+    ordering = ('-updated_at', '-id')
+
+
+class MessagePagination(NewestFirstPagination):
+    # Oldest first: the last page's `next` link is where new messages appear
+    ordering = ('created_at', 'id')
+    page_size = 50
+
+
+def user_sessions(request):
+    return request.user.chat_sessions.all() if request is not None else ChatSession.objects.none()
+
+
+class UserFilterSet(filters.FilterSet):
+    # ?session= is looked up among the user's sessions, in their shard
+    session = filters.ModelChoiceFilter(queryset=user_sessions)
+
+
+class UserFilterBackend(filters.DjangoFilterBackend):
+    filterset_base = UserFilterSet
+
+
+class ApiViewSet(viewsets.ReadOnlyModelViewSet, metaclass=ABCMeta):
+    """
+    Read-only, user-scoped viewset with conditional GETs, sparse fields and
+    compression. Subclasses define scoped_queryset().
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [UserFilterBackend]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    pagination_class = NewestFirstPagination
+    modified_field = 'created_at'
+
+    def get_queryset(self):
+        queryset = self.scoped_queryset()
+        requested = serializers.requested_fields(self.request)
+        if requested:
+            # Load just what is serialized, plus what the cursor orders by
+            concrete = {field.name for field in queryset.model._meta.concrete_fields}
+            ordering = {name.lstrip('-') for name in self.pagination_class.ordering}
+            queryset = queryset.only(*((requested & concrete) | ordering | {'id', self.modified_field}))
+        return queryset
+
+    @abstractmethod
+    def scoped_queryset(self):
+        """The requesting user's rows, in their shard"""
+
+    @property
+    def shard(self):
+        return sharding.shard_for_user(self.request.user)
+
+    # -- conditional requests ---------------------------------------------
+
+    def list_version(self, queryset):
+        """(version, last modified) of a list: one aggregate query"""
+        state = queryset.order_by().aggregate(newest=Max(self.modified_field), total=Count('id'), last=Max('id'))
+        return f"{state['total']}.{state['last']}.{state['newest']}", state['newest']
+
+    def object_version(self, obj):
+        modified = getattr(obj, self.modified_field)
+        return f'{obj.pk}.{modified}', modified
+
+    def list(self, request, *args, **kwargs):
+        version, modified = self.list_version(self.filter_queryset(self.get_queryset()))
+        return self.conditional(version, None) or self.validated(super().list(request, *args, **kwargs), version, modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        version, modified = self.object_version(self.get_object())
+        return self.conditional(version, modified) or self.validated(super().retrieve(request, *args, **kwargs), version, modified)
+
+    def etag(self, version):
+        # The same rows look different per page, field list and format
+        key = f'{self.request.user.pk}:{self.request.accepted_renderer.format}:{self.request.get_full_path()}:{version}'
+        return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+    def conditional(self, version, modified):
+        """A 304/412 response when the client's copy is current (modified None: by ETag only), else None"""
+        return get_conditional_response(
+            self.request, etag=self.etag(version), last_modified=int(modified.timestamp()) if modified else None,
+        )
+
+    def validated(self, response, version, modified):
+        response['ETag'] = self.etag(version)
+        if modified:
+            response['Last-Modified'] = http_date(modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(lambda rendered: compress_response(request, rendered))
+        return response
+
+
+class ChatSessionViewSet(ApiViewSet):
+    serializer_class = serializers.ChatSessionSerializer
+    pagination_class = SessionPagination
+    modified_field = 'updated_at'
+
+    def scoped_queryset(self):
+        return self.request.user.chat_sessions.all()
+
+
+class ChatMessageViewSet(ApiViewSet):
+    """Messages of one of the user's sessions: /sessions/<session_pk>/messages/"""
+    serializer_class = serializers.ChatMessageSerializer
+    pagination_class = MessagePagination
+    filterset_fields = ['role']
+
+    @property
+    def session(self):
+        if not hasattr(self, '_session'):
+            self._session = get_object_or_404(self.request.user.chat_sessions, id=self.kwargs['session_pk'])
+        return self._session
+
+    def scoped_queryset(self):
+        return self.session.messages.all()
+
+    def list_version(self, queryset):
+        # The session's denormalized columns change with every stored message: no extra query
+        session = self.session
+        modified = session.last_message_at or session.created_at
+        return f'{session.message_count}.{session.last_message_at}', modified
+
+
+class PredictionViewSet(ApiViewSet):
+    serializer_class = serializers.PredictionSerializer
+    filterset_fields = ['session', 'exam_id', 'model_version']
+
+    def scoped_queryset(self):
+        return Prediction.objects.using(self.shard).filter(session__user=self.request.user)
+
+
+class PracticeTestViewSet(ApiViewSet):
+    serializer_class = serializers.PracticeTestSerializer
+    modified_field = 'updated_at'  # content grows while the test is generated
+    filterset_fields = ['session']
+
+    def scoped_queryset(self):
+        return PracticeTest.objects.using(self.shard).filter(session__user=self.request.user)
+
+
+class WeakAreaViewSet(ApiViewSet):
+    serializer_class = serializers.WeakAreaSerializer
+    filterset_fields = ['session', 'topic']
+
+    def scoped_queryset(self):
+        return WeakArea.objects.using(self.shard).filter(session__user=self.request.user)
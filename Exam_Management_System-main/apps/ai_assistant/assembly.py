@@ -0,0 +1,314 @@
+"""
+Randomized exam-paper assembly.
+
+Produces many distinct but equivalent variants of a paper from a question
+pool. Every variant has exactly the requested questions per topic and per
+difficulty, total marks within a tolerance, and shares at most a given
+fraction of its questions with any earlier variant.
+
+Variants are drawn in batches. The (topic, difficulty) allocation comes
+from a small max-flow, so coverage and mix hold by construction. Within
+each cell a vectorized weighted sample picks the questions, weighted
+towards those used least so far. Variants whose marks miss the target
+are repaired greedily by swapping questions inside a cell. A variant
+that overlaps an earlier one too much has its shared questions swapped
+for unused ones with the same marks, or is redrawn. Variants are yielded
+as soon as they are accepted.
+"""
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_DIFFICULTY = 'medium'
+BATCH_SIZE = 256
+MAX_REPAIR_SWAPS = 8
+MAX_DRAWS_PER_VARIANT = 20
+
+
+class PaperSpec(NamedTuple):
+    topic_counts: Dict[str, int]                     # questions per topic
+    difficulty_mix: Optional[Dict[str, int]] = None  # questions per difficulty (None: any)
+    total_marks: Optional[int] = None
+    marks_tolerance: int = 0
+    max_overlap: float = 1.0                         # fraction shared with any earlier variant
+
+    @property
+    def size(self) -> int:
+        return sum(self.topic_counts.values())
+
+
+class Variant(NamedTuple):
+    index: int
+    question_ids: List[int]
+    total_marks: int
+
+
+class QuestionPool:
+    """Column arrays for a question bank"""
+
+    def __init__(self, ids: Sequence[int], topics: Sequence, difficulties: Sequence, marks: Sequence[int]):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.topic_labels, self.topics = np.unique(np.asarray(topics, dtype=str), return_inverse=True)
+        self.difficulty_labels, self.difficulties = np.unique(np.asarray(difficulties, dtype=str), return_inverse=True)
+        self.marks = np.asarray(marks, dtype=np.int64)
+        if not len(self.ids) == len(self.topics) == len(self.difficulties) == len(self.marks):
+            raise ValueError('Pool columns must have the same length')
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_questions(cls, questions) -> 'QuestionPool':
+        """Build from exams.Question rows: the subject is the topic"""
+        rows = [(q.id, str(q.subject_id), getattr(q, 'difficulty', None) or DEFAULT_DIFFICULTY, q.marks)
+                for q in questions]
+        return cls(*zip(*rows)) if rows else cls([], [], [], [])
+
+    @classmethod
+    def synthetic(cls, size: int, topics: int = 10, marks=(1, 2, 4, 5), seed: int = 0) -> 'QuestionPool':
+        rng = np.random.default_rng(seed)
+        return cls(
+            np.arange(1, size + 1),
+            [f'topic-{t}' for t in rng.integers(topics, size=size)],
+            rng.choice(['easy', 'medium', 'hard'], size=size, p=[0.4, 0.4, 0.2]),
+            rng.choice(marks, size=size),
+        )
+
+
+def _allocate(row_targets: np.ndarray, col_targets: np.ndarray, capacity: np.ndarray, rng) -> np.ndarray:
+    """
+    Questions per (topic, difficulty) cell meeting both margins, or ValueError.
+
+    Bipartite max-flow by augmenting paths; the graph has only
+    topics + difficulties nodes. Visiting edges in random order spreads
+    different batches over different feasible allocations.
+    """
+    rows, cols = capacity.shape
+    flow = np.zeros_like(capacity)
+    row_left = row_targets.copy()
+    col_left = col_targets.copy()
+    while row_left.any():
+        # BFS from rows with demand left, through cells with spare capacity
+        # (row -> col) or existing flow to undo (col -> row), to a col with demand left
+        parent = {}
+        queue = deque(('r', r) for r in rng.permutation(np.flatnonzero(row_left)))
+        for node in queue:
+            parent[node] = None
+        end = None
+        while queue and end is None:
+            kind, i = queue.popleft()
+            if kind == 'r':
+                for c in rng.permutation(cols):
+                    if flow[i, c] < capacity[i, c] and ('c', c) not in parent:
+                        parent[('c', c)] = (kind, i)
+                        if col_left[c]:
+                            end = ('c', c)
+                            break
+                        queue.append(('c', c))
+            else:
+                for r in rng.permutation(np.flatnonzero(flow[:, i])):
+                    if ('r', r) not in parent:
+                        parent[('r', r)] = (kind, i)
+                        queue.append(('r', r))
+        if end is None:
+            raise ValueError('The pool cannot satisfy the topic and difficulty counts')
+        node = end
+        while parent[node] is not None:
+            prev = parent[node]
+            if prev[0] == 'r':
+                flow[prev[1], node[1]] += 1
+            else:
+                flow[node[1], prev[1]] -= 1
+            node = prev
+        row_left[node[1]] -= 1
+        col_left[end[1]] -= 1
+    return flow
+
+
+class PaperAssembler:
+    def __init__(self, pool: QuestionPool, spec: PaperSpec, seed: Optional[int] = None,
+                 batch_size: int = BATCH_SIZE):
+        self.pool = pool
+        self.spec = spec
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self.size = spec.size
+        self.max_shared = int(spec.max_overlap * self.size)
+        self.usage = np.zeros(len(pool), dtype=np.int64)
+        # Row q lists the variants using question q (-1 padded); grows as needed
+        self.postings = np.full((len(pool), 64), -1, dtype=np.int32)
+        self.accepted = 0
+        self.stats = {'drawn': 0, 'marks_repaired': 0, 'overlap_repaired': 0, 'rejected': 0}
+
+        topic_index = {label: i for i, label in enumerate(pool.topic_labels)}
+        missing = [t for t in spec.topic_counts if t not in topic_index]
+        if missing:
+            raise ValueError(f'No questions for topics: {missing}')
+        self.row_targets = np.zeros(len(pool.topic_labels), dtype=np.int64)
+        for topic, count in spec.topic_counts.items():
+            self.row_targets[topic_index[topic]] = count
+
+        if spec.difficulty_mix:
+            difficulty_index = {label: i for i, label in enumerate(pool.difficulty_labels)}
+            missing = [d for d in spec.difficulty_mix if d not in difficulty_index]
+            if missing:
+                raise ValueError(f'No questions of difficulty: {missing}')
+            if sum(spec.difficulty_mix.values()) != self.size:
+                raise ValueError('Difficulty mix and topic counts must add up to the same number of questions')
+            self.col_targets = np.zeros(len(pool.difficulty_labels), dtype=np.int64)
+            for level, count in spec.difficulty_mix.items():
+                self.col_targets[difficulty_index[level]] = count
+            cell_of = pool.topics * len(pool.difficulty_labels) + pool.difficulties
+            shape = (len(pool.topic_labels), len(pool.difficulty_labels))
+        else:
+            # Difficulty is free: one column holding every question
+            self.col_targets = np.array([self.size])
+            cell_of = pool.topics.astype(np.int64)
+            shape = (len(pool.topic_labels), 1)
+        self.cell_members = [np.flatnonzero(cell_of == c) for c in range(shape[0] * shape[1])]
+        self.capacity = np.array([len(m) for m in self.cell_members]).reshape(shape)
+        self.cell_of = cell_of
+        # Questions grouped by (cell, marks): swapping inside a bucket keeps
+        # topic, difficulty and marks; swapping across a cell's buckets moves
+        # only the marks
+        self.mark_values = np.unique(pool.marks)
+        bucket_of = cell_of * len(self.mark_values) + np.searchsorted(self.mark_values, pool.marks)
+        n_buckets = len(self.cell_members) * len(self.mark_values)
+        self.bucket_order = np.argsort(bucket_of, kind='stable')
+        self.bucket_sizes = np.bincount(bucket_of, minlength=n_buckets)
+        self.bucket_starts = np.concatenate([[0], np.cumsum(self.bucket_sizes)[:-1]])
+        self.bucket_of = bucket_of
+
+    # -- sampling ---------------------------------------------------------
+
+    def _draw_batch(self, count: int) -> np.ndarray:
+        """(count, size) pool indices, one row per candidate variant"""
+        allocation = _allocate(self.row_targets, self.col_targets, self.capacity, self.rng).ravel()
+        columns = []
+        for cell in np.flatnonzero(allocation):
+            members = self.cell_members[cell]
+            k = allocation[cell]
+            # Weighted sampling without replacement (Efraimidis-Spirakis):
+            # the k largest log(u) / w, with w favouring little-used questions
+            weights = 1.0 / (1.0 + self.usage[members])
+            keys = np.log(self.rng.random((count, len(members)))) / weights
+            picked = np.argpartition(-keys, k - 1, axis=1)[:, :k] if k < len(members) else \
+                np.broadcast_to(np.arange(len(members)), (count, k))
+            columns.append(members[picked])
+        self.stats['drawn'] += count
+        return np.concatenate(columns, axis=1)
+
+    # -- repair -----------------------------------------------------------
+
+    def _repair_marks(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Greedy, batch-wide marks repair; returns which rows now fit.
+
+        Each round, every row that misses the target swaps the one question
+        (for one of a different mark value in the same cell) that brings
+        its total closest to the target.
+        """
+        spec = self.spec
+        marks = self.pool.marks
+        values = self.mark_values
+        n_values = len(values)
+        available = (self.bucket_sizes > 0).reshape(-1, n_values)
+        gap = spec.total_marks - marks[batch].sum(axis=1)
+        pending = np.abs(gap) > spec.marks_tolerance
+        for _ in range(MAX_REPAIR_SWAPS):
+            rows = np.flatnonzero(pending)
+            if not len(rows):
+                break
+            chosen = batch[rows]
+            cells = self.cell_of[chosen]
+            deltas = values[None, None, :] - marks[chosen][:, :, None]            # (rows, slots, values)
+            miss = np.abs(gap[rows, None, None] - deltas).astype(float)
+            miss[~available[cells]] = np.inf
+            flat = miss.reshape(len(rows), -1).argmin(axis=1)
+            slot, value = np.divmod(flat, n_values)
+            best = miss.reshape(len(rows), -1)[np.arange(len(rows)), flat]
+            stuck = best >= np.abs(gap[rows])
+            pending[rows[stuck]] = False
+
+            bucket = cells[np.arange(len(rows)), slot] * n_values + value
+            offset = (self.rng.random(len(rows)) * self.bucket_sizes[bucket]).astype(np.int64)
+            replacement = self.bucket_order[self.bucket_starts[bucket] + np.minimum(offset, self.bucket_sizes[bucket] - 1)]
+            clash = (chosen == replacement[:, None]).any(axis=1)  # already on the paper: retry next round
+            swap = ~stuck & ~clash
+            batch[rows[swap], slot[swap]] = replacement[swap]
+            gap[rows[swap]] -= deltas[np.arange(len(rows)), slot, value][swap]
+            pending[rows] &= np.abs(gap[rows]) > spec.marks_tolerance
+        return np.abs(gap) <= spec.marks_tolerance
+
+    def _overlaps(self, chosen: np.ndarray) -> np.ndarray:
+        """Questions shared with each earlier variant"""
+        used = self.postings[chosen, :self.usage[chosen].max()]
+        return np.bincount(used[used >= 0], minlength=self.accepted)
+
+    def _repair_overlap(self, chosen: np.ndarray) -> bool:
+        """Swap questions shared with the most-overlapping variant for unused same-bucket ones"""
+        for _ in range(MAX_REPAIR_SWAPS):
+            shared = self._overlaps(chosen)
+            if not len(shared) or shared.max() <= self.max_shared:
+                return True
+            worst = int(shared.argmax())
+            swapped = False
+            for slot, question in enumerate(chosen.tolist()):
+                if worst not in self.postings[question, :self.usage[question]]:
+                    continue
+                bucket = self.bucket_of[question]
+                start = self.bucket_starts[bucket]
+                members = self.bucket_order[start:start + self.bucket_sizes[bucket]]
+                free = members[~np.isin(members, chosen)]
+                if len(free):
+                    chosen[slot] = free[np.argmin(self.usage[free])]
+                    swapped = True
+                    break
+            if not swapped:
+                return False
+        shared = self._overlaps(chosen)
+        return not len(shared) or shared.max() <= self.max_shared
+
+    def _accept(self, chosen: np.ndarray) -> Variant:
+        index = self.accepted
+        if self.usage[chosen].max() >= self.postings.shape[1]:
+            self.postings = np.pad(self.postings, ((0, 0), (0, self.postings.shape[1])), constant_values=-1)
+        self.postings[chosen, self.usage[chosen]] = index
+        self.usage[chosen] += 1
+        self.accepted += 1
+        order = np.argsort(self.pool.ids[chosen])
+        return Variant(index, self.pool.ids[chosen][order].tolist(), int(self.pool.marks[chosen].sum()))
+
+    # -- public -----------------------------------------------------------
+
+    def generate(self, count: int) -> Iterator[Variant]:
+        """Yield `count` variants, each as soon as it satisfies every constraint"""
+        max_draws = self.stats['drawn'] + MAX_DRAWS_PER_VARIANT * count
+        target = self.accepted + count
+        while self.accepted < target:
+            if self.stats['drawn'] >= max_draws:
+                raise ValueError(f'Constraints too tight: {self.accepted} variants after {self.stats["drawn"]} draws')
+            batch = self._draw_batch(min(self.batch_size, 2 * (target - self.accepted)))
+            if self.spec.total_marks is None:
+                marks_ok = np.ones(len(batch), dtype=bool)
+            else:
+                before = self.pool.marks[batch].sum(axis=1)
+                marks_ok = self._repair_marks(batch)
+                self.stats['marks_repaired'] += int((marks_ok & (before != self.pool.marks[batch].sum(axis=1))).sum())
+                self.stats['rejected'] += int((~marks_ok).sum())
+            for chosen in batch[marks_ok]:
+                if self.accepted >= target:
+                    break
+                if self.max_shared < self.size:
+                    shared = self._overlaps(chosen)
+                    if len(shared) and shared.max() > self.max_shared:
+                        if not self._repair_overlap(chosen):
+                            self.stats['rejected'] += 1
+                            continue
+                        self.stats['overlap_repaired'] += 1
+                yield self._accept(chosen)
+
+
+def assemble(pool: QuestionPool, spec: PaperSpec, count: int, seed: Optional[int] = None) -> Iterator[Variant]:
+    return PaperAssembler(pool, spec, seed=seed).generate(count)
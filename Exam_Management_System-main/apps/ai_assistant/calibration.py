@@ -0,0 +1,224 @@
+"""
+Question and student calibration from exam answers (the model is in irt.py).
+
+`manage.py calibrate_questions` reads every exams.StudentExamResponse, a
+right answer being full marks (or, before grading, the answer key's
+option), fits the questions' difficulty and discrimination and the
+students' abilities, and stores them as QuestionCalibration and
+StudentAbility rows. The previous fit is the starting point, so a nightly
+refit converges in a few iterations.
+
+With --incremental only answers given since the last fit are folded in:
+the students and questions they touch are refitted from all of their
+answers, everyone else's parameters stay as they are. When a result is
+graded, the student's ability is re-estimated against the stored
+questions straight away (update_ability, from signals.py).
+
+adaptive_paper() draws a practice test for a student: per subject, the
+calibrated questions the student should get right with probability
+TARGET_SUCCESS.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import irt, questionbank
+from .models import QuestionCalibration, StudentAbility
+
+DEFAULTS = {
+    'TARGET_SUCCESS': 0.7,
+    'RANDOMESQUE': 3,
+    'MAX_ITERATIONS': 100,
+    'TOLERANCE': 1e-3,
+}
+SAVE_BATCH = 1000
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_CALIBRATION', {}))
+    return config
+
+
+def _response_model():
+    try:
+        return apps.get_model('exams', 'StudentExamResponse')
+    except LookupError:
+        return None
+
+
+def is_correct(marks_obtained, marks, answer, key) -> bool:
+    if marks_obtained is not None:
+        return marks_obtained >= marks
+    return bool(key) and (answer or '').strip().upper() == key.strip().upper()
+
+
+def load_responses(condition: Optional[Q] = None) -> Optional[irt.Responses]:
+    """Answers as an irt.Responses keyed by (user id, question id); None without the exams app or answers"""
+    Response = _response_model()
+    if Response is None:
+        return None
+    rows = Response.objects.all() if condition is None else Response.objects.filter(condition)
+    rows = rows.values_list('student__user_id', 'question_id', 'marks_obtained', 'question__marks',
+                            'student_answer', 'question__correct_answer')
+    users, questions, correct = [], [], []
+    for user_id, question_id, obtained, marks, answer, key in rows.iterator(chunk_size=10000):
+        users.append(user_id)
+        questions.append(question_id)
+        correct.append(is_correct(obtained, marks, answer, key))
+    if not users:
+        return None
+    return irt.Responses(users, questions, correct)
+
+
+def stored_fit(user_ids: Optional[Iterable[int]] = None, question_ids: Optional[Iterable[int]] = None) -> irt.Fit:
+    """The stored parameters (of the given users and questions) as an irt.Fit"""
+    students = StudentAbility.objects.all()
+    questions = QuestionCalibration.objects.all()
+    if user_ids is not None:
+        students = students.filter(user_id__in=list(user_ids))
+    if question_ids is not None:
+        questions = questions.filter(question_id__in=list(question_ids))
+    s = list(students.values_list('user_id', 'ability', 'standard_error'))
+    q = list(questions.values_list('question_id', 'difficulty', 'discrimination'))
+    s_cols = np.array(s, dtype=np.float64).reshape(-1, 3)
+    q_cols = np.array(q, dtype=np.float64).reshape(-1, 3)
+    return irt.Fit(s_cols[:, 0].astype(np.int64), s_cols[:, 1], s_cols[:, 2],
+                   q_cols[:, 0].astype(np.int64), q_cols[:, 1], q_cols[:, 2], 0, True)
+
+
+def save(fit: irt.Fit, responses: irt.Responses, students: Optional[np.ndarray] = None,
+         questions: Optional[np.ndarray] = None, fitted_at=None) -> Dict[str, int]:
+    """Upsert the fitted parameters (only where the masks are set); returns rows written"""
+    now = fitted_at or timezone.now()
+    n_students, n_questions = responses.shape
+    students = np.ones(n_students, bool) if students is None else students
+    questions = np.ones(n_questions, bool) if questions is None else questions
+    per_student = np.bincount(responses.students, minlength=n_students)
+    per_question = np.bincount(responses.questions, minlength=n_questions)
+
+    calibrations = [
+        QuestionCalibration(question_id=int(qid), difficulty=float(b), discrimination=float(a),
+                            responses=int(n), fitted_at=now)
+        for qid, b, a, n in zip(fit.question_ids[questions], fit.difficulty[questions],
+                                fit.discrimination[questions], per_question[questions])
+    ]
+    QuestionCalibration.objects.bulk_create(
+        calibrations, batch_size=SAVE_BATCH, update_conflicts=True, unique_fields=['question_id'],
+        update_fields=['difficulty', 'discrimination', 'responses', 'fitted_at'],
+    )
+    abilities = [
+        StudentAbility(user_id=int(uid), ability=float(theta), standard_error=float(se), responses=int(n), fitted_at=now)
+        for uid, theta, se, n in zip(fit.student_ids[students], fit.ability[students],
+                                     fit.ability_se[students], per_student[students])
+    ]
+    StudentAbility.objects.bulk_create(
+        abilities, batch_size=SAVE_BATCH, update_conflicts=True, unique_fields=['user'],
+        update_fields=['ability', 'standard_error', 'responses', 'fitted_at'],
+    )
+    questionbank.invalidate()
+    return {'questions': len(calibrations), 'students': len(abilities)}
+
+
+def refit(incremental: bool = False) -> Optional[Dict]:
+    """Fit all answers (or fold in those since the last fit); None when there is nothing to fit"""
+    config = get_config()
+    # Answers saved while fitting are after this, so the next incremental run picks them up
+    started = timezone.now()
+    since = QuestionCalibration.objects.aggregate(last=Max('fitted_at'))['last'] if incremental else None
+    if since is None:
+        responses = load_responses()
+        if responses is None:
+            return None
+        fit = irt.fit(responses, stored_fit(), config['MAX_ITERATIONS'], config['TOLERANCE'])
+        students = questions = None
+    else:
+        new = load_responses(Q(answered_at__gt=since))
+        if new is None:
+            return None
+        users, question_ids = new.student_labels.tolist(), new.question_labels.tolist()
+        responses = load_responses(Q(student__user_id__in=users) | Q(question_id__in=question_ids))
+        students = np.isin(responses.student_labels, new.student_labels)
+        questions = np.isin(responses.question_labels, new.question_labels)
+        warm = stored_fit(responses.student_labels.tolist(), responses.question_labels.tolist())
+        fit = irt.fit(responses, warm, config['MAX_ITERATIONS'], config['TOLERANCE'],
+                      update_students=students, update_questions=questions)
+    saved = save(fit, responses, students, questions, fitted_at=started)
+    return dict(saved, responses=len(responses), iterations=fit.iterations, converged=fit.converged)
+
+
+def update_ability(user_id: int) -> Optional[StudentAbility]:
+    """Re-estimate one student's ability from their answers to calibrated questions"""
+    responses = load_responses(Q(student__user_id=user_id))
+    if responses is None:
+        return None
+    labels = responses.question_labels.tolist()
+    params = {qid: (b, a) for qid, b, a in QuestionCalibration.objects.filter(question_id__in=labels)
+              .values_list('question_id', 'difficulty', 'discrimination')}
+    known = np.array([qid in params for qid in labels])
+    answered = known[responses.questions]
+    if not answered.any():
+        return None
+    b, a = np.array([params.get(qid, (0.0, 1.0)) for qid in labels]).T
+    rows = responses.questions[answered]
+    current = StudentAbility.objects.filter(user_id=user_id).values_list('ability', flat=True).first()
+    theta, se = irt.ability_from_answers(b[rows], a[rows], responses.correct[answered], start=current or 0.0)
+    ability, _ = StudentAbility.objects.update_or_create(user_id=user_id, defaults={
+        'ability': theta, 'standard_error': se, 'responses': int(answered.sum()), 'fitted_at': timezone.now(),
+    })
+    return ability
+
+
+class CalibratedItems(NamedTuple):
+    """Column arrays of the calibrated questions among a set"""
+    ids: np.ndarray
+    difficulty: np.ndarray
+    discrimination: np.ndarray
+    subjects: np.ndarray
+
+
+def calibrated_items(questions) -> CalibratedItems:
+    """The calibrations of questions (exams.Question rows), their subject ids as strings"""
+    by_id = {q.id: str(q.subject_id) for q in questions}
+    calibrated = list(QuestionCalibration.objects.filter(question_id__in=list(by_id))
+                      .values_list('question_id', 'difficulty', 'discrimination'))
+    ids = np.array([row[0] for row in calibrated], dtype=np.int64)
+    return CalibratedItems(
+        ids,
+        np.array([row[1] for row in calibrated], dtype=np.float64),
+        np.array([row[2] for row in calibrated], dtype=np.float64),
+        np.array([by_id[qid] for qid in ids.tolist()], dtype=str),
+    )
+
+
+def adaptive_paper(user, questions, counts: Dict[str, int], rng: Optional[np.random.Generator] = None,
+                   calibrated: Optional[CalibratedItems] = None) -> Optional[List[int]]:
+    """
+    Question ids for a practice test at the user's level: counts[subject id]
+    calibrated questions of each subject, drawn from questions (exams.Question
+    rows, whose calibrated_items may be passed in). None when the user or too
+    few of the questions are calibrated.
+    """
+    config = get_config()
+    ability = StudentAbility.objects.filter(user=user).values_list('ability', flat=True).first()
+    if ability is None:
+        return None
+    items = calibrated if calibrated is not None else calibrated_items(questions)
+    if len(items.ids) < sum(counts.values()):
+        return None
+    rng = rng or np.random.default_rng()
+    paper = []
+    for subject, count in counts.items():
+        if not count:
+            continue
+        try:
+            picked = irt.select_items(ability, items.difficulty, items.discrimination, count, config['TARGET_SUCCESS'],
+                                      exclude=items.subjects != subject, randomesque=config['RANDOMESQUE'], rng=rng)
+        except ValueError:
+            return None
+        paper.extend(items.ids[picked].tolist())
+    return paper
@@ -0,0 +1,84 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from . import idempotency, writebehind
+from .realtime import broadcast_message, broadcast_token, session_group
+from .utils import stream_ai_response
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    WebSocket transport for one ChatSession.
+
+    Clients send {"type": "message", "message": "...", "client_message_id": "..."}
+    and receive every message and streamed assistant token for the session,
+    including ones sent from other tabs or over the HTTP fallback.
+    """
+
+    group_name = None
+
+    async def connect(self):
+        user = self.scope.get('user')
+        self.session_id = self.scope['url_route']['kwargs']['session_id']
+        if user is None or not user.is_authenticated or not await self._owns_session(user):
+            await self.close(code=4403)
+            return
+        self.group_name = session_group(self.session_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('type') != 'message':
+            return
+        text = str(content.get('message', '')).strip()
+        client_message_id = content.get('client_message_id')
+        if not text:
+            await self.send_json({'type': 'error', 'error': 'Message cannot be empty',
+                                  'client_message_id': client_message_id})
+            return
+        try:
+            # Not thread-sensitive: a slow upstream stream must not hold up other sockets
+            await database_sync_to_async(self._reply, thread_sensitive=False)(text, client_message_id)
+        except Exception as e:
+            await self.send_json({'type': 'error', 'error': str(e), 'client_message_id': client_message_id})
+
+    async def chat_event(self, event):
+        await self.send_json(event['payload'])
+
+    @database_sync_to_async
+    def _owns_session(self, user):
+        return user.chat_sessions.filter(id=self.session_id).exists()
+
+    def _reply(self, text, client_message_id):
+        user = self.scope['user']
+        session = user.chat_sessions.get(id=self.session_id)
+        if client_message_id is not None and not idempotency.valid_client_id(client_message_id):
+            raise ValueError('client_message_id must be a string of at most '
+                             f'{idempotency.MAX_CLIENT_ID_LENGTH} characters')
+        if client_message_id:
+            user_msg, created = idempotency.claim(user, session, text, client_message_id)
+            if not created:
+                if user_msg.content != text:  # the HTTP view answers 409
+                    raise ValueError('client_message_id was already used for another message')
+                # Sent before (over either transport): deliver that reply again
+                ai_msg = idempotency.wait_for_reply(user_msg)
+                if ai_msg is not None:
+                    broadcast_message(ai_msg, client_message_id, in_reply_to=user_msg.id)
+                    return
+                if not idempotency.is_stale(user_msg):
+                    raise RuntimeError('The reply to this message is still being written, try again')
+        else:
+            user_msg = writebehind.create_message(session, 'user', text)
+        broadcast_message(user_msg, client_message_id)
+
+        parts = []
+        for token in stream_ai_response(text, session):
+            parts.append(token)
+            broadcast_token(session.id, user_msg.id, token)
+
+        ai_msg = writebehind.create_message(session, 'assistant', ''.join(parts), in_reply_to=user_msg)
+        broadcast_message(ai_msg, client_message_id, in_reply_to=user_msg.id)
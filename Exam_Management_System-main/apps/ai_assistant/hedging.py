@@ -0,0 +1,300 @@
+"""
+Latency SLO for LLM calls: deadlines, hedged requests and a circuit breaker.
+
+With AI_ASSISTANT_LLM_SLO['ENABLED'], call(endpoint, primary, fallback)
+runs the provider call (primary) on a shared thread pool and:
+
+* gives up at the endpoint's deadline (DEADLINES, seconds) and answers
+  with fallback, the local rule engine, so nobody waits longer than that;
+* sends one backup request (up to MAX_HEDGES) when the first has not
+  answered after the HEDGE_PERCENTILE latency of the endpoint's recent
+  successful calls (at least MIN_HEDGE_DELAY), or right away when an
+  attempt fails; the first good answer wins;
+* skips the provider while its circuit breaker is open: once at least
+  BREAKER_MIN_CALLS of the last BREAKER_WINDOW attempts finished, and
+  BREAKER_ERROR_RATE of them failed or missed the deadline, every call
+  goes straight to fallback for BREAKER_COOLDOWN seconds. Then a single
+  trial call is let through, without hedges; its outcome alone closes or
+  reopens the breaker.
+
+Attempts that lose (or finish after the deadline) are not cancelled, since
+the HTTP call cannot be interrupted. Their result is passed to discard and
+still feeds the latency and breaker statistics.
+
+metrics() counts how each call was answered, per endpoint and process:
+primary, hedge, deadline (fallback after the deadline), error (fallback
+after every attempt failed) and open (fallback while the breaker is open).
+"""
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from django.conf import settings
+
+T = TypeVar('T')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'DEADLINES': {'chat': 4.0, 'chat_stream': 3.0, 'services': 8.0},
+    'DEFAULT_DEADLINE': 5.0,
+    'HEDGE_PERCENTILE': 0.9,
+    'MIN_HEDGE_DELAY': 0.25,
+    'MAX_HEDGES': 1,
+    'LATENCY_SAMPLES': 200,
+    'BREAKER_WINDOW': 20,
+    'BREAKER_MIN_CALLS': 5,
+    'BREAKER_ERROR_RATE': 0.5,
+    'BREAKER_COOLDOWN': 30.0,
+    'MAX_WORKERS': 32,
+}
+OUTCOMES = ('primary', 'hedge', 'deadline', 'error', 'open')
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    if settings.configured:  # scripts may call the engine without Django settings
+        config.update(getattr(settings, 'AI_ASSISTANT_LLM_SLO', {}))
+    return config
+
+
+def enabled() -> bool:
+    return bool(get_config()['ENABLED'])
+
+
+def deadline_for(endpoint: str, config: Optional[dict] = None) -> float:
+    config = config or get_config()
+    return float(config['DEADLINES'].get(endpoint, config['DEFAULT_DEADLINE']))
+
+
+class LatencyTracker:
+    """Recent successful call latencies of one endpoint"""
+
+    def __init__(self, samples: int = 200):
+        self.samples = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Closed -> open on a high failure rate -> half-open trial after the cooldown"""
+
+    def __init__(self, window: int = 20, min_calls: int = 5, error_rate: float = 0.5, cooldown: float = 30.0):
+        self.outcomes = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self) -> Tuple[bool, bool]:
+        """(may a call go to the provider now, is it the half-open trial); only one trial runs at a time"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True, False
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True, True
+            return False, False
+
+    def record(self, ok: bool, trial: bool = False):
+        """
+        The outcome of an attempt. While the breaker is open only the trial's
+        counts: attempts started before it opened may still finish late.
+        """
+        with self._lock:
+            if trial:
+                self.trial_running = False
+                if ok:
+                    self.opened_at = None
+                    self.outcomes.clear()
+                else:
+                    self.opened_at = time.monotonic()
+                return
+            if self.opened_at is not None:
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+                self.opened_at = time.monotonic()
+
+
+class _Endpoint:
+    def __init__(self, config: dict):
+        self.latency = LatencyTracker(config['LATENCY_SAMPLES'])
+        self.breaker = CircuitBreaker(config['BREAKER_WINDOW'], config['BREAKER_MIN_CALLS'],
+                                      config['BREAKER_ERROR_RATE'], config['BREAKER_COOLDOWN'])
+        self.outcomes = Counter()
+
+
+_endpoints: Dict[str, _Endpoint] = {}
+_executor = None
+_lock = threading.Lock()
+
+
+def _endpoint(name: str, config: dict) -> _Endpoint:
+    endpoint = _endpoints.get(name)
+    if endpoint is None:
+        with _lock:
+            endpoint = _endpoints.setdefault(name, _Endpoint(config))
+    return endpoint
+
+
+def _pool(config: dict) -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config['MAX_WORKERS'], thread_name_prefix='llm-call')
+    return _executor
+
+
+def request_timeout(endpoint: str) -> Optional[float]:
+    """Upstream timeout for one attempt: an answer after the deadline is never used"""
+    return deadline_for(endpoint) if enabled() else None
+
+
+def hedge_delay(endpoint: str, config: Optional[dict] = None) -> float:
+    """How long to wait for an attempt before sending a backup request"""
+    config = config or get_config()
+    deadline = deadline_for(endpoint, config)
+    observed = _endpoint(endpoint, config).latency.percentile(config['HEDGE_PERCENTILE'])
+    if observed is None:
+        observed = deadline / 2  # nothing measured yet
+    return min(max(observed, config['MIN_HEDGE_DELAY']), deadline)
+
+
+def call(endpoint: str, primary: Callable[[], T], fallback: Callable[[], T],
+         discard: Optional[Callable[[T], None]] = None) -> T:
+    """primary() within the endpoint's deadline, hedged and behind its breaker; else fallback()"""
+    config = get_config()
+    if not config['ENABLED']:
+        try:
+            return primary()
+        except Exception as e:
+            print(f'LLM call error ({endpoint}): {e}')
+            return fallback()
+
+    state = _endpoint(endpoint, config)
+    allowed, trial = state.breaker.allow()
+    if not allowed:
+        return _finish(state, 'open', fallback)
+    max_hedges = 0 if trial else config['MAX_HEDGES']  # a degraded provider gets one request
+
+    start = time.monotonic()
+    deadline = start + deadline_for(endpoint, config)
+    hedge_at = start + hedge_delay(endpoint, config)
+    attempts = {}
+    settled = set()
+    decided = [False]
+    lock = threading.Lock()
+
+    def settle(future):
+        """Hand a losing attempt's answer to discard, once the call is decided"""
+        with lock:
+            if not decided[0] or future in settled:
+                return
+            settled.add(future)
+        if discard is not None and future.exception() is None:
+            try:
+                discard(future.result())
+            except Exception:
+                pass
+
+    def decide(winner=None):
+        with lock:
+            decided[0] = True
+            settled.add(winner)
+        for future in attempts:
+            if future.done():
+                settle(future)
+
+    def launch(kind, trial=False):
+        launched = time.monotonic()
+
+        def done(future):
+            elapsed = time.monotonic() - launched
+            ok = future.exception() is None
+            if ok:
+                state.latency.add(elapsed)
+            # Answers after the deadline did not help anyone: count them as failures
+            state.breaker.record(ok and launched + elapsed <= deadline, trial)
+            settle(future)
+
+        future = _pool(config).submit(primary)
+        attempts[future] = kind
+        future.add_done_callback(done)
+        return future
+
+    pending = {launch('primary', trial)}
+    hedges = 0
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            decide()
+            return _finish(state, 'deadline', fallback)
+        can_hedge = hedges < max_hedges
+        wake = min(deadline, hedge_at) if can_hedge else deadline
+        done, _ = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+        failed = False
+        for future in done:
+            pending.discard(future)
+            if future.exception() is None:
+                decide(future)
+                state.outcomes[attempts[future]] += 1
+                return future.result()
+            print(f'LLM call error ({endpoint}, {attempts[future]}): {future.exception()}')
+            failed = True
+        if can_hedge and (failed or time.monotonic() >= hedge_at):
+            hedges += 1
+            pending.add(launch('hedge'))
+        elif not pending:
+            decide()
+            return _finish(state, 'error', fallback)
+
+
+def _finish(state: _Endpoint, outcome: str, fallback: Callable[[], T]) -> T:
+    state.outcomes[outcome] += 1
+    return fallback()
+
+
+def metrics() -> Dict[str, dict]:
+    """Per endpoint: how calls were answered, breaker state and hedge delay"""
+    config = get_config()
+    result = {}
+    for name, state in sorted(_endpoints.items()):
+        p50 = state.latency.percentile(0.5)
+        result[name] = {
+            'outcomes': {outcome: state.outcomes[outcome] for outcome in OUTCOMES},
+            'calls': sum(state.outcomes.values()),
+            'breaker': state.breaker.state,
+            'deadline_seconds': deadline_for(name, config),
+            'hedge_delay_seconds': round(hedge_delay(name, config), 4),
+            'latency_p50_seconds': round(p50, 4) if p50 is not None else None,
+        }
+    return result
+
+
+def reset():
+    """Forget all statistics (tests, or after changing the configuration)"""
+    with _lock:
+        _endpoints.clear()
@@ -0,0 +1,107 @@
+"""
+Resent chat messages are answered once.
+
+chat.js gives every message it sends a client_message_id, the same on
+every retry of that message. It is stored on the user's ChatMessage
+under a unique constraint per session, so claim() inserting the message
+is also the claim on answering it: of two requests carrying the same id
+(a double submit, a retry after a timeout), only one inserts and
+generates the reply. The other finds the message and:
+
+- returns the stored reply (ChatMessage.in_reply_to points at the message);
+- or, while the reply is still being generated, waits up to WAIT_SECONDS
+  for it (polling every POLL_SECONDS) instead of asking the model again;
+- or, when the message is older than STALE_SECONDS and still unanswered
+  (the worker answering it died), answers it itself.
+
+Messages with a client id are written through, never buffered
+(writebehind.py), since the constraint has to be checked on insert. The
+first message of a draft chat creates its session, so two copies of it
+sent at the very same time land in two sessions; a resend once either is
+saved is found (find_sent looks across the user's sessions).
+"""
+import time
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import sharding, writebehind
+from .models import ChatMessage
+
+DEFAULTS = {
+    'WAIT_SECONDS': 20,
+    'POLL_SECONDS': 0.2,
+    'STALE_SECONDS': 90,
+}
+MAX_CLIENT_ID_LENGTH = 64
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_IDEMPOTENCY', {}))
+    return config
+
+
+def valid_client_id(value) -> bool:
+    return isinstance(value, str) and 0 < len(value) <= MAX_CLIENT_ID_LENGTH
+
+
+def find_sent(user, client_message_id: str, session=None) -> Optional[ChatMessage]:
+    """The user's message sent with this client id (in session, if given)"""
+    messages = ChatMessage.objects.using(sharding.shard_for_user(user)).filter(
+        client_message_id=client_message_id, role='user', session__user=user)
+    if session is not None:
+        messages = messages.filter(session=session)
+    return messages.select_related('session').first()
+
+
+def claim(user, session, content: str, client_message_id: str,
+          title: str = 'Exam Assistant Chat') -> Tuple[ChatMessage, bool]:
+    """
+    (message, True) after saving the user's message, or (message, False)
+    when it was already sent. Without a session (a draft chat) the
+    session is created with the message, and found again on a resend.
+    """
+    sent = find_sent(user, client_message_id, session)
+    if sent is not None:
+        return sent, False
+    try:
+        with transaction.atomic(using=sharding.shard_for_user(user)):
+            if session is None:
+                session = user.chat_sessions.create(title=title)
+            message = writebehind.create_message(session, 'user', content, client_message_id=client_message_id)
+        return message, True
+    except IntegrityError:  # sent again while this one was being saved
+        sent = find_sent(user, client_message_id, session)
+        if sent is None:
+            raise
+        return sent, False
+
+
+def find_reply(message: ChatMessage) -> Optional[ChatMessage]:
+    """The assistant's reply to message, stored or still buffered in this process"""
+    for pending in writebehind.pending_messages(message.session_id):
+        if pending.in_reply_to_id == message.id:
+            return pending
+    return ChatMessage.objects.using(message._state.db).filter(in_reply_to=message, role='assistant').first()
+
+
+def is_stale(message: ChatMessage, config: Optional[dict] = None) -> bool:
+    """Unanswered for so long that whoever was answering it must have given up"""
+    config = config or get_config()
+    return timezone.now() - message.created_at > timedelta(seconds=config['STALE_SECONDS'])
+
+
+def wait_for_reply(message: ChatMessage, timeout: Optional[float] = None) -> Optional[ChatMessage]:
+    """The reply to message, waiting up to timeout seconds while it is being generated"""
+    config = get_config()
+    timeout = config['WAIT_SECONDS'] if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        reply = find_reply(message)
+        if reply is not None or is_stale(message, config) or time.monotonic() >= deadline:
+            return reply
+        time.sleep(min(config['POLL_SECONDS'], max(0.0, deadline - time.monotonic())))
@@ -0,0 +1,52 @@
+"""Run and parse `python -X importtime` profiles."""
+import os
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """Parse the stderr of `python -X importtime` into one record per imported module"""
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            records.append(ImportRecord(
+                module=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                # Nested imports are indented two spaces per level
+                depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            ))
+        except ValueError:
+            continue
+    return records
+
+
+def profile_imports(code: str, settings_module: str = None) -> List[ImportRecord]:
+    """Execute code in a fresh interpreter with -X importtime and return its import records"""
+    env = dict(os.environ)
+    if settings_module:
+        env['DJANGO_SETTINGS_MODULE'] = settings_module
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=env, cwd=os.getcwd(),
+    )
+    if result.returncode != 0:
+        tail = [l for l in result.stderr.splitlines() if not l.startswith('import time:')]
+        raise RuntimeError('\n'.join(tail[-10:]) or f'exit code {result.returncode}')
+    return parse_importtime(result.stderr)
+
+
+def total_us(records: List[ImportRecord]) -> int:
+    """Time spent importing, counting each top-level import once"""
+    return sum(r.cumulative_us for r in records if r.depth == 0)
@@ -0,0 +1,294 @@
+"""
+Local CPU inference with dynamic request batching.
+
+The model lives in a dedicated process (`manage.py run_inference_server`)
+that loads it from AI_ASSISTANT_LOCAL_MODEL['PATH'] once and listens on
+an authenticated multiprocessing.connection address. Each web worker
+process keeps one connection and pipelines its threads' requests over it.
+The server queues requests from every connection. Once the first one
+arrives it waits at most MAX_WAIT_MS for more, up to MAX_BATCH, and runs
+them through the model as one batch.
+
+A model is any class taking the file path whose instances provide
+`tasks` (a set such as {'chat'}) and `predict_batch(texts, task)`; the
+default is retrieval.RetrievalModel. Web workers only import this module,
+so NumPy and the model stay out of their memory and cold start.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULTS = {
+    'ENABLED': False,
+    'PATH': None,
+    'CLASS': 'apps.ai_assistant.retrieval.RetrievalModel',
+    'ADDRESS': '127.0.0.1:6010',
+    'AUTHKEY': '',
+    'MAX_BATCH': 32,
+    'MAX_WAIT_MS': 5,
+    'TIMEOUT': 10,
+}
+
+class InferenceUnavailable(Exception):
+    """The model server could not answer (not running, timed out, or failed)"""
+
+
+def get_config() -> dict:
+    from django.conf import settings
+
+    config = dict(DEFAULTS)
+    if settings.configured:  # scripts may call the engine without Django settings
+        config.update(getattr(settings, 'AI_ASSISTANT_LOCAL_MODEL', {}))
+    return config
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is a Unix socket path"""
+    if isinstance(address, (tuple, list)):
+        return tuple(address)
+    host, sep, port = str(address).rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return host, int(port)
+    return str(address)
+
+
+def load_model(config: dict):
+    from django.utils.module_loading import import_string
+
+    return import_string(config['CLASS'])(config['PATH'])
+
+
+# -- batching -------------------------------------------------------------
+
+class MicroBatcher:
+    """Queue single requests and run them through predict_batch in groups"""
+
+    def __init__(self, predict_batch: Callable[[List[str], str], List[str]], max_batch: int = 32, max_wait_ms: float = 5):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.stats = {'requests': 0, 'batches': 0, 'largest_batch': 0}
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, task: str, callback: Callable[[bool, str], None]):
+        """callback(ok, reply_or_error) is called from the batcher thread"""
+        self.queue.put((text, task, callback))
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+
+    def _collect(self) -> Optional[list]:
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            by_task: Dict[str, list] = {}
+            for item in batch:
+                by_task.setdefault(item[1], []).append(item)
+            for task, items in by_task.items():
+                try:
+                    replies = self.predict_batch([text for text, _, _ in items], task)
+                except Exception as e:
+                    for _, _, callback in items:
+                        callback(False, str(e))
+                    continue
+                for (_, _, callback), reply in zip(items, replies):
+                    callback(True, reply)
+
+
+# -- server ---------------------------------------------------------------
+
+class InferenceServer:
+    """
+    Serve a model to many client connections.
+
+    Protocol: the server first sends {'tasks': [...]}. Clients then send
+    (request_id, task, text) and receive (request_id, ok, reply_or_error),
+    possibly out of order.
+    """
+
+    def __init__(self, model, address, authkey: bytes, max_batch: int = 32, max_wait_ms: float = 5):
+        self.model = model
+        self.listener = Listener(parse_address(address), authkey=authkey)
+        self.address = self.listener.address
+        self.batcher = MicroBatcher(model.predict_batch, max_batch, max_wait_ms)
+        self._closed = threading.Event()
+
+    def serve_forever(self):
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._closed.is_set():
+                    break
+                continue  # failed handshake (wrong authkey) or a dropped client
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self._closed.set()
+        self.listener.close()
+        self.batcher.close()
+
+    def _handle(self, conn):
+        send_lock = threading.Lock()
+
+        def reply(request_id):
+            def callback(ok, value):
+                with send_lock:
+                    try:
+                        conn.send((request_id, ok, value))
+                    except OSError:
+                        pass  # client went away
+            return callback
+
+        try:
+            conn.send({'tasks': sorted(self.model.tasks)})
+            while True:
+                request_id, task, text = conn.recv()
+                self.batcher.submit(text, task, reply(request_id))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+
+def serve(model_path: str, address, authkey: bytes, model_class: str = DEFAULTS['CLASS'],
+          max_batch: int = 32, max_wait_ms: float = 5):
+    """Entry point for a dedicated server process"""
+    model = load_model({'CLASS': model_class, 'PATH': model_path})
+    server = InferenceServer(model, address, authkey, max_batch, max_wait_ms)
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+# -- client ---------------------------------------------------------------
+
+class InferenceClient:
+    """Thread-safe client; concurrent predict() calls share one connection"""
+
+    def __init__(self, address, authkey: bytes, timeout: float = 10):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.tasks = frozenset()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending: Dict[int, list] = {}
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        try:
+            conn = Client(self.address, authkey=self.authkey)
+            self.tasks = frozenset(conn.recv()['tasks'])
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise InferenceUnavailable(f'Model server not reachable at {self.address}: {e}')
+        self._conn = conn
+        threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+        return conn
+
+    def _read(self, conn):
+        try:
+            while True:
+                request_id, ok, value = conn.recv()
+                slot = self._pending.pop(request_id, None)
+                if slot is not None:
+                    slot[1:] = [ok, value]
+                    slot[0].set()
+        except (EOFError, OSError):
+            with self._lock:
+                if self._conn is conn:
+                    self._conn = None
+                failed, self._pending = self._pending, {}
+            for slot in failed.values():
+                slot[1:] = [False, 'connection to model server lost']
+                slot[0].set()
+
+    def supports(self, task: str) -> bool:
+        with self._lock:
+            self._connect()
+        return task in self.tasks
+
+    def predict(self, text: str, task: str = 'chat') -> str:
+        slot = [threading.Event(), False, None]
+        with self._lock:
+            conn = self._connect()
+            request_id = next(self._ids)
+            self._pending[request_id] = slot
+            try:
+                conn.send((request_id, task, text))
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._conn = None
+                raise InferenceUnavailable(str(e))
+        if not slot[0].wait(self.timeout):
+            self._pending.pop(request_id, None)
+            raise InferenceUnavailable(f'No reply from model server within {self.timeout}s')
+        if not slot[1]:
+            raise InferenceUnavailable(slot[2])
+        return slot[2]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_client: Tuple[Optional[int], Optional[InferenceClient]] = (None, None)
+_client_lock = threading.Lock()
+
+
+def get_client() -> InferenceClient:
+    """The calling process's client (a fresh one after a fork)"""
+    global _client
+    pid, client = _client
+    if pid != os.getpid():
+        with _client_lock:
+            pid, client = _client
+            if pid != os.getpid():
+                config = get_config()
+                client = InferenceClient(config['ADDRESS'], config['AUTHKEY'].encode(), config['TIMEOUT'])
+                _client = (os.getpid(), client)
+    return client
+
+
+def enabled() -> bool:
+    return bool(get_config()['ENABLED'])
+
+
+def local_model_response(user_message: str, task: str = 'chat') -> str:
+    """Reply from the local model server; raises InferenceUnavailable"""
+    return get_client().predict(user_message, task)
@@ -0,0 +1,285 @@
+"""
+Rule table behind the local assistant (utils.get_local_ai_response).
+
+Rules are tried in order and the first whose keywords occur anywhere in the
+lower-cased message wins; a rule with no keywords always matches. A rule
+either carries a reply or refines the match through its own child rules.
+Keyword lists are compiled into one regex per rule the first time the
+engine is used (or by warmup.warm_up() before the first request).
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+
+class Rule(NamedTuple):
+    intent: str
+    keywords: Tuple[str, ...] = ()
+    reply: Optional[str] = None
+    children: Tuple['Rule', ...] = ()
+
+
+PREPARATION_TIPS = ("Here are effective exam preparation tips:\n\n"
+                    "📚 **Study Strategy:**\n"
+                    "• Start studying 2-3 weeks before the exam\n"
+                    "• Make a study schedule and stick to it\n"
+                    "• Focus on topics mentioned in the syllabus\n"
+                    "• Take notes while studying\n\n"
+                    "✏️ **Practice:**\n"
+                    "• Solve previous year papers\n"
+                    "• Practice with sample questions\n"
+                    "• Time yourself while practicing\n"
+                    "• Identify weak areas and focus on them\n\n"
+                    "😴 **Day Before:**\n"
+                    "• Review important topics briefly\n"
+                    "• Get 7-8 hours of sleep\n"
+                    "• Prepare your exam hall materials\n\n"
+                    "💪 **Exam Day:**\n"
+                    "• Arrive 15 minutes early\n"
+                    "• Read instructions carefully\n"
+                    "• Attempt easy questions first\n"
+                    "• Manage your time wisely")
+
+RESULTS_HELP = ("Your exam results and performance can be found in the **Reports section**:\n\n"
+                "1. Go to **Reports** → **Performance Report**\n"
+                "2. You'll see your exam scores broken down by subject\n"
+                "3. View detailed analysis including:\n"
+                "   • Your score vs. total marks\n"
+                "   • Percentage and grade\n"
+                "   • Questions attempted\n"
+                "   • Correct vs. incorrect answers\n\n"
+                "Want to improve? Focus on weak areas and practice more!")
+
+DEFAULT_REPLY = ("I didn't fully understand that question, but I'm here to help! 😊\n\n"
+                 "Try asking me about:\n"
+                 "• **Exams:** When, how to prepare, results\n"
+                 "• **Attendance:** Check percentage, view records\n"
+                 "• **Performance:** Analyze scores, improvement tips\n"
+                 "• **Navigation:** How to use different features\n\n"
+                 "Or rephrase your question and I'll do my best to help!")
+
+
+STAFF_RULES = (
+    Rule('staff.exams', ('create', 'add', 'edit', 'publish', 'schedule', 'exam', 'test'),
+         "Admin help — Managing exams:\n\n"
+         "• Create or edit exams from the Admin → Exams panel.\n"
+         "• Set start/end times, duration, and allowed resources.\n"
+         "• Publish the exam to make it visible to students.\n\n"
+         "Need steps to create an exam or set permissions?"),
+    Rule('staff.users', ('student', 'users', 'enroll', 'register', 'user'),
+         "Admin help — Managing students/users:\n\n"
+         "• Use Admin → Students to add or import student records.\n"
+         "• Edit student enrollment, departments and semesters from their profile.\n"
+         "• Use bulk-import tools for large batches.\n\n"
+         "Would you like a link to the import template?"),
+    Rule('staff.reports', ('report', 'analytics', 'export', 'performance', 'scores', 'results'),
+         "Admin help — Reports and analytics:\n\n"
+         "• Go to Reports → Performance to view aggregate scores and trends.\n"
+         "• Use filters (department, semester, exam) to narrow results.\n"
+         "• Export CSV/PDF for administrative records.\n\n"
+         "Do you want a custom export for a specific exam or department?"),
+    Rule('staff.attendance', ('attendance', 'mark', 'absent', 'presence'),
+         "Admin help — Attendance management:\n\n"
+         "• Open Attendance → Manage to mark or adjust attendance records.\n"
+         "• Run attendance reports to see aggregate percentages and flagged students.\n\n"
+         "Need to bulk-update attendance or set thresholds?"),
+    Rule('staff.default', (),
+         "Admin Assistant: I can help with managing exams, students, attendance, and reports.\n"
+         "Ask about creating exams, exporting reports, or managing users."),
+)
+
+
+def _subject_rule(subject: str) -> Rule:
+    return Rule(f'subject.{subject.lower()}', (subject.lower(),), children=(
+        Rule(f'subject.{subject.lower()}.exam', ('exam',),
+             f"For your {subject} exam:\n\n✓ Check the exam schedule in your dashboard\n✓ Review the syllabus and topics\n✓ Practice with sample questions\n✓ Clarify doubts with your instructor\n\nGood luck! You can do this! 💪"),
+        Rule(f'subject.{subject.lower()}.general', (),
+             f"Interested in {subject}? I can help with:\n• Exam information\n• Study tips\n• Performance analysis\n\nWhat would you like to know about {subject}?"),
+    ))
+
+
+STUDENT_RULES = (
+    # Explicit intents, even when the word 'exam' is missing
+    Rule('prepare', ('prepare', 'study', 'study tips', 'how to prepare', 'how do i prepare', 'how to study'),
+         PREPARATION_TIPS),
+    Rule('results', ('result', 'results', 'score', 'scores', 'mark', 'marks', 'grade'), RESULTS_HELP),
+    Rule('exam', ('exam', 'test', 'quiz', 'assessment'), children=(
+        Rule('exam.when', ('when', 'date', 'time'), children=(
+            Rule('exam.when.next', ('next',),
+                 "Your next exam details are displayed in the dashboard. Click on the exam name to see the exact date, time, and duration. You can also check the full exam schedule in the Exams section."),
+            Rule('exam.when.schedule', ('all', 'list', 'schedule'),
+                 "You can view all upcoming exams in the dashboard. Each exam shows the date, time, and duration. Click on any exam to get more details about the topics covered and exam instructions."),
+            Rule('exam.when.general', (),
+                 "To check exam schedules, go to your dashboard or the Exams section. You'll see all upcoming exams with their dates, times, and venues listed."),
+        )),
+        Rule('exam.prepare', ('prepare', 'study', 'tips', 'way', 'start'), PREPARATION_TIPS),
+        Rule('exam.results', ('result', 'score', 'mark', 'performance', 'grade'), RESULTS_HELP),
+        Rule('exam.duration', ('duration', 'long', 'how many', 'difficult', 'hard', 'easy'),
+             "Exam details including duration and difficulty level are shown in:\n"
+             "• The exam card in your dashboard\n"
+             "• The detailed exam information page\n\n"
+             "Typically, exams have different durations based on the number of questions. "
+             "The system will show you the exact time limit when you start the exam."),
+        Rule('exam.rules', ('rule', 'instruction', 'guideline', 'allowed', 'can i'),
+             "Important exam rules and instructions:\n\n"
+             "✓ **Allowed:**\n"
+             "• Use the provided exam interface\n"
+             "• Take notes (if permitted)\n"
+             "• Use calculator for math exams (if allowed)\n\n"
+             "✗ **NOT Allowed:**\n"
+             "• Switching to other windows/tabs\n"
+             "• Using unauthorized materials\n"
+             "• Discussing questions with others\n"
+             "• Taking screenshots\n\n"
+             "The system automatically detects violations. Follow all guidelines strictly!"),
+        Rule('exam.general', (),
+             "I can help with exam-related questions! Ask me about:\n"
+             "• **When** is my next exam?\n"
+             "• **How** do I prepare for exams?\n"
+             "• What are my **exam results**?\n"
+             "• What are the **exam rules**?\n"
+             "• How **long** is the exam?\n\n"
+             "What would you like to know?"),
+    )),
+    Rule('attendance', ('attendance', 'absent', 'present', 'skipped', 'class', 'percentage'), children=(
+        Rule('attendance.how', ('how', 'check', 'view'),
+             "To check your attendance:\n\n"
+             "1. Click on **Attendance Report** in the sidebar\n"
+             "2. You'll see:\n"
+             "   • Total classes held\n"
+             "   • Classes attended\n"
+             "   • Classes skipped\n"
+             "   • Attendance percentage\n"
+             "   • Detailed attendance records\n\n"
+             "Maintain at least 75% attendance to be eligible for exams!"),
+        Rule('attendance.percentage', ('percentage', 'mark'),
+             "Your attendance percentage is calculated as:\n\n"
+             "**Attendance % = (Classes Attended / Total Classes) × 100**\n\n"
+             "Most institutions require at least 75% attendance. Check your Attendance Report for detailed breakdown."),
+        Rule('attendance.general', (),
+             "Need help with attendance?\n"
+             "• View your attendance report\n"
+             "• Check attendance percentage\n"
+             "• Understand attendance requirements\n\n"
+             "Go to **Attendance Report** to see all details!"),
+    )),
+    Rule('performance', ('performance', 'progress', 'improvement', 'weak', 'strong', 'best', 'worst'),
+         "To analyze your academic performance:\n\n"
+         "1. Go to **Reports** → **Performance Report**\n"
+         "2. Review your exam scores by subject\n"
+         "3. Identify strong and weak areas\n\n"
+         "**Tips to improve:**\n"
+         "• Focus more on weak subjects\n"
+         "• Solve more practice problems\n"
+         "• Join study groups\n"
+         "• Ask instructors for help\n"
+         "• Review mistakes regularly\n\n"
+         "Consistent effort leads to better results! 💪"),
+    Rule('greeting', ('hello', 'hi', 'hey', 'greetings', 'thanks', 'thank you', 'good morning', 'good afternoon'), children=(
+        Rule('greeting.thanks', ('thanks', 'thank'),
+             "You're welcome! 😊 Feel free to ask me anything about exams, attendance, or how to use the system. I'm always here to help!"),
+        Rule('greeting.hello', (),
+             "Hello! 👋 Welcome to the Exam Management System!\n\n"
+             "I'm your AI Assistant. I can help you with:\n"
+             "• 📅 Exam schedules and dates\n"
+             "• 📚 Study tips and preparation\n"
+             "• 📊 Your exam results and performance\n"
+             "• ✅ Attendance tracking\n"
+             "• 🗺️ System navigation\n\n"
+             "What can I assist you with today?"),
+    )),
+    Rule('motivation', ('stressed', 'anxious', 'worried', 'nervous', 'scared', 'tough'),
+         "Don't worry! You've got this! 💪\n\n"
+         "**Remember:**\n"
+         "• You've prepared for this\n"
+         "• Stress is normal and manageable\n"
+         "• Deep breathing helps calm nerves\n"
+         "• Focus on what you know\n"
+         "• One question at a time\n\n"
+         "**Before exam:**\n"
+         "• Get good sleep\n"
+         "• Eat a healthy breakfast\n"
+         "• Arrive early to relax\n"
+         "• Believe in yourself!\n\n"
+         "You'll do great! 🌟"),
+    # Subject names are checked in this order; the first one mentioned wins
+    _subject_rule('Math'),
+    _subject_rule('English'),
+    _subject_rule('Science'),
+    _subject_rule('Physics'),
+    _subject_rule('Chemistry'),
+    # General navigation/help last: least specific
+    Rule('navigation', ('how', 'where', 'what', 'navigate', 'use', 'access', 'feature', 'section'), children=(
+        Rule('navigation.subjects', ('subject',),
+             "To manage your subjects:\n\n"
+             "1. Go to **Exams** → **Subjects**\n"
+             "2. You'll see all available subjects\n"
+             "3. View subject details and related exams\n"
+             "4. Check study materials if available"),
+        Rule('navigation.dashboard', ('dashboard',),
+             "Your **Dashboard** is the main hub showing:\n"
+             "• Statistics (Total exams, Completed, Upcoming)\n"
+             "• Upcoming exams list\n"
+             "• Past exams and results\n"
+             "• Quick action links\n\n"
+             "This is where you start your exam journey!"),
+        Rule('navigation.profile', ('profile', 'account'),
+             "To access your profile:\n\n"
+             "1. Click your name in the top right\n"
+             "2. Select **My Profile**\n"
+             "3. View/edit:\n"
+             "   • Personal information\n"
+             "   • Contact details\n"
+             "   • Department and semester\n"
+             "   • Profile picture"),
+        Rule('navigation.general', (),
+             "I can help you navigate! Ask me about:\n"
+             "• How do I access **[feature]**?\n"
+             "• Where is the **[section]**?\n"
+             "• How do I use **[tool]**?\n"
+             "• What does **[feature]** do?\n\n"
+             "What would you like help with?"),
+    )),
+    Rule('default', (), DEFAULT_REPLY),
+)
+
+
+class _CompiledRule(NamedTuple):
+    intent: str
+    pattern: Optional['re.Pattern']
+    reply: Optional[str]
+    children: Tuple['_CompiledRule', ...]
+
+
+def _compile(rules: Tuple[Rule, ...]) -> Tuple[_CompiledRule, ...]:
+    # Keywords are plain substrings, so an escaped alternation searched
+    # anywhere in the message matches exactly when any(k in message) would.
+    return tuple(
+        _CompiledRule(
+            rule.intent,
+            re.compile('|'.join(map(re.escape, rule.keywords))) if rule.keywords else None,
+            rule.reply,
+            _compile(rule.children),
+        )
+        for rule in rules
+    )
+
+
+@lru_cache(maxsize=None)
+def compiled_rules(is_staff: bool) -> Tuple[_CompiledRule, ...]:
+    return _compile(STAFF_RULES if is_staff else STUDENT_RULES)
+
+
+def match_intent(message: str, is_staff: bool = False) -> Tuple[str, str]:
+    """Return (intent, reply) for a user message"""
+    text = message.lower().strip()
+    rules = compiled_rules(bool(is_staff))
+    while True:
+        for rule in rules:
+            if rule.pattern is None or rule.pattern.search(text):
+                break
+        else:  # pragma: no cover - every rule list ends with a catch-all
+            return 'default', DEFAULT_REPLY
+        if not rule.children:
+            return rule.intent, rule.reply
+        rules = rule.children
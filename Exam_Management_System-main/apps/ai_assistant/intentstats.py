@@ -0,0 +1,228 @@
+"""
+Counts of what students ask, by intent and by who answered.
+
+Every assistant reply is recorded (utils.py) with the intent of the
+question, as the local rule table (intents.py) classifies it, and its
+source: 'rule' (the rule engine answered), 'local_model' or 'openai'.
+Classifying costs one regex pass, so LLM replies are counted under the
+same intents as local ones.
+
+record() only bumps an in-memory counter of the calling process. A
+background thread folds the counters into IntentRollup rows, one per
+(hour, intent, source), every FLUSH_SECONDS (and when the process exits)
+with one UPDATE per key touched, so the cost is independent of traffic
+and the messages table is never read. With FLUSH_SECONDS = 0 nothing is
+flushed in the background; call flush() (tests).
+
+report() merges the rows of a time range, plus this process's counts not
+flushed yet. Other workers' counts show up within FLUSH_SECONDS.
+"""
+import atexit
+import os
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import IntentRollup
+
+DEFAULTS = {
+    'ENABLED': True,
+    'FLUSH_SECONDS': 60,
+}
+SOURCES = ('rule', 'local_model', 'openai')
+DEFAULT_INTENT = 'default'
+
+Key = Tuple[datetime, str, str]
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_INTENT_STATS', {}))
+    return config
+
+
+def enabled() -> bool:
+    return bool(get_config()['ENABLED'])
+
+
+def hour_of(when: Optional[datetime] = None) -> datetime:
+    return (when or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+class IntentCounter:
+    """Per-process counters of replies by (hour, intent, source), flushed into IntentRollup"""
+
+    def __init__(self, flush_seconds: float = 60):
+        self.flush_seconds = flush_seconds
+        self.stats = {'recorded': 0, 'flushes': 0, 'errors': 0}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name='intent-stats', daemon=True)
+            self._thread.start()
+
+    def record(self, intent: str, source: str, when: Optional[datetime] = None):
+        with self._lock:
+            self._counts[(hour_of(when), intent, source)] += 1
+            self.stats['recorded'] += 1
+
+    def pending(self) -> Dict[Key, int]:
+        """Counts not stored yet"""
+        with self._lock:
+            return dict(self._counts)
+
+    def flush(self) -> int:
+        """Add the counts to their rollup rows; returns rows touched"""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+            if not counts:
+                return 0
+            try:
+                apply(counts)
+            except DatabaseError as e:
+                print('Intent stats flush failed, will retry:', e)
+                connections.close_all()
+                with self._lock:
+                    self._counts.update(counts)
+                    self.stats['errors'] += 1
+                return 0
+            with self._lock:
+                self.stats['flushes'] += 1
+            return len(counts)
+
+    def close(self):
+        """Stop the flusher after a last flush"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                print('Intent stats flusher error:', e)
+        try:
+            self.flush()
+        except Exception as e:
+            print('Intent stats flusher error:', e)
+        connections.close_all()
+
+
+def apply(counts: Dict[Key, int]):
+    """Add counts to their IntentRollup rows, creating missing ones"""
+    now = timezone.now()
+    with transaction.atomic():
+        for (hour, intent, source), count in counts.items():
+            rows = IntentRollup.objects.filter(hour=hour, intent=intent, source=source)
+            if rows.update(count=F('count') + count, updated_at=now):
+                continue
+            try:
+                with transaction.atomic():
+                    IntentRollup.objects.create(hour=hour, intent=intent, source=source, count=count)
+            except IntegrityError:  # another worker created it first
+                rows.update(count=F('count') + count, updated_at=now)
+
+
+_counter: Tuple[Optional[int], Optional[IntentCounter]] = (None, None)
+_counter_lock = threading.Lock()
+
+
+def get_counter() -> Optional[IntentCounter]:
+    """The calling process's counter, started on first use; None when disabled"""
+    global _counter
+    if not enabled():
+        return None
+    pid, counter = _counter
+    if pid != os.getpid():
+        with _counter_lock:
+            pid, counter = _counter
+            if pid != os.getpid():
+                config = get_config()
+                counter = IntentCounter(config['FLUSH_SECONDS'])
+                if config['FLUSH_SECONDS'] > 0:
+                    atexit.register(counter.close)
+                _counter = (os.getpid(), counter)
+    return counter
+
+
+def record(intent: str, source: str):
+    """Count one reply to a question of this intent, answered by source"""
+    counter = get_counter()
+    if counter is not None:
+        counter.record(intent, source)
+
+
+def flush() -> int:
+    pid, counter = _counter
+    if counter is None or pid != os.getpid():
+        return 0
+    return counter.flush()
+
+
+def reset():
+    """Stop this process's counter and forget its counts (tests)"""
+    global _counter
+    with _counter_lock:
+        pid, counter = _counter
+        _counter = (None, None)
+    if counter is not None and pid == os.getpid():
+        with counter._lock:
+            counter._counts.clear()
+        counter.close()
+
+
+def report(start: datetime, end: datetime, source: Optional[str] = None, by_hour: bool = False) -> Dict:
+    """
+    Replies per intent in the hours from start to end, most asked first, with
+    their split by source and share of all replies; by_hour adds the totals
+    of each hour.
+    """
+    start, end = hour_of(start), hour_of(end - timedelta(microseconds=1)) + timedelta(hours=1)
+    rows = IntentRollup.objects.filter(hour__gte=start, hour__lt=end)
+    if source:
+        rows = rows.filter(source=source)
+    counts = Counter()
+    for hour, intent, row_source, count in rows.values_list('hour', 'intent', 'source', 'count'):
+        counts[(hour, intent, row_source)] += count
+    pid, counter = _counter
+    if counter is not None and pid == os.getpid():
+        for (hour, intent, row_source), count in counter.pending().items():
+            if start <= hour < end and (not source or row_source == source):
+                counts[(hour, intent, row_source)] += count
+
+    total = sum(counts.values())
+    intents = defaultdict(Counter)
+    sources = Counter()
+    hours = Counter()
+    for (hour, intent, row_source), count in counts.items():
+        intents[intent][row_source] += count
+        sources[row_source] += count
+        hours[hour] += count
+
+    def share(count):
+        return round(count / total, 4) if total else 0.0
+
+    result = {
+        'total': total,
+        'sources': dict(sources),
+        'default_share': share(sum(intents[DEFAULT_INTENT].values())),
+        'intents': [
+            {'intent': intent, 'count': sum(by_source.values()), 'share': share(sum(by_source.values())),
+             'sources': dict(by_source)}
+            for intent, by_source in sorted(intents.items(), key=lambda item: (-sum(item[1].values()), item[0]))
+        ],
+    }
+    if by_hour:
+        result['hours'] = [{'hour': hour.isoformat(), 'count': count} for hour, count in sorted(hours.items())]
+    return result
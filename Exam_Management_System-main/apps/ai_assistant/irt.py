@@ -0,0 +1,235 @@
+"""
+Item response theory: calibration of questions and students, and adaptive
+question selection.
+
+The two-parameter logistic model: a student of ability theta answers a
+question of difficulty b and discrimination a correctly with probability
+
+    P = 1 / (1 + exp(-a * (theta - b)))
+
+Responses are a sparse student x question matrix stored as three
+parallel arrays (student index, question index, correct), so every sum
+over a student's or a question's responses is one np.bincount over all
+responses. fit() is joint maximum a posteriori estimation: normal
+priors on abilities and difficulties, a log-normal prior on
+discriminations (the priors keep all-correct and all-wrong rows finite).
+Each iteration takes one Newton step for every student at once (abilities
+are independent given the questions), then one Fisher-scoring step for
+every question's (b, log a) pair at once, so an iteration costs a few
+passes over the response arrays.
+
+A previous Fit warm-starts the next one, and update masks hold the
+parameters of untouched students and questions fixed, which is how new
+answers are folded in without a full refit (calibration.py).
+
+select_items() assembles a test for one ability: the questions whose
+success probability is nearest a target (or with the most information),
+picking at random among the best few so students at the same level do
+not all get the same paper.
+"""
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+ABILITY_PRIOR_SD = 1.0
+DIFFICULTY_PRIOR_SD = 2.0
+LOG_DISCRIMINATION_PRIOR_SD = 0.5
+MAX_STEP = 1.0  # largest change of any parameter per iteration
+
+
+class Responses:
+    """A sparse student x question matrix of right (1) and wrong (0) answers"""
+
+    def __init__(self, student_ids: Sequence, question_ids: Sequence, correct: Sequence):
+        self.student_labels, self.students = np.unique(np.asarray(student_ids, dtype=np.int64), return_inverse=True)
+        self.question_labels, self.questions = np.unique(np.asarray(question_ids, dtype=np.int64), return_inverse=True)
+        self.correct = np.asarray(correct, dtype=np.float64)
+        if not len(self.students) == len(self.questions) == len(self.correct):
+            raise ValueError('Response columns must have the same length')
+
+    def __len__(self):
+        return len(self.correct)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.student_labels), len(self.question_labels)
+
+    @classmethod
+    def synthetic(cls, students: int, questions: int, per_student: int, seed: int = 0):
+        """Simulated answers and the true (ability, difficulty, discrimination) behind them"""
+        rng = np.random.default_rng(seed)
+        ability = rng.normal(size=students)
+        difficulty = rng.normal(size=questions)
+        discrimination = rng.lognormal(0.0, 0.3, size=questions)
+        per_student = min(per_student, questions)
+        student_index = np.repeat(np.arange(students), per_student)
+        # Distinct questions per student: a window of a shuffled question order
+        order = rng.permutation(questions)
+        offsets = rng.integers(questions, size=students)
+        question_index = order[(offsets[:, None] + np.arange(per_student)) % questions].ravel()
+        p = _sigmoid(discrimination[question_index] * (ability[student_index] - difficulty[question_index]))
+        correct = rng.random(len(p)) < p
+        return cls(student_index + 1, question_index + 1, correct), (ability, difficulty, discrimination)
+
+
+class Fit(NamedTuple):
+    student_ids: np.ndarray
+    ability: np.ndarray
+    ability_se: np.ndarray
+    question_ids: np.ndarray
+    difficulty: np.ndarray
+    discrimination: np.ndarray
+    iterations: int
+    converged: bool
+
+    def abilities(self) -> dict:
+        return dict(zip(self.student_ids.tolist(), self.ability.tolist()))
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * z))  # no overflow warnings for large |z|
+
+
+def probability(ability, difficulty, discrimination) -> np.ndarray:
+    """P(correct) for abilities against questions (broadcasting)"""
+    return _sigmoid(np.asarray(discrimination) * (np.asarray(ability) - np.asarray(difficulty)))
+
+
+def information(ability, difficulty, discrimination) -> np.ndarray:
+    """Fisher information of questions about an ability: a^2 P (1 - P)"""
+    p = probability(ability, difficulty, discrimination)
+    return np.asarray(discrimination) ** 2 * p * (1.0 - p)
+
+
+def _start(labels: np.ndarray, warm_ids: Optional[np.ndarray], warm_values: Optional[np.ndarray],
+           default: np.ndarray) -> np.ndarray:
+    """default, overwritten by warm values for the labels they cover"""
+    values = default.copy()
+    if warm_ids is not None and len(warm_ids):
+        order = np.argsort(warm_ids)
+        position = np.searchsorted(warm_ids[order], labels)
+        position = np.minimum(position, len(order) - 1)
+        found = warm_ids[order][position] == labels
+        values[found] = warm_values[order][position[found]]
+    return values
+
+
+def fit(responses: Responses, warm: Optional[Fit] = None, max_iterations: int = 100, tolerance: float = 1e-3,
+        update_students: Optional[np.ndarray] = None, update_questions: Optional[np.ndarray] = None) -> Fit:
+    """
+    Estimate abilities, difficulties and discriminations from responses.
+
+    warm supplies starting values (matched by id); update_students and
+    update_questions are boolean masks over responses.student_labels /
+    question_labels of the parameters to estimate, the rest stay at their
+    starting values. Stops once no parameter moves more than tolerance.
+    """
+    n_students, n_questions = responses.shape
+    s, q, y = responses.students, responses.questions, responses.correct
+
+    # Cold start: difficulty from the share answered correctly, ability from the student's own share
+    share = (np.bincount(q, y, n_questions) + 0.5) / (np.bincount(q, minlength=n_questions) + 1.0)
+    own = (np.bincount(s, y, n_students) + 0.5) / (np.bincount(s, minlength=n_students) + 1.0)
+    b = _start(responses.question_labels, warm and warm.question_ids, warm and warm.difficulty,
+               np.log((1.0 - share) / share))
+    log_a = _start(responses.question_labels, warm and warm.question_ids,
+                   warm and np.log(warm.discrimination), np.zeros(n_questions))
+    theta = _start(responses.student_labels, warm and warm.student_ids, warm and warm.ability,
+                   np.log(own / (1.0 - own)))
+    move_students = np.ones(n_students, bool) if update_students is None else np.asarray(update_students, bool)
+    move_questions = np.ones(n_questions, bool) if update_questions is None else np.asarray(update_questions, bool)
+
+    theta_precision = 1.0 / ABILITY_PRIOR_SD ** 2
+    b_precision = 1.0 / DIFFICULTY_PRIOR_SD ** 2
+    log_a_precision = 1.0 / LOG_DISCRIMINATION_PRIOR_SD ** 2
+    converged = False
+    iterations = 0
+    theta_information = np.full(n_students, theta_precision)
+    for iterations in range(1, max_iterations + 1):
+        # Abilities, questions fixed: one Newton step per student
+        a = np.exp(log_a)
+        a_r = a[q]
+        p = _sigmoid(a_r * (theta[s] - b[q]))
+        w = p * (1.0 - p)
+        gradient = np.bincount(s, a_r * (y - p), n_students) - theta * theta_precision
+        theta_information = np.bincount(s, a_r * a_r * w, n_students) + theta_precision
+        theta_step = np.clip(gradient / theta_information, -MAX_STEP, MAX_STEP) * move_students
+        theta += theta_step
+
+        # Questions, abilities fixed: one Fisher-scoring step on (b, log a) per question
+        z = a_r * (theta[s] - b[q])
+        p = _sigmoid(z)
+        w = p * (1.0 - p)
+        residual = y - p
+        g_b = np.bincount(q, -a_r * residual, n_questions) - b * b_precision
+        g_a = np.bincount(q, z * residual, n_questions) - log_a * log_a_precision
+        h_bb = np.bincount(q, a_r * a_r * w, n_questions) + b_precision
+        h_aa = np.bincount(q, z * z * w, n_questions) + log_a_precision
+        h_ba = np.bincount(q, -a_r * z * w, n_questions)
+        determinant = h_bb * h_aa - h_ba * h_ba
+        b_step = np.clip((h_aa * g_b - h_ba * g_a) / determinant, -MAX_STEP, MAX_STEP) * move_questions
+        a_step = np.clip((h_bb * g_a - h_ba * g_b) / determinant, -MAX_STEP, MAX_STEP) * move_questions
+        b += b_step
+        log_a += a_step
+
+        largest = max(np.abs(theta_step).max(initial=0.0), np.abs(b_step).max(initial=0.0),
+                      np.abs(a_step).max(initial=0.0))
+        if largest < tolerance:
+            converged = True
+            break
+
+    return Fit(responses.student_labels, theta, 1.0 / np.sqrt(theta_information),
+               responses.question_labels, b, np.exp(log_a), iterations, converged)
+
+
+def ability_from_answers(difficulty: Sequence[float], discrimination: Sequence[float], correct: Sequence[float],
+                         start: float = 0.0, iterations: int = 20) -> Tuple[float, float]:
+    """(ability, standard error) of one student from answers to calibrated questions"""
+    b = np.asarray(difficulty, dtype=np.float64)
+    a = np.asarray(discrimination, dtype=np.float64)
+    y = np.asarray(correct, dtype=np.float64)
+    precision = 1.0 / ABILITY_PRIOR_SD ** 2
+    theta = float(start)
+    info = precision
+    for _ in range(iterations):
+        p = _sigmoid(a * (theta - b))
+        info = float(np.sum(a * a * p * (1.0 - p))) + precision
+        step = float(np.clip((np.sum(a * (y - p)) - theta * precision) / info, -MAX_STEP, MAX_STEP))
+        theta += step
+        if abs(step) < 1e-6:
+            break
+    return theta, 1.0 / np.sqrt(info)
+
+
+def select_items(ability: float, difficulty: Sequence[float], discrimination: Sequence[float], count: int,
+                 target: Optional[float] = None, exclude: Optional[np.ndarray] = None,
+                 randomesque: int = 3, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Indices of count questions for a student of this ability.
+
+    With a target success probability, the questions whose P(correct) is
+    nearest it; otherwise those with the most information at the ability.
+    Each pick is random among the best `randomesque` remaining questions.
+    exclude is a boolean mask of questions not to use (already answered).
+    """
+    b = np.asarray(difficulty, dtype=np.float64)
+    a = np.asarray(discrimination, dtype=np.float64)
+    if target is None:
+        score = information(ability, b, a)
+    else:
+        score = -np.abs(probability(ability, b, a) - target)
+    if exclude is not None:
+        score = np.where(exclude, -np.inf, score)
+    available = int(np.isfinite(score).sum())
+    if available < count:
+        raise ValueError(f'Only {available} questions available, {count} requested')
+    # Best count * randomesque candidates, then a random ordered draw among them
+    shortlist_size = min(available, count * max(1, randomesque))
+    shortlist = np.argpartition(-score, shortlist_size - 1)[:shortlist_size]
+    shortlist = shortlist[np.argsort(-score[shortlist], kind='stable')]
+    if randomesque <= 1 or shortlist_size == count:
+        return shortlist[:count]
+    rng = rng or np.random.default_rng()
+    # Weighted towards the best: each rank is picked with weight 1 / (1 + rank / count)
+    weights = 1.0 / (1.0 + np.arange(shortlist_size) / count)
+    return rng.choice(shortlist, size=count, replace=False, p=weights / weights.sum())
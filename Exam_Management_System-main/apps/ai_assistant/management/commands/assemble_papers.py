@@ -0,0 +1,71 @@
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant.assembly import PaperAssembler, PaperSpec, QuestionPool
+
+
+def _counts(value: str) -> dict:
+    """'easy=20,medium=12,hard=8' -> {'easy': 20, ...}"""
+    try:
+        return {k.strip(): int(v) for k, v in (part.split('=') for part in value.split(',') if part)}
+    except ValueError:
+        raise CommandError(f'Expected name=count pairs, got {value!r}')
+
+
+class Command(BaseCommand):
+    help = 'Assemble randomized paper variants and stream them as JSON lines'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--subjects', help='Comma-separated subject ids whose questions form the pool')
+        source.add_argument('--synthetic', type=int, metavar='POOL_SIZE', help='Use a generated pool (for trials)')
+        parser.add_argument('--count', type=int, default=100, help='Variants to produce (default 100)')
+        parser.add_argument('--per-topic', type=int, default=5, help='Questions per subject (default 5)')
+        parser.add_argument('--mix', help='Questions per difficulty, e.g. easy=20,medium=12,hard=8')
+        parser.add_argument('--total-marks', type=int)
+        parser.add_argument('--tolerance', type=int, default=0, help='Allowed deviation from --total-marks')
+        parser.add_argument('--max-overlap', type=float, default=1.0,
+                            help='Largest fraction of questions two variants may share (default 1.0)')
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--output', help='File to write (default stdout)')
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            pool = QuestionPool.synthetic(options['synthetic'], seed=options['seed'] or 0)
+        else:
+            try:
+                Question = apps.get_model('exams', 'Question')
+            except LookupError:
+                raise CommandError('The exams app is not installed; use --synthetic')
+            subject_ids = [int(s) for s in options['subjects'].split(',') if s]
+            pool = QuestionPool.from_questions(
+                Question.objects.filter(subject_id__in=subject_ids).only('id', 'subject_id', 'marks')
+            )
+            if not len(pool):
+                raise CommandError('No questions found for those subjects')
+
+        spec = PaperSpec(
+            topic_counts={topic: options['per_topic'] for topic in pool.topic_labels.tolist()},
+            difficulty_mix=_counts(options['mix']) if options['mix'] else None,
+            total_marks=options['total_marks'],
+            marks_tolerance=options['tolerance'],
+            max_overlap=options['max_overlap'],
+        )
+        try:
+            assembler = PaperAssembler(pool, spec, seed=options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        out = open(options['output'], 'w') if options['output'] else self.stdout
+        try:
+            for variant in assembler.generate(options['count']):
+                out.write(json.dumps(variant._asdict()) + '\n')
+                out.flush()
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if options['output']:
+                out.close()
+        self.stderr.write(f'{assembler.accepted} variants; {assembler.stats}')
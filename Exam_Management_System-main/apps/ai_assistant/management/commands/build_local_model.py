@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from apps.ai_assistant import intents
+
+DEFAULT_OUTPUT = Path(__file__).resolve().parents[2] / 'local_models' / 'tiny_chat.json'
+
+
+def _entries(rules, path=()):
+    for rule in rules:
+        keywords = path + rule.keywords
+        if rule.reply is not None and keywords:
+            yield {'intent': rule.intent, 'text': ' '.join(keywords), 'reply': rule.reply}
+        yield from _entries(rule.children, keywords)
+
+
+class Command(BaseCommand):
+    help = 'Build the tiny retrieval model for the local inference server from the rule table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(DEFAULT_OUTPUT))
+        parser.add_argument('--dim', type=int, default=1024, help='Hashed feature dimensions (default 1024)')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Minimum similarity before the default reply is used (default 0.1)')
+
+    def handle(self, *args, **options):
+        model = {
+            'format': 'bow-retrieval',
+            'dim': options['dim'],
+            'threshold': options['threshold'],
+            'default': intents.DEFAULT_REPLY,
+            'entries': list(_entries(intents.STUDENT_RULES)),
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(model, f, indent=1, ensure_ascii=False)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(f"{len(model['entries'])} entries written to {options['output']}"))
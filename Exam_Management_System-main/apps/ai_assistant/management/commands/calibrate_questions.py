@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant import calibration
+
+
+class Command(BaseCommand):
+    help = ("Fit question difficulty / discrimination and student ability from exam answers "
+            "(item response theory, see apps/ai_assistant/calibration.py)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only fold in answers given since the last fit')
+
+    def handle(self, *args, **options):
+        if calibration._response_model() is None:
+            raise CommandError('The exams app is not installed: there are no answers to calibrate from')
+        start = time.monotonic()
+        result = calibration.refit(incremental=options['incremental'])
+        if result is None:
+            self.stdout.write('No new answers to fit')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['questions']} questions and {result['students']} students calibrated from "
+            f"{result['responses']} answers in {result['iterations']} iterations "
+            f"({'converged' if result['converged'] else 'not converged'}) in {time.monotonic() - start:.2f}s"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant import sharding
+
+
+class Command(BaseCommand):
+    help = 'Apply migrations to every chat shard database (only the sharded chat tables are created there)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', action='append', dest='shards',
+                            help='Only this shard (repeatable; default all)')
+        parser.add_argument('--plan', action='store_true', help='Show the migrations that would run')
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Chat sharding is off: set AI_ASSISTANT_SHARDING['ENABLED'] and SHARDS")
+        shards = options['shards'] or sharding.shards()
+        unknown = set(shards) - set(sharding.shards())
+        if unknown:
+            raise CommandError(f"Not a configured shard: {', '.join(sorted(unknown))}")
+        for alias in shards:
+            self.stdout.write(f'Migrating {alias}')
+            call_command('migrate', database=alias, plan=options['plan'], interactive=False,
+                         verbosity=max(0, options['verbosity'] - 1), stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'{len(shards)} chat shards migrated'))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai_assistant import precompute
+
+
+class Command(BaseCommand):
+    help = ("Prepare predictions, weak areas and practice tests for students with an exam coming up, "
+            "during off-peak hours (runs until stopped unless --once)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, help='Exams starting within this many hours (default from settings)')
+        parser.add_argument('--workers', type=int, help='Worker processes; 0 runs jobs in this process')
+        parser.add_argument('--per-minute', type=float, help='Most jobs started per minute')
+        parser.add_argument('--once', action='store_true', help='One pass, then exit')
+        parser.add_argument('--ignore-window', action='store_true', help='Run outside the off-peak windows too')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the jobs')
+
+    def handle(self, *args, **options):
+        config = precompute.get_config()
+        while True:
+            if options['ignore_window'] or precompute.in_off_peak():
+                self.run_pass(options)
+            else:
+                self.stdout.write(f"Outside the off-peak windows {', '.join(config['OFF_PEAK'])}")
+            if options['once']:
+                return
+            time.sleep(config['POLL_SECONDS'])
+
+    def run_pass(self, options):
+        jobs = precompute.upcoming_jobs(hours=options['hours'])
+        self.stdout.write(f'{len(jobs)} student exams coming up')
+        if options['dry_run']:
+            for job in jobs:
+                self.stdout.write(f'  user {job.user_id}: exam {job.exam_id} ({job.subject}) at {job.starts_at:%Y-%m-%d %H:%M}')
+            return
+
+        def report(job, outcome):
+            if options['verbosity'] > 1 or outcome.startswith('failed'):
+                self.stdout.write(f'  user {job.user_id}, exam {job.exam_id}: {outcome}')
+
+        def window_closed():
+            return not options['ignore_window'] and not precompute.in_off_peak()
+
+        start = time.monotonic()
+        counts = precompute.run(jobs, options['workers'], options['per_minute'], window_closed, report)
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['prepared']} prepared, {counts['skipped']} already prepared, {counts['failed']} failed "
+            f'in {time.monotonic() - start:.1f}s'
+        ))
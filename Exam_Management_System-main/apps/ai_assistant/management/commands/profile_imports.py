@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant.importtime import profile_imports, total_us
+
+
+class Command(BaseCommand):
+    help = 'Report the heaviest imports of a cold start (django.setup() plus the given modules)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', default=['apps.ai_assistant.views'],
+                            help='Modules to import after django.setup()')
+        parser.add_argument('--top', type=int, default=20, help='Rows to show (default 20)')
+        parser.add_argument('--budget-ms', type=float,
+                            default=getattr(settings, 'AI_ASSISTANT_IMPORT_BUDGET_MS', None),
+                            help='Fail if the total import time exceeds this many milliseconds')
+        parser.add_argument('--forbid', action='append', default=[],
+                            help='Fail if this module is imported at startup (repeatable)')
+
+    def handle(self, *args, **options):
+        code = 'import django; django.setup()\n' + ''.join(f'import {m}\n' for m in options['modules'])
+        try:
+            records = profile_imports(code, settings.SETTINGS_MODULE)
+        except RuntimeError as e:
+            raise CommandError(f'Profiled interpreter failed:\n{e}')
+
+        total_ms = total_us(records) / 1000
+        self.stdout.write(f'{len(records)} modules imported in {total_ms:.1f} ms\n')
+        self.stdout.write(f'{"cumulative ms":>14} {"self ms":>9}  module')
+        heaviest = sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:options['top']]
+        for r in heaviest:
+            self.stdout.write(f'{r.cumulative_us / 1000:>14.1f} {r.self_us / 1000:>9.1f}  {r.module}')
+
+        imported = {r.module for r in records}
+        problems = [f'{name} is imported at startup' for name in options['forbid'] if name in imported]
+        budget = options['budget_ms']
+        if budget is not None and total_ms > budget:
+            problems.append(f'import time {total_ms:.1f} ms exceeds budget of {budget:.1f} ms')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Startup import profile within limits'))
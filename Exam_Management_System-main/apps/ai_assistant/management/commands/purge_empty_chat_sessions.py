@@ -0,0 +1,58 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.ai_assistant import sharding
+from apps.ai_assistant.models import ChatSession
+
+
+class Command(BaseCommand):
+    help = 'Delete chat sessions that never received a message, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Sessions deleted per transaction (default 1000)')
+        parser.add_argument('--older-than-hours', type=float, default=24,
+                            help='Only purge sessions untouched for this long (default 24)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to ease write pressure')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count what would be deleted without deleting')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        # Sessions with generated artifacts are kept even if nobody chatted in them
+        empty = ChatSession.objects.filter(
+            message_count=0,
+            updated_at__lt=cutoff,
+            messages__isnull=True,
+            predictions__isnull=True,
+            practice_tests__isnull=True,
+            weak_areas__isnull=True,
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'{sharding.count(empty)} empty sessions would be deleted')
+            return
+
+        total = 0
+        # Once per database holding chats (every shard when sharded, see sharding.py)
+        for using, shard_empty in sharding.fan_out(empty):
+            last_id = 0
+            while True:
+                ids = list(
+                    shard_empty.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                deleted, _ = ChatSession.objects.using(using).filter(id__in=ids, message_count=0).delete()
+                total += deleted
+                last_id = ids[-1]
+                self.stdout.write(f'Deleted batch ending at id {last_id} ({total} rows so far)')
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} empty chat sessions'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant import sharding
+
+
+class Command(BaseCommand):
+    help = ("Move users' chats to the shard the hash ring assigns them, after adding a shard "
+            "or turning sharding on (chats in 'default' are moved too)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Only move users out of this database (repeatable; default all)')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after moving this many users')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between users to ease write pressure')
+        parser.add_argument('--dry-run', action='store_true', help='Only report who would move where')
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Chat sharding is off: set AI_ASSISTANT_SHARDING['ENABLED'] and SHARDS")
+        databases = options['databases'] or sharding.databases()
+        users = 0
+        rows = 0
+        for source in databases:
+            misplaced = sharding.misplaced_users(source)
+            self.stdout.write(f'{source}: {len(misplaced)} users to move')
+            for user_id in misplaced:
+                if options['limit'] and users >= options['limit']:
+                    break
+                target = sharding.shard_for_user(user_id)
+                if options['dry_run']:
+                    self.stdout.write(f'  user {user_id}: {source} -> {target}')
+                    users += 1
+                    continue
+                moved = sharding.move_user(user_id, source, target)
+                users += 1
+                rows += sum(moved.values())
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'  user {user_id}: {source} -> {target} {moved}')
+                if options['pause']:
+                    time.sleep(options['pause'])
+        verb = 'would move' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(f'{users} users {verb}' + ('' if options['dry_run'] else f' ({rows} rows)')))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.ai_assistant import rollups, sharding
+from apps.ai_assistant.models import CohortRollup, Prediction, WeakArea
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cohort analytics rollups from every prediction and weak area'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Source rows read per query (default 2000)')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        with transaction.atomic():
+            CohortRollup.objects.all().delete()
+            for model, observe in ((Prediction, rollups.prediction_observations),
+                                   (WeakArea, rollups.weak_area_observations)):
+                total = 0
+                # Every shard's rows when chat data is sharded (sharding.py)
+                for _, rows in sharding.fan_out(model.objects.all()):
+                    last_id = 0
+                    while True:
+                        batch = list(rows.filter(id__gt=last_id).order_by('id')[:batch_size])
+                        if not batch:
+                            break
+                        rollups.apply(observe(batch))
+                        total += len(batch)
+                        last_id = batch[-1].id
+                self.stdout.write(f'{model.__name__}: {total} rows rolled up')
+        self.stdout.write(self.style.SUCCESS(f'{CohortRollup.objects.count()} rollup rows'))
@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant import replay
+
+
+class Command(BaseCommand):
+    help = ("Replay users' chat messages (from the database or an export file) through assistant engines "
+            "and report throughput, latencies and replies that differ from the first engine's")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Export file or write-behind journal segment (.gz allowed); default: the database')
+        parser.add_argument('--engine', action='append', dest='engines',
+                            help="rule, cached, stub[:ms], local_model[:path] or a dotted path; repeat to compare, "
+                                 f"the first is the baseline (default: {', '.join(replay.DEFAULT_ENGINES)})")
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU); 0 runs in this process')
+        parser.add_argument('--chunk-size', type=int, default=replay.CHUNK_SIZE)
+        parser.add_argument('--limit', type=int, help='Replay at most this many messages')
+        parser.add_argument('--diffs', help='Write every message whose replies differ to this file (JSON lines)')
+        parser.add_argument('--samples', type=int, default=3, help='Differing messages to print')
+        parser.add_argument('--export', help='Write the messages to this export file instead of replaying them')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                messages = replay.file_messages(options['file'])
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['file']}: {e}")
+            if options['limit'] is not None:
+                messages = (m for _, m in zip(range(options['limit']), messages))
+        else:
+            messages = replay.db_messages(options['limit'])
+
+        if options['export']:
+            count = replay.export_messages(messages, options['export'])
+            self.stdout.write(self.style.SUCCESS(f"{count} messages written to {options['export']}"))
+            return
+
+        specs = options['engines'] or list(replay.DEFAULT_ENGINES)
+        diff_file = open(options['diffs'], 'w', encoding='utf-8') if options['diffs'] else None
+        try:
+            on_diff = (lambda diff: diff_file.write(json.dumps(diff) + '\n')) if diff_file else None
+            report = replay.run(messages, specs, options['workers'], options['chunk_size'], on_diff, options['samples'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if diff_file:
+                diff_file.close()
+
+        summary = report.summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {summary['messages']} messages through {len(specs)} engines in {summary['elapsed']:.1f}s "
+            f"({summary['per_second']:.0f} messages/s)"
+        ))
+        for engine in summary['engines']:
+            if engine['engine'] == summary['baseline']:
+                compared = 'baseline'
+            else:
+                compared = f"{engine['differ']} replies ({engine['differ_share']:.2%}) differ from {summary['baseline']}"
+            self.stdout.write(
+                f"  {engine['engine']}: p50 {engine['p50_ms']:.3f} ms, p90 {engine['p90_ms']:.3f} ms, "
+                f"p99 {engine['p99_ms']:.3f} ms, max {engine['max_ms']:.3f} ms, "
+                f"{engine['per_second']:.0f} messages/s per core, {engine['errors']} errors; {compared}"
+            )
+        for diff in report.diffs[:options['samples']]:
+            self.stdout.write(f"\nMessage {diff['id']}: {diff['content'][:200]!r}")
+            for spec, reply in diff['replies'].items():
+                self.stdout.write(f'  {spec}: {reply[:200]!r}')
+        if diff_file:
+            self.stdout.write(f"Differing messages written to {options['diffs']}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_assistant import writebehind
+
+
+class Command(BaseCommand):
+    help = 'Store chat messages left in write-behind journal segments by processes that stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journal-dir', help='Journal directory (default from settings)')
+        parser.add_argument('--force', action='store_true',
+                            help='Replay without file locks (Windows); only while no worker is running')
+
+    def handle(self, *args, **options):
+        directory = options['journal_dir'] or writebehind.get_config()['JOURNAL_DIR']
+        if not directory:
+            raise CommandError("No journal directory: set AI_ASSISTANT_WRITE_BEHIND['JOURNAL_DIR'] or --journal-dir")
+        segments, rows = writebehind.replay(directory, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'{rows} messages stored from {segments} segments'))
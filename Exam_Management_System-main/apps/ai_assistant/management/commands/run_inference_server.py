@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.ai_assistant.inference import InferenceServer, get_config, load_model
+
+
+class Command(BaseCommand):
+    help = 'Run the local model in this process and serve batched requests from the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', help="'host:port' or a Unix socket path (default from settings)")
+        parser.add_argument('--model', help='Model file (default from settings)')
+        parser.add_argument('--max-batch', type=int, help='Largest micro-batch')
+        parser.add_argument('--max-wait-ms', type=float, help='How long a request may wait for a batch to fill')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        for option, key in (('address', 'ADDRESS'), ('model', 'PATH'),
+                            ('max_batch', 'MAX_BATCH'), ('max_wait_ms', 'MAX_WAIT_MS')):
+            if options[option] is not None:
+                config[key] = options[option]
+
+        model = load_model(config)
+        server = InferenceServer(model, config['ADDRESS'], config['AUTHKEY'].encode(),
+                                 config['MAX_BATCH'], config['MAX_WAIT_MS'])
+        self.stdout.write(f"Serving {config['PATH']} on {server.address} "
+                          f"(batches of up to {config['MAX_BATCH']}, {config['MAX_WAIT_MS']} ms max wait)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            self.stdout.write(f'Stopped; {server.batcher.stats}')
@@ -0,0 +1,43 @@
+# Generated migration file
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('predicted_score', models.FloatField()),
+                ('confidence', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='ai_assistant.chatsession')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PracticeTest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_tests', to='ai_assistant.chatsession')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeakArea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=255)),
+                ('severity', models.IntegerField(default=1)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weak_areas', to='ai_assistant.chatsession')),
+            ],
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated migration file
+
+from django.db import migrations, models
+
+from ..models import AUTO_TITLE_LENGTH, DEFAULT_SESSION_TITLES, PREVIEW_LENGTH, _shorten
+
+
+BATCH_SIZE = 500
+
+
+def backfill_message_summary(apps, schema_editor):
+    """
+    Populate the denormalized counters for sessions created before this
+    migration, and title the sessions still named by default after their
+    first user message, as ChatSession.record_messages does.
+    """
+    ChatSession = apps.get_model('ai_assistant', 'ChatSession')
+    ChatMessage = apps.get_model('ai_assistant', 'ChatMessage')
+    messages = ChatMessage.objects.filter(session_id=models.OuterRef('pk'))
+    last = messages.order_by('-created_at', '-id')
+    first_user = messages.filter(role='user').order_by('created_at', 'id')
+    count = messages.order_by().values('session_id').annotate(n=models.Count('id')).values('n')
+    last_id = 0
+    while True:
+        batch = list(
+            ChatSession.objects.filter(id__gt=last_id).order_by('id').annotate(
+                n=models.Subquery(count),
+                last_at=models.Subquery(last.values('created_at')[:1]),
+                last_content=models.Subquery(last.values('content')[:1]),
+                first_user_content=models.Subquery(first_user.values('content')[:1]),
+            )[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        changed = []
+        for session in batch:
+            if session.last_at is None:
+                continue
+            session.message_count = session.n
+            session.last_message_at = session.last_at
+            session.last_message_preview = _shorten(session.last_content, PREVIEW_LENGTH)
+            if session.title in DEFAULT_SESSION_TITLES and session.first_user_content is not None:
+                session.title = _shorten(session.first_user_content, AUTO_TITLE_LENGTH)
+            changed.append(session)
+        ChatSession.objects.bulk_update(
+            changed, ['message_count', 'last_message_at', 'last_message_preview', 'title'], batch_size=BATCH_SIZE)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0002_practicetest_prediction_weakarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='ai_session_user_updated_idx'),
+        ),
+        migrations.RunPython(backfill_message_summary, migrations.RunPython.noop),
+    ]
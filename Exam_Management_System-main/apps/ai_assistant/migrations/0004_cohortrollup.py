@@ -0,0 +1,46 @@
+# Generated migration file
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0003_chatsession_message_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='exam_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weakarea',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='CohortRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=40)),
+                ('day', models.DateField()),
+                ('department', models.CharField(blank=True, default='', max_length=100)),
+                ('semester', models.PositiveSmallIntegerField(default=0)),
+                ('exam_id', models.PositiveIntegerField(default=0)),
+                ('topic', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+                ('histogram', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'day', 'department', 'semester', 'exam_id', 'topic'), name='ai_rollup_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated migration file
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai_assistant', '0004_cohortrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='student',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='input_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='prediction',
+            constraint=models.UniqueConstraint(condition=models.Q(('exam_id__isnull', False)), fields=('student', 'exam_id', 'model_version', 'input_hash'), name='ai_prediction_unique_inputs'),
+        ),
+        migrations.AddConstraint(
+            model_name='prediction',
+            constraint=models.UniqueConstraint(condition=models.Q(('exam_id__isnull', True)), fields=('student', 'model_version', 'input_hash'), name='ai_prediction_unique_inputs_no_exam'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated migration file
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0005_prediction_inputs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['created_at'], name='ai_session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['created_at'], name='ai_message_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated migration file
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0008_shardable_user_links'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('intent', models.CharField(max_length=40)),
+                ('source', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='intentrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'intent', 'source'), name='ai_intent_rollup_unique_key'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated migration file
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0009_intentrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='client_message_id',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='in_reply_to',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True,
+                                    on_delete=django.db.models.deletion.DO_NOTHING, related_name='replies',
+                                    to='ai_assistant.chatmessage'),
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_message_id__isnull', False)),
+                                               fields=('client_message_id', 'session'),
+                                               name='ai_message_unique_client_id'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated migration file
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ai_assistant', '0010_chatmessage_client_message_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionCalibration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_id', models.PositiveIntegerField(unique=True)),
+                ('difficulty', models.FloatField()),
+                ('discrimination', models.FloatField()),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('fitted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentAbility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ability', models.FloatField()),
+                ('standard_error', models.FloatField()),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('fitted_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ability',
+                                              to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated migration file
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0011_questioncalibration_studentability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='practicetest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated migration file
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0012_practicetest_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='practicetest',
+            name='served_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
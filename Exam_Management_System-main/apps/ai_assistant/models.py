@@ -1,20 +1,87 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
 from django.conf import settings
+from django.utils import timezone
+
+
+# Titles given to sessions before the user has said anything; these get
+# replaced by a title derived from the first user message.
+DEFAULT_SESSION_TITLES = ('New Chat', 'Exam Assistant Chat')
+PREVIEW_LENGTH = 120
+AUTO_TITLE_LENGTH = 60
+
+
+def _shorten(text: str, length: int) -> str:
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    return text[:length - 1].rstrip() + '…'
 
 
 class ChatSession(models.Model):
     """Store chat sessions between users and AI assistant"""
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_sessions')
+    # No database constraint: with sharding (sharding.py) users live in another database
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_sessions',
+                             db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=255, default="New Chat")
+    # Denormalized from ChatMessage so session lists render from one query
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=255, blank=True, default='')
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at', '-id'], name='ai_session_user_updated_idx'),
+            # Admin date hierarchy / date filter
+            models.Index(fields=['created_at'], name='ai_session_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
+    @classmethod
+    def record_messages(cls, session_id, messages):
+        """Fold newly stored messages into the session's counters with a single UPDATE.
+
+        ``messages`` must be ordered oldest first and stored (in the session's
+        database). The title is replaced by the first user message while it is
+        still one of the default titles.
+        """
+        messages = list(messages)
+        if not messages:
+            return
+        last = messages[-1]
+        now = timezone.now()
+        changes = {
+            'message_count': F('message_count') + len(messages),
+            'last_message_at': last.created_at or now,
+            'last_message_preview': _shorten(last.content, PREVIEW_LENGTH),
+            'updated_at': now,
+        }
+        first_user = next((m for m in messages if m.role == 'user'), None)
+        if first_user is not None:
+            changes['title'] = Case(
+                When(title__in=DEFAULT_SESSION_TITLES, then=Value(_shorten(first_user.content, AUTO_TITLE_LENGTH))),
+                default=F('title'),
+            )
+        cls.objects.using(last._state.db).filter(pk=session_id).update(**changes)
+
+    def refresh_counters(self, save=True):
+        """Recompute the denormalized message columns from the messages table."""
+        last = self.messages.order_by('-created_at', '-id').first()
+        self.message_count = self.messages.count()
+        self.last_message_at = last.created_at if last else None
+        self.last_message_preview = _shorten(last.content, PREVIEW_LENGTH) if last else ''
+        if save:
+            ChatSession.objects.using(self._state.db).filter(pk=self.pk).update(
+                message_count=self.message_count,
+                last_message_at=self.last_message_at,
+                last_message_preview=self.last_message_preview,
+            )
+
 
 class ChatMessage(models.Model):
     """Store individual messages in a chat session"""
@@ -26,22 +93,69 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: messages buffered by writebehind.py keep the time they
+    # were sent when bulk_create stores them later.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Set by the client on the messages it sends, so a resent message is
+    # recognised instead of answered twice (idempotency.py)
+    client_message_id = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    # The user message an assistant message answers
+    in_reply_to = models.ForeignKey('self', on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                    blank=True, editable=False, related_name='replies')
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Admin date hierarchy / date filter
+            models.Index(fields=['created_at'], name='ai_message_created_idx'),
+        ]
+        constraints = [
+            # client_message_id first: drafts are looked up by it across a user's sessions
+            models.UniqueConstraint(
+                fields=['client_message_id', 'session'],
+                condition=models.Q(client_message_id__isnull=False),
+                name='ai_message_unique_client_id',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            ChatSession.record_messages(self.session_id, [self])
+
 
 class Prediction(models.Model):
     """Store simple ML predictions for a student/exam combination"""
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='predictions')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='predictions', db_constraint=False)
+    exam_id = models.PositiveIntegerField(null=True, blank=True)
+    # One row per distinct model input: see predictions.py
+    model_version = models.CharField(max_length=40, blank=True, default='')
+    input_hash = models.CharField(max_length=64, blank=True, default='')
     predicted_score = models.FloatField()
     confidence = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'exam_id', 'model_version', 'input_hash'],
+                condition=models.Q(exam_id__isnull=False),
+                name='ai_prediction_unique_inputs',
+            ),
+            # NULLs never collide in a unique index, so exam-less predictions need their own
+            models.UniqueConstraint(
+                fields=['student', 'model_version', 'input_hash'],
+                condition=models.Q(exam_id__isnull=True),
+                name='ai_prediction_unique_inputs_no_exam',
+            ),
+        ]
+
     def __str__(self):
         return f"Prediction {self.session.id}: {self.predicted_score} ({self.confidence})"
 
@@ -52,6 +166,10 @@ class PracticeTest(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Content is appended while the test is generated (services.save_practice_test), which bumps this
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set when a test prepared ahead of an exam is handed to the student (precompute.py)
+    served_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"PracticeTest {self.title} ({self.session.id})"
@@ -62,6 +180,89 @@ class WeakArea(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='weak_areas')
     topic = models.CharField(max_length=255)
     severity = models.IntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.topic} (sev {self.severity})"
+
+
+class CohortRollup(models.Model):
+    """
+    Materialized aggregate of one metric for a cohort, topic and day.
+
+    Kept up to date by signals as predictions and weak areas are written
+    (see rollups.py); `manage.py rebuild_rollups` recomputes it from scratch.
+    """
+    metric = models.CharField(max_length=40)
+    day = models.DateField()
+    department = models.CharField(max_length=100, blank=True, default='')
+    semester = models.PositiveSmallIntegerField(default=0)
+    exam_id = models.PositiveIntegerField(default=0)
+    topic = models.CharField(max_length=255, blank=True, default='')
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0.0)
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+    # Fixed-bin histogram; bins add up across rows, so percentiles of any
+    # slice come from merging its rows without touching the raw data.
+    histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['metric', 'day', 'department', 'semester', 'exam_id', 'topic'],
+                name='ai_rollup_unique_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} {self.day} {self.department}/{self.semester} ({self.count})"
+
+
+class IntentRollup(models.Model):
+    """
+    Assistant replies in one hour to questions of one intent, by who answered
+    (rule engine, local model or OpenAI). Written by intentstats.py from
+    per-process counters.
+    """
+    hour = models.DateTimeField()
+    intent = models.CharField(max_length=40)
+    source = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'intent', 'source'], name='ai_intent_rollup_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.intent} via {self.source} {self.hour:%Y-%m-%d %H}h ({self.count})"
+
+
+class QuestionCalibration(models.Model):
+    """
+    Item response theory parameters of one exams.Question, fitted from
+    student answers by `manage.py calibrate_questions` (calibration.py).
+    """
+    question_id = models.PositiveIntegerField(unique=True)
+    difficulty = models.FloatField()
+    discrimination = models.FloatField()
+    responses = models.PositiveIntegerField(default=0)
+    fitted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Question {self.question_id}: b={self.difficulty:.2f} a={self.discrimination:.2f}"
+
+
+class StudentAbility(models.Model):
+    """A student's ability on the same scale as QuestionCalibration difficulties"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ability')
+    ability = models.FloatField()
+    standard_error = models.FloatField()
+    responses = models.PositiveIntegerField(default=0)
+    fitted_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user} θ={self.ability:.2f} (±{self.standard_error:.2f})"
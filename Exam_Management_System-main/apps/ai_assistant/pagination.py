@@ -0,0 +1,99 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+SESSION_LIST_FIELDS = (
+    'id', 'user', 'title', 'created_at', 'updated_at',
+    'message_count', 'last_message_at', 'last_message_preview',
+)
+
+
+def encode_cursor(updated_at: datetime, pk: int) -> str:
+    raw = f'{updated_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """Return (updated_at, id) for a cursor, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        stamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(stamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_sessions(user, cursor: Optional[str] = None, page_size: int = 20):
+    """Return one page of a user's chat sessions plus the cursor for the next page.
+
+    Sessions are walked newest first on (updated_at, id), which is served by
+    the ai_session_user_updated_idx index, so every page is a single query
+    regardless of how many sessions the user has.
+    """
+    qs = (
+        user.chat_sessions.only(*SESSION_LIST_FIELDS)
+        .order_by('-updated_at', '-id')
+    )
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        updated_at, pk = position
+        qs = qs.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk))
+    page = list(qs[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1].updated_at, page[-1].id)
+    return page, next_cursor
+
+
+def estimated_row_count(model, using: str = 'default') -> Optional[int]:
+    """The database's own row estimate for a table (no scan), or None if it has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]),
+        'mysql': ('SELECT table_rows FROM information_schema.tables '
+                  'WHERE table_schema = DATABASE() AND table_name = %s', [table]),
+        # Filled in by ANALYZE; each stat starts with the rows in the table (or partial index)
+        'sqlite': ('SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    sql, params = queries[connection.vendor]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(row[0])
+    return estimate if estimate >= 0 else None  # PostgreSQL reports -1 before the first ANALYZE
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs an unbounded COUNT(*).
+
+    An unfiltered list of a large table is counted from the database's
+    statistics; anything else is counted exactly, but only up to
+    count_limit rows (a filter matching more shows count_limit results).
+    """
+    estimate_threshold = 100_000
+    count_limit = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
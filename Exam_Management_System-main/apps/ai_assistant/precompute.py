@@ -0,0 +1,264 @@
+"""
+Pre-exam precomputation of student artifacts.
+
+The night before an exam its students all ask for a prediction, their
+weak areas and a practice test at once. `manage.py precompute_exam_prep`
+prepares those ahead of time, during the OFF_PEAK windows (local time):
+
+1. upcoming_jobs() lists (student, exam) pairs for exams starting within
+   HORIZON_HOURS, from exams.ExamSchedule when that app is installed.
+2. Each job gets the student's "Exam prep" session for that exam, holding
+   the stored prediction (also put in the prediction cache, predictions.py),
+   weak areas and a PRACTICE_QUESTIONS-question practice test on the
+   exam's subject. A job whose practice test is already there is skipped,
+   so reruns only pick up new students and exams.
+3. Jobs run in a pool of WORKERS processes, started no faster than
+   JOBS_PER_MINUTE and with at most two jobs per worker in flight, so the
+   precompute never starves the web workers or floods the LLM provider.
+
+At peak time generate_practice serves a prepared test for the same
+subject and size (take_prepared_practice_test) instead of generating one:
+the test is marked served and copied into the session it was asked from,
+so each prepared test is served once and later requests are generated
+afresh. predict_results finds the stored prediction without running the
+model. Everything is in the database, so this works with any cache backend.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import predictions, services, sharding
+from .models import PracticeTest
+
+DEFAULTS = {
+    'HORIZON_HOURS': 24,
+    'OFF_PEAK': ['01:00-06:00'],
+    'WORKERS': 2,
+    'JOBS_PER_MINUTE': 120,
+    'PRACTICE_QUESTIONS': 10,
+    'USE_OPENAI': False,
+    'POLL_SECONDS': 300,
+}
+PREP_TITLE = 'Exam prep: {subject} ({day:%d %b})'
+FINISHED_STATUSES = ('completed', 'cancelled')
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_PRECOMPUTE', {}))
+    return config
+
+
+@dataclass(frozen=True)
+class Job:
+    user_id: int
+    exam_id: int
+    subject: str
+    starts_at: datetime
+
+
+def upcoming_jobs(now: Optional[datetime] = None, hours: Optional[float] = None) -> List[Job]:
+    """(student, exam) pairs of exams starting within hours of now, soonest first"""
+    try:
+        ExamSchedule = apps.get_model('exams', 'ExamSchedule')
+    except LookupError:
+        return []
+    now = now or timezone.now()
+    hours = get_config()['HORIZON_HOURS'] if hours is None else hours
+    start = timezone.localtime(now)
+    end = start + timedelta(hours=hours)
+    rows = (
+        ExamSchedule.objects
+        .filter(scheduled_date__range=(start.date(), end.date()), assigned_students__isnull=False)
+        .exclude(status__in=FINISHED_STATUSES)
+        .values_list('id', 'scheduled_date', 'start_time', 'question_paper__subject__name',
+                     'assigned_students__user_id')
+    )
+    jobs = []
+    for exam_id, day, start_time, subject, user_id in rows.iterator():
+        starts_at = timezone.make_aware(datetime.combine(day, start_time)) if settings.USE_TZ \
+            else datetime.combine(day, start_time)
+        if now <= starts_at <= end:
+            jobs.append(Job(user_id, exam_id, subject or 'General', starts_at))
+    return sorted(jobs, key=lambda job: (job.starts_at, job.exam_id, job.user_id))
+
+
+def _minutes(clock: str) -> int:
+    hours, minutes = clock.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def in_off_peak(now: Optional[datetime] = None, windows: Optional[Sequence[str]] = None) -> bool:
+    """Is local time inside one of the 'HH:MM-HH:MM' windows (which may wrap midnight)?"""
+    local = timezone.localtime(now or timezone.now())
+    minute = local.hour * 60 + local.minute
+    for window in get_config()['OFF_PEAK'] if windows is None else windows:
+        first, last = (_minutes(clock) for clock in window.split('-'))
+        if (first <= minute < last) if first <= last else (minute >= first or minute < last):
+            return True
+    return False
+
+
+class RateLimiter:
+    """Token bucket: acquire() blocks so that calls average at most per_minute"""
+
+    def __init__(self, per_minute: float, burst: int = 1, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            while True:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self.sleep((1 - self._tokens) * self.interval)
+
+
+# -- one job --------------------------------------------------------------
+
+def prep_session(job: Job):
+    """The student's prep session for this exam (on their shard), created on first use"""
+    user = get_user_model().objects.get(pk=job.user_id)
+    title = PREP_TITLE.format(subject=job.subject, day=timezone.localtime(job.starts_at))
+    session, _ = user.chat_sessions.get_or_create(title=title)
+    return session
+
+
+def take_prepared_practice_test(user, session, topics: List[str], num_questions: int,
+                                max_age_hours: Optional[float] = None) -> Optional[PracticeTest]:
+    """
+    A copy, saved in session, of a recent unserved prepared practice test of
+    the user for exactly these topics and size, or None. The prepared test
+    is marked served, so it is handed out once.
+    """
+    if len(topics) != 1:
+        return None
+    max_age = get_config()['HORIZON_HOURS'] if max_age_hours is None else max_age_hours
+    using = sharding.shard_for_user(user)
+    tests = (
+        PracticeTest.objects.using(using)
+        .filter(session__user=user, session__title__startswith='Exam prep: ',
+                title=services.practice_test_title(topics), served_at__isnull=True,
+                created_at__gte=timezone.now() - timedelta(hours=max_age))
+        .exclude(content='')
+        .order_by('-created_at')
+    )
+    for test in tests[:5]:
+        if test.content.count('\n') + 1 != num_questions:
+            continue
+        with transaction.atomic(using=using):
+            # Claimed by whichever request marks it first
+            if not PracticeTest.objects.using(using).filter(pk=test.pk, served_at__isnull=True).update(
+                    served_at=timezone.now()):
+                continue
+            return session.practice_tests.create(title=test.title, content=test.content)
+    return None
+
+
+def precompute_job(job: Job, practice_questions: Optional[int] = None, use_openai: Optional[bool] = None) -> str:
+    """Prepare one student's artifacts for one exam; 'prepared' or 'skipped' (already there)"""
+    config = get_config()
+    practice_questions = practice_questions or config['PRACTICE_QUESTIONS']
+    use_openai = config['USE_OPENAI'] if use_openai is None else use_openai
+    session = prep_session(job)
+    topics = [job.subject]
+    if session.practice_tests.filter(title=services.practice_test_title(topics)).exclude(content='').exists():
+        return 'skipped'
+    predictions.get_prediction(session, exam_id=job.exam_id)
+    if not session.weak_areas.exists():
+        services.analyze_weak_areas(session)
+    services.generate_practice_test(session, topics, practice_questions, use_openai=use_openai)
+    return 'prepared'
+
+
+def _init_worker():
+    import django
+    django.setup()  # a no-op when forked from a set-up process
+
+
+def _run_job(job: Dict, practice_questions: int, use_openai: bool) -> str:
+    try:
+        return precompute_job(Job(**job), practice_questions, use_openai)
+    finally:
+        connections.close_all()
+
+
+# -- a batch of jobs ------------------------------------------------------
+
+def run(jobs: Iterable[Job], workers: Optional[int] = None, per_minute: Optional[float] = None,
+        should_stop: Callable[[], bool] = lambda: False,
+        report: Callable[[Job, str], None] = lambda job, outcome: None) -> Dict[str, int]:
+    """
+    Run jobs in a pool of workers processes (in this process with workers=0),
+    starting at most per_minute per minute; returns counts per outcome.
+
+    should_stop is checked before each job is started (e.g. the off-peak
+    window closing); jobs already running finish.
+    """
+    config = get_config()
+    workers = config['WORKERS'] if workers is None else workers
+    limiter = RateLimiter(config['JOBS_PER_MINUTE'] if per_minute is None else per_minute)
+    args = (config['PRACTICE_QUESTIONS'], config['USE_OPENAI'])
+    counts = {'prepared': 0, 'skipped': 0, 'failed': 0}
+
+    def record(job, outcome):
+        counts[outcome if outcome in counts else 'failed'] += 1
+        report(job, outcome)
+
+    if workers <= 0:
+        for job in jobs:
+            if should_stop():
+                break
+            limiter.acquire()
+            try:
+                record(job, precompute_job(job, *args))
+            except Exception as e:
+                record(job, f'failed: {e}')
+        return counts
+
+    connections.close_all()  # forked workers must not share the parent's connections
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        running = {}
+
+        def collect(return_when):
+            done, _ = wait(running, return_when=return_when)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    record(job, future.result())
+                except Exception as e:
+                    record(job, f'failed: {e}')
+
+        for job in jobs:
+            if should_stop():
+                break
+            if len(running) >= workers * 2:
+                collect(FIRST_COMPLETED)
+            limiter.acquire()
+            running[pool.submit(_run_job, asdict(job), *args)] = job
+        if running:
+            collect(ALL_COMPLETED)
+    return counts
@@ -0,0 +1,144 @@
+"""
+Versioned, idempotent result predictions.
+
+A prediction is a pure function of the model version and its inputs (the
+student's graded results, plus the exam asked about), so it is stored once
+per (student, exam, model version, input hash) and reused until the inputs
+change:
+
+1. The Django cache holds the latest prediction for (student, exam,
+   version) under a per-student generation token.
+2. On a miss the inputs are read and hashed. A matching Prediction row is
+   reused; only new inputs run the model and insert a row.
+3. Writing or deleting a student's exam result bumps the generation
+   (see signals.py), so the next request goes back to step 2.
+
+The generation only reaches every worker when the cache is shared
+(Redis, Memcached, the database cache). With a per-process cache
+(LocMemCache, the default) a result graded in one worker cannot bump the
+others' generations, so a hit there is checked against the current input
+hash: one query for the inputs, still no model run. With a shared cache a
+hit costs no queries. Even then, a result written without signals (bulk
+loads) is noticed once the entry expires after
+AI_ASSISTANT_PREDICTION_CACHE_SECONDS.
+"""
+import hashlib
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+
+from .models import Prediction
+
+MODEL_VERSION = 'baseline-1'
+RECENT_RESULTS = 20
+PRIOR_SCORE = 65.0
+PRIOR_WEIGHT = 2
+
+
+def _cache_seconds() -> int:
+    return getattr(settings, 'AI_ASSISTANT_PREDICTION_CACHE_SECONDS', 3600)
+
+
+def _generation_key(student_id: int) -> str:
+    return f'ai:prediction-gen:{student_id}'
+
+
+def _generation(student_id: int) -> int:
+    return cache.get_or_set(_generation_key(student_id), time.time_ns, None)
+
+
+def _cache_is_shared() -> bool:
+    """Whether every worker process sees the same cache (and so the same generations)"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def invalidate(student_id: int) -> None:
+    """Forget every cached prediction of a student"""
+    cache.set(_generation_key(student_id), time.time_ns(), None)
+
+
+def prediction_inputs(student_id: int, exam_id: Optional[int]) -> Dict:
+    """The model's features: the student's most recent graded results"""
+    results = []
+    try:
+        StudentExamResult = apps.get_model('exams', 'StudentExamResult')
+    except LookupError:
+        StudentExamResult = None
+    if StudentExamResult is not None:
+        results = [
+            [schedule_id, round(percentage, 2)]
+            for schedule_id, percentage in StudentExamResult.objects
+            .filter(student__user_id=student_id)
+            .order_by('-graded_at', '-id')
+            .values_list('exam_schedule_id', 'percentage')[:RECENT_RESULTS]
+        ]
+    return {'exam_id': exam_id, 'results': results}
+
+
+def input_hash(inputs: Dict) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def baseline_model(inputs: Dict) -> Tuple[float, float]:
+    """Recency-weighted mean of past percentages, shrunk towards a prior; (score, confidence)"""
+    results = inputs['results']
+    weights = [1 / (1 + i) for i in range(len(results))]
+    total = PRIOR_SCORE * PRIOR_WEIGHT + sum(w * pct for w, (_, pct) in zip(weights, results))
+    score = total / (PRIOR_WEIGHT + sum(weights))
+    confidence = min(0.95, 0.5 + 0.05 * len(results))
+    return round(score, 1), round(confidence, 2)
+
+
+def _as_dict(prediction: Prediction) -> Dict:
+    return {
+        'id': prediction.id,
+        'predicted_score': prediction.predicted_score,
+        'confidence': prediction.confidence,
+        'exam_id': prediction.exam_id,
+        'model_version': prediction.model_version,
+        'input_hash': prediction.input_hash,
+        'created_at': prediction.created_at.isoformat(),
+    }
+
+
+def etag(result: Dict) -> str:
+    return f'"{result["model_version"]}-{result["input_hash"][:20]}"'
+
+
+def get_prediction(session, exam_id: Optional[int] = None, student_id: Optional[int] = None) -> Dict:
+    """Prediction for the session's student (or student_id) and exam, computing it at most once per input"""
+    student_id = student_id or session.user_id
+    key = f'ai:prediction:{student_id}:{exam_id or 0}:{MODEL_VERSION}:{_generation(student_id)}'
+    result = cache.get(key)
+    if result is not None and _cache_is_shared():
+        return result
+
+    inputs = prediction_inputs(student_id, exam_id)
+    current_hash = input_hash(inputs)
+    if result is not None and result['input_hash'] == current_hash:
+        return result  # per-process cache: still current, whatever the other workers graded
+    lookup = {'student_id': student_id, 'exam_id': exam_id, 'model_version': MODEL_VERSION,
+              'input_hash': current_hash}
+    # Predictions live with the session (in its shard, see sharding.py)
+    using = session._state.db or 'default'
+    prediction = Prediction.objects.using(using).filter(**lookup).first()
+    if prediction is None:
+        score, confidence = baseline_model(inputs)
+        try:
+            with transaction.atomic(using=using):
+                prediction = Prediction.objects.using(using).create(
+                    session=session, predicted_score=score, confidence=confidence, **lookup
+                )
+        except IntegrityError:
+            # A concurrent request stored the same inputs first
+            prediction = Prediction.objects.using(using).get(**lookup)
+
+    result = _as_dict(prediction)
+    cache.set(key, result, _cache_seconds())
+    return result
@@ -0,0 +1,223 @@
+"""
+Opt-in request profiling.
+
+With settings.AI_ASSISTANT_PROFILING['ENABLED'] off, the middleware removes
+itself at startup (MiddlewareNotUsed), so there is no per-request cost.
+When on, a request is profiled if it is the Nth sampled request, or if a
+staff user sends the trigger header. Each profile is stored as:
+
+    <id>.json            metadata (path, status, timings)
+    <id>.prof            raw cProfile stats (load with pstats / snakeviz)
+    <id>.collapsed.txt   collapsed stacks, for flamegraph.pl / speedscope
+    <id>.mem.txt         top allocation sites (if tracemalloc is enabled)
+
+in a directory that keeps only the newest MAX_PROFILES entries.
+"""
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_EVERY': 0,                  # profile 1 in N requests; 0 turns sampling off
+    'HEADER': 'X-Profile-Request',      # staff-only trigger header
+    'PATH_PREFIXES': ['/ai_assistant/'],
+    'DIRECTORY': None,                  # defaults to BASE_DIR / 'profiles'
+    'MAX_PROFILES': 50,
+    'TRACEMALLOC': False,
+    'TOP_ALLOCATIONS': 25,
+}
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{13}-[0-9]+-[0-9]+$')
+PROFILE_FILES = {
+    'meta': '.json',
+    'prof': '.prof',
+    'collapsed': '.collapsed.txt',
+    'mem': '.mem.txt',
+}
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_PROFILING', {}))
+    if not config['DIRECTORY']:
+        config['DIRECTORY'] = Path(settings.BASE_DIR) / 'profiles'
+    return config
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == '~':  # built-ins
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def collapsed_stacks(stats: pstats.Stats, max_depth: int = 64) -> List[str]:
+    """
+    Approximate collapsed stacks from a deterministic profile.
+
+    cProfile only records caller/callee pairs, so each function's own time
+    is attributed to the chain of its heaviest callers, which is what
+    flame graphs built from cProfile output conventionally show.
+    """
+    lines = []
+    for func, (_, _, own_time, _, callers) in stats.stats.items():
+        micros = int(own_time * 1_000_000)
+        if micros <= 0:
+            continue
+        chain = [func]
+        seen = {func}
+        current = callers
+        while current and len(chain) < max_depth:
+            parent = max(current.items(), key=lambda item: item[1][3])[0]
+            if parent in seen:
+                break
+            chain.append(parent)
+            seen.add(parent)
+            current = stats.stats.get(parent, (0, 0, 0, 0, {}))[4]
+        lines.append(';'.join(_label(f).replace(';', ',') for f in reversed(chain)) + f' {micros}')
+    return sorted(lines)
+
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of request profiles"""
+
+    _sequence = itertools.count()
+
+    def __init__(self, directory, max_profiles: int):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+
+    def new_id(self) -> str:
+        return f'{int(time.time() * 1000):013d}-{os.getpid()}-{next(self._sequence)}'
+
+    def path(self, profile_id: str, kind: str) -> Optional[Path]:
+        if not PROFILE_ID_RE.match(profile_id) or kind not in PROFILE_FILES:
+            return None
+        return self.directory / f'{profile_id}{PROFILE_FILES[kind]}'
+
+    def save(self, meta: dict, profiler: cProfile.Profile, memory: Optional[str] = None) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = self.new_id()
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(self.path(profile_id, 'prof'))
+        self.path(profile_id, 'collapsed').write_text('\n'.join(collapsed_stacks(stats)) + '\n')
+        if memory is not None:
+            self.path(profile_id, 'mem').write_text(memory)
+        meta = dict(meta, id=profile_id, has_memory=memory is not None)
+        # Metadata last: a profile is listed only once all its files exist
+        self.path(profile_id, 'meta').write_text(json.dumps(meta))
+        self.prune()
+        return profile_id
+
+    def ids(self) -> List[str]:
+        if not self.directory.exists():
+            return []
+        ids = [p.name[:-len('.json')] for p in self.directory.glob('*.json')]
+        return sorted((i for i in ids if PROFILE_ID_RE.match(i)), reverse=True)
+
+    def list(self) -> List[Dict]:
+        profiles = []
+        for profile_id in self.ids():
+            try:
+                profiles.append(json.loads(self.path(profile_id, 'meta').read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def prune(self):
+        for profile_id in self.ids()[self.max_profiles:]:
+            for kind in PROFILE_FILES:
+                try:
+                    self.path(profile_id, kind).unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def get_store() -> ProfileStore:
+    config = get_config()
+    return ProfileStore(config['DIRECTORY'], config['MAX_PROFILES'])
+
+
+class ProfilingMiddleware:
+    """Profile sampled or staff-requested requests with cProfile (and tracemalloc)"""
+
+    # Only one cProfile profiler can be active per interpreter at a time
+    _active = threading.Lock()
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.config = config
+        self.store = ProfileStore(config['DIRECTORY'], config['MAX_PROFILES'])
+        self.header = 'HTTP_' + config['HEADER'].upper().replace('-', '_')
+        self.counter = itertools.count(1)
+
+    def _wanted(self, request) -> Optional[str]:
+        if not any(request.path.startswith(prefix) for prefix in self.config['PATH_PREFIXES']):
+            return None
+        if request.META.get(self.header):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return 'header'
+        every = self.config['SAMPLE_EVERY']
+        if every and next(self.counter) % every == 0:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        reason = self._wanted(request)
+        if reason is None or not self._active.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, reason)
+        finally:
+            self._active.release()
+
+    def _profile(self, request, reason):
+        trace_memory = self.config['TRACEMALLOC'] and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            memory = None
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                top = snapshot.statistics('lineno')[:self.config['TOP_ALLOCATIONS']]
+                memory = f'current={current} peak={peak} bytes\n' + '\n'.join(str(stat) for stat in top) + '\n'
+
+        meta = {
+            'path': request.path,
+            'method': request.method,
+            'status': getattr(response, 'status_code', None),
+            'duration_ms': round(elapsed_ms, 2),
+            'reason': reason,
+            'user_id': getattr(getattr(request, 'user', None), 'pk', None),
+            'created': time.time(),
+        }
+        try:
+            response['X-Profile-Id'] = self.store.save(meta, profiler, memory)
+        except OSError as e:
+            print('Profile store error:', e)
+        return response
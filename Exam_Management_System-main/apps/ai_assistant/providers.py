@@ -0,0 +1,28 @@
+"""
+Lazily imported LLM provider clients.
+
+Importing the openai SDK costs noticeably more than the rest of the app,
+so it is only imported the first time a call actually needs it, and the
+configured module is reused for every call after that.
+"""
+import threading
+
+_lock = threading.Lock()
+_openai = None
+
+
+def get_openai(api_key: str):
+    """Return the openai module configured with api_key, importing it on first use"""
+    global _openai
+    if _openai is None:
+        with _lock:
+            if _openai is None:
+                import openai
+                _openai = openai
+    if _openai.api_key != api_key:
+        _openai.api_key = api_key
+    return _openai
+
+
+def openai_loaded() -> bool:
+    return _openai is not None
@@ -0,0 +1,102 @@
+"""
+Per-process cache of the exams question bank, as practice tests draw from it.
+
+A practice test from the bank (services._question_bank_paper) needs every
+question of the requested subjects as a QuestionPool, and for an adaptive
+paper their calibrations (calibration.py). Both are read once per subject
+set and kept in this process for AI_ASSISTANT_QUESTION_BANK_CACHE_SECONDS,
+the MAX_BANKS most recently used subject sets at most.
+
+Saving or deleting a question (signals.py) or storing a calibration fit
+(calibration.save) bumps a generation token in the Django cache, and a
+bank of an older generation is read again. As with predictions.py, the
+token only reaches every worker when the cache is shared; with a
+per-process cache other workers notice at expiry.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+MAX_BANKS = 64
+GENERATION_KEY = 'ai:question-bank-gen'
+
+
+def _cache_seconds() -> float:
+    return getattr(settings, 'AI_ASSISTANT_QUESTION_BANK_CACHE_SECONDS', 300)
+
+
+def _generation() -> int:
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def invalidate() -> None:
+    """Questions or calibrations changed: every worker reads its banks again"""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+class Bank:
+    """The questions of a subject set (id, subject and marks only) and their derived arrays"""
+
+    def __init__(self, questions: List):
+        self.questions = questions
+
+    @cached_property
+    def pool(self):
+        from .assembly import QuestionPool  # NumPy stays out of cold start
+        return QuestionPool.from_questions(self.questions)
+
+    @cached_property
+    def calibrated(self):
+        """calibration.calibrated_items of the questions, read on first use"""
+        from .calibration import calibrated_items
+        return calibrated_items(self.questions)
+
+
+class _Entry(NamedTuple):
+    generation: int
+    expires: float
+    bank: Optional[Bank]
+
+
+_banks: 'OrderedDict[Tuple[str, ...], _Entry]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def _load(subjects: Tuple[str, ...]) -> Optional[Bank]:
+    try:
+        Question = apps.get_model('exams', 'Question')
+    except LookupError:
+        return None
+    # Texts are only read for the questions drawn (services._question_texts)
+    questions = list(Question.objects.filter(subject__name__in=subjects).only('id', 'subject_id', 'marks'))
+    return Bank(questions) if questions else None
+
+
+def get_bank(subjects: Iterable[str]) -> Optional[Bank]:
+    """The bank of the named subjects, None without the exams app or questions"""
+    key = tuple(sorted(set(subjects)))
+    generation = _generation()
+    with _lock:
+        entry = _banks.get(key)
+        if entry is not None and entry.generation == generation and time.monotonic() < entry.expires:
+            _banks.move_to_end(key)
+            return entry.bank
+    bank = _load(key)
+    with _lock:
+        _banks[key] = _Entry(generation, time.monotonic() + _cache_seconds(), bank)
+        _banks.move_to_end(key)
+        while len(_banks) > MAX_BANKS:
+            _banks.popitem(last=False)
+    return bank
+
+
+def reset():
+    """Forget every bank of this process (tests)"""
+    with _lock:
+        _banks.clear()
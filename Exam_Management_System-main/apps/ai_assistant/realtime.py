@@ -0,0 +1,54 @@
+"""
+Server push for chat sessions.
+
+Every browser tab (or widget) with a session open joins the channel-layer
+group for that session. Messages written through any transport, HTTP or
+WebSocket, are announced to the group so all tabs stay in sync.
+"""
+from typing import Optional
+
+from asgiref.sync import async_to_sync
+
+
+def session_group(session_id: int) -> str:
+    return f'chat_session_{session_id}'
+
+
+def message_payload(message, client_message_id: Optional[str] = None, in_reply_to: Optional[int] = None) -> dict:
+    return {
+        'type': 'message',
+        'id': message.id,
+        'session_id': message.session_id,
+        'role': message.role,
+        'content': message.content,
+        'created_at': message.created_at.isoformat() if message.created_at else None,
+        'client_message_id': client_message_id,
+        'in_reply_to': in_reply_to,
+    }
+
+
+def _channel_layer():
+    try:
+        from channels.layers import get_channel_layer
+    except ImportError:
+        return None
+    return get_channel_layer()
+
+
+def broadcast(session_id: int, payload: dict) -> None:
+    """Send payload to every client connected to the session. No-op without a channel layer."""
+    layer = _channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(session_group(session_id), {'type': 'chat.event', 'payload': payload})
+    except Exception as e:
+        print('Chat broadcast error:', e)
+
+
+def broadcast_message(message, client_message_id: Optional[str] = None, in_reply_to: Optional[int] = None) -> None:
+    broadcast(message.session_id, message_payload(message, client_message_id, in_reply_to))
+
+
+def broadcast_token(session_id: int, in_reply_to: int, token: str) -> None:
+    broadcast(session_id, {'type': 'token', 'session_id': session_id, 'in_reply_to': in_reply_to, 'token': token})
@@ -0,0 +1,328 @@
+"""
+Offline replay of users' chat messages through assistant engines.
+
+`manage.py replay_chat_log` measures a change to the rule engine or the
+prompts before it reaches real traffic. It streams historical user
+messages, from the chat tables (every shard) or from an export file, and
+runs each of them through one or more engines:
+
+- 'rule': the local rule engine (utils.get_local_ai_intent);
+- 'cached': the rule engine behind an LRU cache keyed by the message
+  with case and whitespace normalised, to check such a cache would give
+  the same replies;
+- 'stub' or 'stub:<ms>': a stand-in for the LLM. It builds the OpenAI
+  messages (system prompt included), waits <ms> milliseconds as the
+  provider would, and answers with the rule engine's reply. Nothing is
+  sent to the provider;
+- 'local_model' or 'local_model:<path>': the local model
+  (AI_ASSISTANT_LOCAL_MODEL, or the file at <path>), loaded in-process;
+- any other spec is the dotted path of a callable (message, is_staff) ->
+  reply, e.g. a patched copy of the engine under evaluation.
+
+Messages go to a pool of worker processes in chunks of CHUNK_SIZE. Each
+worker builds the engines once, and at most two chunks per worker are in
+flight, so memory stays flat however long the log is. Each message is
+timed per engine. Every reply is compared with the first engine's (the
+baseline), and only the messages that differ are sent back. The report
+has throughput, latency percentiles per engine and the diff counts.
+
+Export files are JSON lines of {"id", "content", "is_staff"} (gzipped
+when the name ends in .gz). Write-behind journal segments (writebehind.py)
+can be replayed as they are; only their user messages are used.
+"""
+import functools
+import gzip
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import inference, sharding, utils
+from .models import ChatMessage
+
+CHUNK_SIZE = 2000
+CACHE_SIZE = 100000
+DEFAULT_ENGINES = ('rule', 'cached')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class Message(NamedTuple):
+    id: int
+    content: str
+    is_staff: bool
+
+
+# -- sources --------------------------------------------------------------
+
+def _open(path: str, mode: str):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def file_messages(path: str) -> Iterator[Message]:
+    """User messages of an export file or a write-behind journal segment (opened now, so OSError is raised here)"""
+    return _read_messages(_open(path, 'r'))
+
+
+def _read_messages(f) -> Iterator[Message]:
+    with f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('role', 'user') != 'user':
+                continue
+            yield Message(entry.get('id') or number, entry['content'], bool(entry.get('is_staff')))
+
+
+def db_messages(limit: Optional[int] = None) -> Iterator[Message]:
+    """Users' chat messages from every database they may live in, oldest first per database"""
+    staff = set(get_user_model().objects.filter(is_staff=True).values_list('id', flat=True))
+    rows = ChatMessage.objects.filter(role='user').order_by('id').values_list('id', 'content', 'session__user_id')
+    messages = (
+        Message(message_id, content, user_id in staff)
+        for _, shard in sharding.fan_out(rows)
+        for message_id, content, user_id in shard.iterator(chunk_size=CHUNK_SIZE)
+    )
+    return itertools.islice(messages, limit)
+
+
+def export_messages(messages: Iterable[Message], path: str) -> int:
+    """Write messages to an export file; returns how many"""
+    count = 0
+    with _open(path, 'w') as f:
+        for message in messages:
+            f.write(json.dumps(message._asdict()) + '\n')
+            count += 1
+    return count
+
+
+# -- engines --------------------------------------------------------------
+
+def _session(is_staff: bool):
+    return SimpleNamespace(user=SimpleNamespace(is_staff=is_staff))
+
+
+def rule_reply(message: str, is_staff: bool) -> str:
+    return utils.get_local_ai_intent(message, _session(is_staff))[1]
+
+
+def cached_engine() -> Callable[[str, bool], str]:
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def cached(key: str, is_staff: bool) -> str:
+        return rule_reply(key, is_staff)
+
+    return lambda message, is_staff: cached(_WHITESPACE_RE.sub(' ', message.lower()).strip(), is_staff)
+
+
+def stub_engine(latency_ms: float = 0.0) -> Callable[[str, bool], str]:
+    def stub(message: str, is_staff: bool) -> str:
+        utils.build_openai_messages(message, None)
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        return rule_reply(message, is_staff)
+
+    return stub
+
+
+def local_model_engine(path: Optional[str] = None) -> Callable[[str, bool], str]:
+    config = inference.get_config()
+    if path:
+        config['PATH'] = path
+    model = inference.load_model(config)
+    return lambda message, is_staff: model.predict_batch([message], 'chat')[0]
+
+
+def build_engine(spec: str) -> Callable[[str, bool], str]:
+    """The engine named by spec (see the module docstring)"""
+    name, _, argument = spec.partition(':')
+    if name == 'rule':
+        return rule_reply
+    if name == 'cached':
+        return cached_engine()
+    if name == 'stub':
+        return stub_engine(float(argument or 0))
+    if name == 'local_model':
+        return local_model_engine(argument or None)
+    try:
+        return import_string(spec)
+    except ImportError as e:
+        raise ValueError(f'Unknown engine {spec!r}: {e}') from e
+
+
+# -- replay ---------------------------------------------------------------
+
+def replay_chunk(messages: Sequence[Message], engines: Sequence[tuple], all_diffs: bool = True,
+                 max_diffs: int = 20) -> Dict:
+    """
+    Run messages through every (spec, engine). Returns the latencies per
+    engine (ms), errors per engine, replies differing from the first
+    engine's per engine, and the differing messages (at most max_diffs
+    unless all_diffs).
+    """
+    latencies = {spec: array('d') for spec, _ in engines}
+    errors = Counter()
+    differ = Counter()
+    diffs = []
+    clock = time.perf_counter_ns
+    for message in messages:
+        replies = {}
+        for spec, engine in engines:
+            started = clock()
+            try:
+                reply = engine(message.content, message.is_staff)
+            except Exception as e:
+                reply = f'!error: {type(e).__name__}: {e}'
+                errors[spec] += 1
+            latencies[spec].append((clock() - started) / 1e6)
+            replies[spec] = reply
+        baseline = replies[engines[0][0]]
+        changed = [spec for spec, reply in replies.items() if reply != baseline]
+        if changed:
+            differ.update(changed)
+            if all_diffs or len(diffs) < max_diffs:
+                diffs.append(dict(message._asdict(), replies=replies))
+    return {'messages': len(messages), 'latencies': latencies, 'errors': errors, 'differ': differ, 'diffs': diffs}
+
+
+_worker_engines: Optional[List[tuple]] = None
+
+
+def _init_worker(specs: Sequence[str]):
+    global _worker_engines
+    import django
+    django.setup()  # a no-op when forked from a set-up process
+    _worker_engines = [(spec, build_engine(spec)) for spec in specs]
+
+
+def _ready(_) -> int:
+    return os.getpid()
+
+
+def _replay_chunk(messages: List[Message], all_diffs: bool, max_diffs: int) -> Dict:
+    return replay_chunk(messages, _worker_engines, all_diffs, max_diffs)
+
+
+class Report:
+    """Results of a replay, merged chunk by chunk"""
+
+    def __init__(self, specs: Sequence[str]):
+        self.specs = list(specs)
+        self.messages = 0
+        self.elapsed = 0.0
+        self.latencies = {spec: array('d') for spec in specs}
+        self.errors = Counter()
+        self.differ = Counter()
+        self.diffs: List[Dict] = []
+
+    def add(self, result: Dict, max_diffs: Optional[int] = None):
+        self.messages += result['messages']
+        for spec, values in result['latencies'].items():
+            self.latencies[spec].extend(values)
+        self.errors.update(result['errors'])
+        self.differ.update(result['differ'])
+        room = len(result['diffs']) if max_diffs is None else max(0, max_diffs - len(self.diffs))
+        self.diffs.extend(result['diffs'][:room])
+
+    def summary(self) -> Dict:
+        import numpy as np
+
+        engines = []
+        for spec in self.specs:
+            values = np.frombuffer(self.latencies[spec], dtype=np.float64) if self.latencies[spec] else np.zeros(1)
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            busy = float(values.sum()) / 1000
+            engines.append({
+                'engine': spec,
+                'mean_ms': float(values.mean()), 'p50_ms': float(p50), 'p90_ms': float(p90), 'p99_ms': float(p99),
+                'max_ms': float(values.max()),
+                'per_second': self.messages / busy if busy else 0.0,  # on one core
+                'errors': self.errors[spec],
+                'differ': self.differ[spec],
+                'differ_share': self.differ[spec] / self.messages if self.messages else 0.0,
+            })
+        return {
+            'messages': self.messages,
+            'elapsed': self.elapsed,
+            'per_second': self.messages / self.elapsed if self.elapsed else 0.0,
+            'baseline': self.specs[0],
+            'engines': engines,
+        }
+
+
+def _chunks(messages: Iterable[Message], size: int) -> Iterator[List[Message]]:
+    messages = iter(messages)
+    while True:
+        chunk = list(itertools.islice(messages, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(messages: Iterable[Message], specs: Sequence[str] = DEFAULT_ENGINES, workers: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE, on_diff: Optional[Callable[[Dict], None]] = None,
+        max_diffs: int = 20) -> Report:
+    """
+    Replay messages through the engines named by specs (the first is the
+    baseline) in a pool of workers processes (in this process with
+    workers=0). on_diff is called with every differing message; the
+    report keeps the first max_diffs.
+    """
+    if not specs:
+        raise ValueError('At least one engine is needed')
+    if len(set(specs)) != len(specs):
+        raise ValueError('Engines must be distinct')
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    all_diffs = on_diff is not None
+    report = Report(specs)
+
+    def merge(result):
+        if on_diff is not None:
+            for diff in result['diffs']:
+                on_diff(diff)
+        report.add(result, max_diffs)
+
+    engines = [(spec, build_engine(spec)) for spec in specs]  # a bad spec fails here, not in every worker
+    if workers <= 0:
+        start = time.perf_counter()
+        for chunk in _chunks(messages, chunk_size):
+            merge(replay_chunk(chunk, engines, all_diffs, max_diffs))
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    connections.close_all()  # forked workers must not share the parent's connections
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(tuple(specs),)) as pool:
+        # Engines are loaded before the clock starts, and before a database source opens its cursor
+        list(pool.map(_ready, range(workers)))
+        start = time.perf_counter()
+        running = set()
+
+        def collect(return_when):
+            nonlocal running
+            done, running = wait(running, return_when=return_when)
+            for future in done:
+                merge(future.result())
+
+        for chunk in _chunks(messages, chunk_size):
+            if len(running) >= workers * 2:
+                collect(FIRST_COMPLETED)
+            running.add(pool.submit(_replay_chunk, chunk, all_diffs, max_diffs))
+        if running:
+            collect(ALL_COMPLETED)
+        report.elapsed = time.perf_counter() - start
+    return report
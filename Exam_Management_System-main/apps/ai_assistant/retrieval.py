@@ -0,0 +1,57 @@
+"""
+Hashed bag-of-words retrieval model for the local inference server.
+
+The model's file lists prototype texts and their replies; a message gets
+the reply of the most similar prototype (cosine similarity of hashed
+unigram + bigram counts), or the default reply below the threshold. A
+whole batch is scored with one matrix product. The tiny bundled model,
+local_models/tiny_chat.json, is built from the rule table by
+`manage.py build_local_model`.
+"""
+import itertools
+import json
+import re
+import zlib
+from typing import List, Sequence
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def featurize(texts: Sequence[str], dim: int) -> np.ndarray:
+    """L2-normalised hashed unigram + bigram counts, one row per text"""
+    features = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN_RE.findall(text.lower())
+        for token in itertools.chain(tokens, (' '.join(pair) for pair in zip(tokens, tokens[1:]))):
+            features[row, zlib.crc32(token.encode()) % dim] += 1.0
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-9)
+
+
+class RetrievalModel:
+    """
+    File format (JSON): {"format": "bow-retrieval", "dim": 1024,
+    "threshold": 0.1, "default": "...", "entries": [{"text": "...", "reply": "..."}]}
+    """
+    tasks = frozenset({'chat'})
+
+    def __init__(self, path):
+        with open(path) as f:
+            spec = json.load(f)
+        if spec.get('format') != 'bow-retrieval':
+            raise ValueError(f'{path} is not a bow-retrieval model')
+        self.dim = spec['dim']
+        self.threshold = spec.get('threshold', 0.0)
+        self.default = spec['default']
+        self.replies = [entry['reply'] for entry in spec['entries']]
+        self.weights = featurize([entry['text'] for entry in spec['entries']], self.dim).T  # (dim, replies)
+
+    def predict_batch(self, texts: Sequence[str], task: str = 'chat') -> List[str]:
+        if task not in self.tasks:
+            raise ValueError(f'Model does not support task {task!r}')
+        scores = featurize(texts, self.dim) @ self.weights  # one matrix product for the whole batch
+        best = scores.argmax(axis=1)
+        return [self.replies[i] if scores[row, i] > self.threshold else self.default
+                for row, i in enumerate(best)]
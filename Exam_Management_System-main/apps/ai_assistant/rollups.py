@@ -0,0 +1,227 @@
+"""
+Cohort analytics rollups for predictions and weak areas.
+
+Every Prediction and WeakArea is folded, as it is written, into a
+CohortRollup row keyed by (metric, day, department, semester, exam, topic).
+A row holds the count, sum, min, max and a fixed-bin histogram of the
+values. Histograms of the same metric merge by adding bins, so any slice
+(a department over a term, one topic across all cohorts, ...) is answered
+by merging the matching rows: the cost depends on how many cohorts, topics
+and days the slice spans, never on how many predictions were made.
+
+Cohorts come from the student's profile (department, semester); users
+without one, such as staff, fall into the ('', 0) cohort.
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import ChatSession, CohortRollup
+
+# metric -> (low, high, bins). Values outside the range land in the edge bins.
+METRICS = {
+    'prediction.score': (0.0, 100.0, 100),
+    'prediction.confidence': (0.0, 1.0, 100),
+    'weak_area.severity': (0.0, 10.0, 10),
+}
+KEY_FIELDS = ('metric', 'day', 'department', 'semester', 'exam_id', 'topic')
+GROUPS = {
+    'day': ('day',),
+    'cohort': ('department', 'semester'),
+    'exam': ('exam_id',),
+    'topic': ('topic',),
+}
+QUANTILES = (0.5, 0.9, 0.99)
+NO_COHORT = ('', 0)
+
+Key = Tuple[str, date, str, int, int, str]
+
+
+class Histogram:
+    """Mergeable fixed-bin histogram; quantiles are accurate to one bin width"""
+
+    def __init__(self, metric: str, bins: Optional[List[int]] = None):
+        self.low, self.high, size = METRICS[metric]
+        self.width = (self.high - self.low) / size
+        self.bins = list(bins) if bins else [0] * size
+
+    def add(self, value: float):
+        index = int((value - self.low) / self.width)
+        self.bins[min(max(index, 0), len(self.bins) - 1)] += 1
+
+    def merge(self, bins: Sequence[int]):
+        for i, n in enumerate(bins):
+            self.bins[i] += n
+
+    def quantile(self, q: float, minimum: Optional[float] = None, maximum: Optional[float] = None) -> Optional[float]:
+        count = sum(self.bins)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(self.bins):
+            if n and seen + n >= rank:
+                value = self.low + (i + (rank - seen) / n) * self.width
+                break
+            seen += n
+        # The exact extremes are known, so never report outside them
+        if minimum is not None:
+            value = max(value, minimum)
+        if maximum is not None:
+            value = min(value, maximum)
+        return round(value, 4)
+
+
+def cohorts_for_users(user_ids: Iterable[int]) -> Dict[int, Tuple[str, int]]:
+    """(department, semester) per user id, from accounts.StudentProfile when available"""
+    user_ids = set(user_ids)
+    try:
+        StudentProfile = apps.get_model('accounts', 'StudentProfile')
+    except LookupError:
+        return {}
+    rows = StudentProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'department', 'semester')
+    return {user_id: (str(department or ''), semester or 0) for user_id, department, semester in rows}
+
+
+def session_users(rows) -> Dict[int, int]:
+    """Session id -> user id for rows linked to a session, read from the rows' database(s)"""
+    by_database = defaultdict(set)
+    for row in rows:
+        by_database[row._state.db or 'default'].add(row.session_id)
+    users = {}
+    for using, session_ids in by_database.items():
+        users.update(ChatSession.objects.using(using).filter(id__in=session_ids).values_list('id', 'user_id'))
+    return users
+
+
+def prediction_observations(predictions) -> List[Tuple[Key, float]]:
+    predictions = list(predictions)
+    users = session_users(predictions)
+    cohorts = cohorts_for_users(users.values())
+    observations = []
+    for p in predictions:
+        department, semester = cohorts.get(users.get(p.session_id), NO_COHORT)
+        day = timezone.localdate(p.created_at)
+        base = (day, department, semester, p.exam_id or 0, '')
+        observations.append((('prediction.score',) + base, p.predicted_score))
+        observations.append((('prediction.confidence',) + base, p.confidence))
+    return observations
+
+
+def weak_area_observations(weak_areas) -> List[Tuple[Key, float]]:
+    weak_areas = list(weak_areas)
+    users = session_users(weak_areas)
+    cohorts = cohorts_for_users(users.values())
+    observations = []
+    for w in weak_areas:
+        department, semester = cohorts.get(users.get(w.session_id), NO_COHORT)
+        day = timezone.localdate(w.created_at)
+        observations.append((('weak_area.severity', day, department, semester, 0, w.topic), w.severity))
+    return observations
+
+
+def apply(observations: Iterable[Tuple[Key, float]]) -> int:
+    """Fold (key, value) observations into their rollup rows; returns rows touched"""
+    grouped = defaultdict(list)
+    for key, value in observations:
+        grouped[key].append(float(value))
+    with transaction.atomic():
+        for key, values in grouped.items():
+            _fold(key, values)
+    return len(grouped)
+
+
+def _fold(key: Key, values: List[float]):
+    """
+    Add values to one rollup row without losing concurrent writes (SQLite
+    ignores select_for_update). Count, sum and extremes are updated in SQL.
+    The histogram is written only if the count is still what was read:
+    the count only grows, so a concurrent fold makes the UPDATE match
+    nothing, and this one retries from a fresh read.
+    """
+    fields = dict(zip(KEY_FIELDS, key))
+    rows = CohortRollup.objects.filter(**fields)
+    low, high = min(values), max(values)
+    while True:
+        current = rows.values_list('count', 'histogram').first()
+        histogram = Histogram(key[0], current[1] if current else None)
+        for value in values:
+            histogram.add(value)
+        if current is None:
+            try:
+                with transaction.atomic():
+                    CohortRollup.objects.create(count=len(values), total=sum(values), minimum=low, maximum=high,
+                                                histogram=histogram.bins, **fields)
+                return
+            except IntegrityError:  # another writer created it first
+                continue
+        updated = rows.filter(count=current[0]).update(
+            count=F('count') + len(values),
+            total=F('total') + sum(values),
+            minimum=Least(Coalesce('minimum', Value(low)), Value(low)),
+            maximum=Greatest(Coalesce('maximum', Value(high)), Value(high)),
+            histogram=histogram.bins,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            return
+
+
+def summarize(metric: str, start: date, end: date, group_by: Optional[str] = None, **filters) -> Dict:
+    """
+    Merge the rollups of one metric over [start, end].
+
+    filters narrow by department, semester, exam_id or topic; group_by
+    ('day', 'cohort', 'exam' or 'topic') also returns one summary per group.
+    """
+    rows = CohortRollup.objects.filter(metric=metric, day__range=(start, end), **filters)
+    group_fields = GROUPS[group_by] if group_by else ()
+    overall = _Summary(metric)
+    groups = defaultdict(lambda: _Summary(metric))
+    for row in rows.values_list('count', 'total', 'minimum', 'maximum', 'histogram', *group_fields):
+        overall.merge(*row[:5])
+        if group_by:
+            groups[row[5:]].merge(*row[:5])
+
+    result = overall.as_dict()
+    if group_by:
+        result['groups'] = [
+            dict(zip(group_fields, (v.isoformat() if isinstance(v, date) else v for v in key)), **summary.as_dict())
+            for key, summary in sorted(groups.items())
+        ]
+    return result
+
+
+class _Summary:
+    def __init__(self, metric: str):
+        self.histogram = Histogram(metric)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def merge(self, count, total, minimum, maximum, bins):
+        self.count += count
+        self.total += total
+        if minimum is not None:
+            self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        if maximum is not None:
+            self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+        self.histogram.merge(bins)
+
+    def as_dict(self) -> Dict:
+        summary = {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else None,
+            'min': self.minimum,
+            'max': self.maximum,
+        }
+        for q in QUANTILES:
+            summary[f'p{int(q * 100)}'] = self.histogram.quantile(q, self.minimum, self.maximum)
+        return summary
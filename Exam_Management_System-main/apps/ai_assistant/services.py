@@ -1,63 +1,99 @@
 import os
 import random
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
-from .models import PracticeTest, Prediction, WeakArea, ChatSession
+from django.apps import apps
+from django.db.models import TextField, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import hedging, inference, predictions, questionbank
+from .models import ChatSession
+from .providers import get_openai
+
+
+def _use_local_model(prompt: str, max_tokens: int = 200) -> str:
+    """Same contract as _use_openai: '' when the local model cannot generate text"""
+    if not inference.enabled():
+        return ''
+    try:
+        client = inference.get_client()
+        reply = client.predict(prompt, 'generate') if client.supports('generate') else ''
+    except inference.InferenceUnavailable as e:
+        print('Local model error in services._use_local_model:', e)
+        return ''
+    return reply.strip()
 
 
 def _use_openai(prompt: str, max_tokens: int = 200) -> str:
+    local = _use_local_model(prompt, max_tokens)
+    if local:
+        return local
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         return ''
-    try:
-        import openai
-        openai.api_key = api_key
+
+    def ask() -> str:
+        openai = get_openai(api_key)
         response = openai.ChatCompletion.create(
             model='gpt-3.5-turbo',
             messages=[{'role': 'system', 'content': 'You are a helpful question generator.'},
                       {'role': 'user', 'content': prompt}],
             max_tokens=max_tokens,
-            temperature=0.7
+            temperature=0.7,
+            request_timeout=hedging.request_timeout('services'),
         )
         return response.choices[0].message['content'].strip()
-    except Exception as e:
-        print('OpenAI error in services._use_openai:', e)
-        return ''
+
+    # Within the services latency SLO; '' lets callers use their templated fallback
+    return hedging.call('services', ask, lambda: '')
 
 
 # 1) GPT Question Generation (stub)
-def generate_questions(subject: str, difficulty: str = 'medium', count: int = 5, use_openai: bool = True) -> List[Dict]:
-    """Generate a list of question dicts for a given subject and difficulty.
+# Questions asked of the provider per call; larger counts take several calls
+QUESTION_CHUNK = 10
 
-    If OpenAI API key is present and use_openai=True, call OpenAI; otherwise return simple templated questions.
+
+def iter_questions(subject: str, difficulty: str = 'medium', count: int = 5, use_openai: bool = True) -> Iterator[Dict]:
+    """Yield question dicts for a subject and difficulty one chunk at a time.
+
+    With an OpenAI key (and use_openai) each item is the raw text of up to
+    QUESTION_CHUNK questions (parsing left to future work); once the
+    provider gives nothing, the rest are simple templated questions.
     """
-    prompt = f"Generate {count} {difficulty} questions for {subject} as a numbered list. Include correct answers." 
+    produced = 0
     if use_openai:
-        res = _use_openai(prompt)
-        if res:
-            # Return raw text in a single item when OpenAI is used (parsing left to future work)
-            return [{'text': res}]
+        while produced < count:
+            size = min(QUESTION_CHUNK, count - produced)
+            prompt = f"Generate {size} {difficulty} questions for {subject} as a numbered list. Include correct answers."
+            res = _use_openai(prompt)
+            if not res:
+                break
+            produced += size
+            yield {'text': res}
     # Fallback templated questions
-    questions = []
-    for i in range(1, count + 1):
-        questions.append({'id': i, 'text': f'{subject} sample question {i} (difficulty {difficulty})', 'answer': 'Sample answer'})
-    return questions
+    for i in range(produced + 1, count + 1):
+        yield {'id': i, 'text': f'{subject} sample question {i} (difficulty {difficulty})', 'answer': 'Sample answer'}
+
+
+def generate_questions(subject: str, difficulty: str = 'medium', count: int = 5, use_openai: bool = True) -> List[Dict]:
+    """Generate a list of question dicts for a given subject and difficulty (see iter_questions)"""
+    return list(iter_questions(subject, difficulty, count, use_openai))
 
 
-# 2) ML result prediction (mock)
+# 2) ML result prediction
 def predict_results(session: Optional[ChatSession] = None, student_id: Optional[int] = None, exam_id: Optional[int] = None) -> Dict:
-    """Return a mock prediction for student performance. Replace with a real ML model later."""
-    # Simple mock: random score between 40 and 95
-    score = round(random.uniform(40, 95), 1)
-    confidence = round(random.uniform(0.5, 0.95), 2)
-    result = {'predicted_score': score, 'confidence': confidence}
-    # Persist if session provided
-    try:
-        if session is not None:
-            Prediction.objects.create(session=session, predicted_score=score, confidence=confidence)
-    except Exception:
-        pass
-    return result
+    """Predict student performance for an exam.
+
+    With a session the prediction is stored once per distinct model input and
+    served from cache afterwards (see predictions.py); without one it is only computed.
+    """
+    if session is not None:
+        return predictions.get_prediction(session, exam_id=exam_id, student_id=student_id)
+    inputs = predictions.prediction_inputs(student_id, exam_id)
+    score, confidence = predictions.baseline_model(inputs)
+    return {'predicted_score': score, 'confidence': confidence, 'exam_id': exam_id,
+            'model_version': predictions.MODEL_VERSION, 'input_hash': predictions.input_hash(inputs)}
 
 
 # 3) Weak area detection (mock)
@@ -71,29 +107,118 @@ def analyze_weak_areas(session: Optional[ChatSession] = None, recent_scores: Opt
         out.append({'topic': t, 'severity': sev})
         try:
             if session is not None:
-                WeakArea.objects.create(session=session, topic=t, severity=sev)
+                session.weak_areas.create(topic=t, severity=sev)
         except Exception:
             pass
     return out
 
 
 # 4) Smart practice test generator
-def generate_practice_test(session: Optional[ChatSession], topics: List[str], num_questions: int = 10, use_openai: bool = True) -> Dict:
-    """Generate a practice test focused on given topics. Returns metadata and content."""
-    title = f'Practice Test: {", ".join(topics[:3])}'
+PRACTICE_CHUNK = 10  # questions asked of the provider per call
+TEXT_CHUNK = 200  # question texts read from the bank per query
+SAVE_CHUNK = 50  # practice test lines written per UPDATE
+
+
+def _question_bank_paper(topics: List[str], num_questions: int, user=None) -> Optional[List[int]]:
+    """
+    Question ids of one paper drawn from the exams question bank for the named
+    subjects, if it can supply one: at the user's level when they and enough
+    questions are calibrated (calibration.py), else an assembled variant.
+    The bank is cached per process (questionbank.py).
+    """
+    bank = questionbank.get_bank(topics)
+    if bank is None:
+        return None
+    from .assembly import PaperSpec, assemble  # NumPy stays out of cold start
+    from .calibration import adaptive_paper
+
+    subjects = bank.pool.topic_labels.tolist()
+    per_subject, extra = divmod(num_questions, len(subjects))
+    counts = {subject: per_subject + (i < extra) for i, subject in enumerate(subjects)}
+    if user is not None and getattr(user, 'pk', None):
+        paper = adaptive_paper(user, bank.questions, counts, calibrated=bank.calibrated)
+        if paper:
+            return paper
+    try:
+        variant = next(assemble(bank.pool, PaperSpec(counts), 1))
+    except ValueError:
+        return None
+    return [int(qid) for qid in variant.question_ids]
+
+
+def _question_texts(question_ids: List[int]) -> Iterator[str]:
+    Question = apps.get_model('exams', 'Question')
+    for start in range(0, len(question_ids), TEXT_CHUNK):
+        chunk = question_ids[start:start + TEXT_CHUNK]
+        texts = dict(Question.objects.filter(id__in=chunk).values_list('id', 'question_text'))
+        for qid in chunk:
+            yield texts.get(qid, '')
+
+
+def iter_practice_test(topics: List[str], num_questions: int = 10, use_openai: bool = True, user=None) -> Iterator[str]:
+    """Yield the content of a practice test piece by piece: from OpenAI, the question bank (at user's level), or templates"""
+    produced = 0
     if use_openai and os.getenv('OPENAI_API_KEY'):
-        prompt = f'Create a {num_questions}-question practice test covering: {", ".join(topics)}. Provide answers.'
-        res = _use_openai(prompt, max_tokens=600)
-        content = res if res else '\n'.join([f'Q{i}: Sample question on {topics[i % len(topics)]}' for i in range(1, num_questions + 1)])
-    else:
-        content = '\n'.join([f'Q{i}: Sample question on {topics[i % len(topics)]}' for i in range(1, num_questions + 1)])
-    # Persist the practice test if session provided
+        while produced < num_questions:
+            size = min(PRACTICE_CHUNK, num_questions - produced)
+            prompt = f'Create a {size}-question practice test covering: {", ".join(topics)}. Provide answers.'
+            res = _use_openai(prompt, max_tokens=600)
+            if not res:
+                break
+            produced += size
+            yield res
+    if produced == 0:
+        paper = _question_bank_paper(topics, num_questions, user)
+        if paper:
+            for i, text in enumerate(_question_texts(paper), start=1):
+                yield f'Q{i}: {text}'
+            return
+    for i in range(produced + 1, num_questions + 1):
+        yield f'Q{i}: Sample question on {topics[i % len(topics)]}'
+
+
+def save_practice_test(session: Optional[ChatSession], title: str, pieces: Iterable[str]) -> Iterator[str]:
+    """Pass pieces through, appending them to a new PracticeTest every SAVE_CHUNK pieces"""
+    test = None
     try:
         if session is not None:
-            PracticeTest.objects.create(session=session, title=title, content=content)
+            test = session.practice_tests.create(title=title, content='')
     except Exception:
         pass
-    return {'title': title, 'content': content}
+    buffered = []
+    separator = ''
+
+    def save():
+        nonlocal separator
+        if test is not None and buffered:
+            try:
+                session.practice_tests.filter(pk=test.pk).update(
+                    content=Concat('content', Value(separator + '\n'.join(buffered)), output_field=TextField()),
+                    updated_at=timezone.now(),  # the API's version of the test
+                )
+            except Exception as e:
+                print('Practice test save error:', e)
+        separator = '\n'
+        buffered.clear()
+
+    for piece in pieces:
+        buffered.append(piece)
+        if len(buffered) >= SAVE_CHUNK:
+            save()
+        yield piece
+    save()
+
+
+def generate_practice_test(session: Optional[ChatSession], topics: List[str], num_questions: int = 10, use_openai: bool = True) -> Dict:
+    """Generate a practice test focused on given topics. Returns metadata and content."""
+    title = practice_test_title(topics)
+    user = session.user if session is not None else None
+    pieces = save_practice_test(session, title, iter_practice_test(topics, num_questions, use_openai, user))
+    return {'title': title, 'content': '\n'.join(pieces)}
+
+
+def practice_test_title(topics: List[str]) -> str:
+    return f'Practice Test: {", ".join(topics[:3])}'
 
 
 # 5) AI Chat tutor wrapper (delegates to existing get_ai_response)
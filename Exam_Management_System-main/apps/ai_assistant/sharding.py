@@ -0,0 +1,291 @@
+"""
+Chat data sharded across databases by user.
+
+With AI_ASSISTANT_SHARDING['ENABLED'], a user's chat sessions and
+everything hanging off them (messages, predictions, practice tests, weak
+areas) live in one of the SHARDS databases, picked by a consistent hash
+ring over the user id. Users, and every other app, stay in 'default'.
+
+* Routing: ChatShardRouter sends a query to the shard of the instance it
+  comes from, so related managers route themselves:
+  request.user.chat_sessions goes to the user's shard, session.messages to
+  the session's. Queries starting from a model manager carry no such hint
+  and would hit 'default'; those use .using(shard_for_user(...)) or
+  .using(obj._state.db).
+* Ids: primary keys of sharded rows are handed out in blocks from the
+  tables' sequences in 'default' (reserve_ids), which therefore serves
+  as the ticket server. Ids are unique across shards, so a row keeps its
+  id when rebalancing moves it, and URLs keep working. SQLite rolls a
+  reservation back with the transaction it ran in, so 'default' must not
+  be inside a transaction around sharded writes (ATOMIC_REQUESTS off).
+* Ring changes: adding a shard moves only the users whose ring segment
+  it takes over (about 1/N). `manage.py migrate_chat_shards` creates the
+  tables, `manage.py rebalance_chat_shards` moves every user found on a
+  database other than their shard, including chats stored in 'default'
+  before sharding was turned on. Until a user is moved, their old chats
+  are not found.
+* Fan-out: the few cross-user queries (admin lookups by id, maintenance
+  commands) run once per database with fan_out().
+
+Cross-database foreign keys (to the user) carry no database constraint;
+deleting a user deletes their chats through delete_user_chats().
+"""
+import bisect
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SHARDS': [],
+    'VNODES': 64,
+    'ID_BLOCK': 100,
+}
+APP_LABEL = 'ai_assistant'
+# Dependants first: the order rows are deleted in, reversed to copy them
+SHARDED_MODELS = ('chatmessage', 'prediction', 'practicetest', 'weakarea', 'chatsession')
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_SHARDING', {}))
+    return config
+
+
+def enabled() -> bool:
+    config = get_config()
+    return bool(config['ENABLED'] and config['SHARDS'])
+
+
+def shards() -> List[str]:
+    return list(get_config()['SHARDS']) if enabled() else []
+
+
+def databases() -> List[str]:
+    """Every database chat rows may be found in: 'default' first, then the shards"""
+    return ['default'] + [alias for alias in shards() if alias != 'default']
+
+
+def is_sharded(model) -> bool:
+    return model._meta.app_label == APP_LABEL and model._meta.model_name in SHARDED_MODELS
+
+
+def sharded_models() -> list:
+    from django.apps import apps
+    return [apps.get_model(APP_LABEL, name) for name in SHARDED_MODELS]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing: each node owns the ring segments before its vnode points"""
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 64):
+        if not nodes:
+            raise ValueError('A hash ring needs at least one node')
+        points = sorted((_hash(f'{node}#{i}'), node) for node in nodes for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key) -> str:
+        index = bisect.bisect(self._keys, _hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+@lru_cache(maxsize=8)
+def _ring(nodes: Tuple[str, ...], vnodes: int) -> HashRing:
+    return HashRing(nodes, vnodes)
+
+
+def shard_for_user(user) -> str:
+    """Database holding a user's chats (a user or a user id); 'default' when sharding is off"""
+    if not enabled():
+        return 'default'
+    config = get_config()
+    user_id = getattr(user, 'pk', user)
+    return _ring(tuple(config['SHARDS']), config['VNODES']).node_for(user_id)
+
+
+# -- routing --------------------------------------------------------------
+
+class ChatShardRouter:
+    """Routes sharded chat models by the instance a query comes from; inert while sharding is off"""
+
+    def _db_for(self, model, instance=None, **hints) -> Optional[str]:
+        if not enabled() or instance is None:
+            return None
+        if not is_sharded(model):
+            # Django would follow a sharded instance into its shard: session.user is in 'default'
+            return 'default' if is_sharded(type(instance)) else None
+        if is_sharded(type(instance)):
+            if instance._state.db:
+                return instance._state.db
+            # An unsaved session (or row of one): follow its user or session
+            if getattr(instance, 'user_id', None) is not None:
+                return shard_for_user(instance.user_id)
+            if hasattr(instance, 'session_id'):
+                session = instance._meta.get_field('session').get_cached_value(instance, None)
+                return session._state.db if session is not None else None
+            return None
+        if isinstance(instance, get_user_model()) and instance.pk is not None:
+            return shard_for_user(instance.pk)
+        return None
+
+    db_for_read = _db_for
+    db_for_write = _db_for
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        if not enabled():
+            return None
+        first, second = is_sharded(type(obj1)), is_sharded(type(obj2))
+        if first and second:
+            return obj1._state.db == obj2._state.db or None in (obj1._state.db, obj2._state.db)
+        if first or second:
+            return True  # links to users cross databases by design
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        if db == 'default' or db not in shards():
+            return None
+        return app_label == APP_LABEL and model_name in SHARDED_MODELS
+
+
+# -- ids ------------------------------------------------------------------
+
+def reserve_ids(model, count: int, using: str = 'default') -> Optional[List[int]]:
+    """Take count ids from model's primary key sequence; None if the database has none we can advance"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # AUTOINCREMENT tables never hand out an id at or below sqlite_sequence.seq
+            cursor.execute('UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s', [count, table])
+            if not cursor.rowcount:
+                cursor.execute(
+                    f'INSERT INTO sqlite_sequence (name, seq) '
+                    f'SELECT %s, COALESCE(MAX(id), 0) + %s FROM {connection.ops.quote_name(table)}',
+                    [table, count],
+                )
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            last = cursor.fetchone()[0]
+            return list(range(last - count + 1, last + 1))
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                           [table, 'id', count])
+            return [row[0] for row in cursor.fetchall()]
+    return None
+
+
+class IdAllocator:
+    """Hands out ids of one model from blocks reserved in 'default'"""
+
+    def __init__(self, model, block: int = 100):
+        self.model = model
+        self.block = block
+        self._ids: List[int] = []
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            if not self._ids:
+                ids = reserve_ids(self.model, self.block)
+                if ids is None:
+                    raise RuntimeError(f"Database 'default' has no sequence to number {self.model.__name__} rows from")
+                self._ids = ids
+            return self._ids.pop(0)
+
+
+_allocators: Dict[Tuple[int, type], IdAllocator] = {}
+_allocators_lock = threading.Lock()
+
+
+def allocate_id(model) -> int:
+    # Per process: a forked worker must not hand out its parent's reserved ids
+    key = (os.getpid(), model)
+    allocator = _allocators.get(key)
+    if allocator is None:
+        with _allocators_lock:
+            allocator = _allocators.setdefault(key, IdAllocator(model, get_config()['ID_BLOCK']))
+    return allocator.next_id()
+
+
+def reset():
+    """Drop reserved ids (tests, whose rollbacks hand the same ids out again)"""
+    with _allocators_lock:
+        _allocators.clear()
+
+
+def assign_id(sender, instance, raw=False, using=None, **kwargs):
+    """pre_save: number new rows stored in a shard from the ticket sequence"""
+    if instance.pk is None and not raw and using != 'default' and enabled() and is_sharded(sender):
+        instance.pk = allocate_id(sender)
+
+
+# -- fan-out and maintenance ----------------------------------------------
+
+def fan_out(queryset) -> Iterator[Tuple[str, object]]:
+    """(database, queryset on it) for every database chat rows may live in"""
+    for alias in databases():
+        yield alias, queryset.using(alias)
+
+
+def find(queryset, pk):
+    """The row of queryset with this primary key, in whichever database it is; None if nowhere"""
+    for _, shard in fan_out(queryset.filter(pk=pk)):
+        obj = shard.first()
+        if obj is not None:
+            return obj
+    return None
+
+
+def count(queryset) -> int:
+    return sum(shard.count() for _, shard in fan_out(queryset))
+
+
+def misplaced_users(using: str) -> List[int]:
+    """Users with chat sessions in a database other than their shard"""
+    from .models import ChatSession
+    user_ids = ChatSession.objects.using(using).order_by().values_list('user_id', flat=True).distinct()
+    return sorted(user_id for user_id in user_ids if shard_for_user(user_id) != using)
+
+
+def move_user(user_id: int, source: str, target: Optional[str] = None, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Copy a user's chats from source to their shard (or target), then delete them from source.
+
+    Rows keep their ids. Safe to repeat after an interruption: copies left
+    in the target by an earlier attempt are replaced.
+    """
+    target = target or shard_for_user(user_id)
+    if target == source:
+        return {}
+    models = sharded_models()
+    session_ids = list(models[-1].objects.using(source).filter(user_id=user_id).values_list('id', flat=True))
+    moved = {}
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        for model in reversed(models):  # sessions first
+            lookup = {'user_id': user_id} if model is models[-1] else {'session_id__in': session_ids}
+            rows = list(model.objects.using(source).filter(**lookup).order_by('pk'))
+            model.objects.using(target).filter(pk__in=[row.pk for row in rows]).delete()
+            model.objects.using(target).bulk_create(rows, batch_size=batch_size)
+            moved[model._meta.model_name] = len(rows)
+        models[-1].objects.using(source).filter(id__in=session_ids).delete()
+    return moved
+
+
+def delete_user_chats(user_id: int):
+    """A user was deleted: their chats are in another database, out of reach of the cascade"""
+    from .models import ChatSession, Prediction
+    for alias in shards():
+        if alias != 'default':
+            with transaction.atomic(using=alias):
+                ChatSession.objects.using(alias).filter(user_id=user_id).delete()
+                Prediction.objects.using(alias).filter(student_id=user_id).delete()
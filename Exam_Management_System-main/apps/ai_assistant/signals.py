@@ -0,0 +1,83 @@
+"""
+Keep the cohort rollups (rollups.py) current as rows are written, and drop
+cached predictions (predictions.py) and re-estimate the student's ability
+(calibration.py) when a student's results change, and the cached question
+banks (questionbank.py) when a question does.
+With sharding (sharding.py), number new chat rows and delete a deleted
+user's chats from their shard.
+
+bulk_create and queryset updates do not send post_save; after loading data
+that way, run `manage.py rebuild_rollups`.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import predictions, questionbank, rollups, sharding
+from .models import Prediction, WeakArea
+
+
+@receiver(post_save, sender=Prediction, dispatch_uid='ai_assistant_rollup_prediction')
+def rollup_prediction(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.apply(rollups.prediction_observations([instance]))
+
+
+@receiver(post_save, sender=WeakArea, dispatch_uid='ai_assistant_rollup_weak_area')
+def rollup_weak_area(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.apply(rollups.weak_area_observations([instance]))
+
+
+for _model in sharding.sharded_models():
+    pre_save.connect(sharding.assign_id, sender=_model, dispatch_uid=f'ai_assistant_shard_id_{_model._meta.model_name}')
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid='ai_assistant_delete_user_chats')
+def delete_user_chats(sender, instance, **kwargs):
+    if sharding.enabled():
+        sharding.delete_user_chats(instance.pk)
+
+
+def invalidate_predictions(sender, instance, **kwargs):
+    """A student's graded results changed: their cached predictions are stale"""
+    StudentProfile = apps.get_model('accounts', 'StudentProfile')
+    user_id = StudentProfile.objects.filter(id=instance.student_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        predictions.invalidate(user_id)
+
+
+def update_ability(sender, instance, raw=False, **kwargs):
+    """A result was graded: re-estimate the student's ability against the calibrated questions"""
+    if raw:
+        return
+    from . import calibration  # NumPy stays out of cold start
+    StudentProfile = apps.get_model('accounts', 'StudentProfile')
+    user_id = StudentProfile.objects.filter(id=instance.student_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        calibration.update_ability(user_id)
+
+
+def invalidate_question_banks(sender, instance, raw=False, **kwargs):
+    """A question was added, changed or deleted: practice tests must draw from the current bank"""
+    questionbank.invalidate()
+
+
+# The exams app is optional here; only listen for results when it is installed
+try:
+    _StudentExamResult = apps.get_model('exams', 'StudentExamResult')
+except LookupError:
+    pass
+else:
+    post_save.connect(invalidate_predictions, sender=_StudentExamResult, dispatch_uid='ai_assistant_result_saved')
+    post_delete.connect(invalidate_predictions, sender=_StudentExamResult, dispatch_uid='ai_assistant_result_deleted')
+    post_save.connect(update_ability, sender=_StudentExamResult, dispatch_uid='ai_assistant_result_ability')
+
+try:
+    _Question = apps.get_model('exams', 'Question')
+except LookupError:
+    pass
+else:
+    post_save.connect(invalidate_question_banks, sender=_Question, dispatch_uid='ai_assistant_question_saved')
+    post_delete.connect(invalidate_question_banks, sender=_Question, dispatch_uid='ai_assistant_question_deleted')
@@ -0,0 +1,241 @@
+// AI Assistant chat page. Page-specific values come from data attributes on
+// #message-form so this file can be served as a hashed, long-cache asset.
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('message-form');
+    const input = document.getElementById('message-input');
+    const sendBtn = document.getElementById('send-btn');
+    const messagesContainer = document.getElementById('messages-container');
+    // A draft chat has no session yet; the first reply tells us where it lives.
+    let sendUrl = form.dataset.sendUrl;
+
+    function scrollToBottom() {
+        const scroll = () => {
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        };
+        scroll();
+        requestAnimationFrame(scroll);
+        setTimeout(scroll, 50);
+    }
+
+    // Auto-scroll when page loads
+    window.addEventListener('load', scrollToBottom);
+    setTimeout(scrollToBottom, 100);
+
+    // Watch for changes to automatically scroll
+    const observer = new MutationObserver(scrollToBottom);
+    observer.observe(messagesContainer, {
+        childList: true,
+        subtree: true,
+        characterData: false
+    });
+
+    function escapeHtml(text) {
+        const map = {
+            '&': '&amp;',
+            '<': '&lt;',
+            '>': '&gt;',
+            '"': '&quot;',
+            "'": '&#039;'
+        };
+        return text.replace(/[&<>"']/g, m => map[m]);
+    }
+
+    function userBubble(text) {
+        const div = document.createElement('div');
+        div.className = 'mb-4 message-item';
+        div.innerHTML = `
+            <div class="d-flex justify-content-end">
+                <div class="chat-bubble chat-bubble-user">
+                    <small>You</small>
+                    <p class="chat-bubble-body">${escapeHtml(text)}</p>
+                    <div class="chat-bubble-time">Just now</div>
+                </div>
+            </div>
+        `;
+        return div;
+    }
+
+    function assistantBubble(html, withActions) {
+        const div = document.createElement('div');
+        div.className = 'mb-4 message-item';
+        const actions = withActions ? `
+                    <div class="message-actions">
+                        <button class="btn btn-sm btn-outline-secondary copy-btn" title="Copy message">
+                            <i class="fas fa-copy"></i>
+                        </button>
+                        <button class="btn btn-sm btn-outline-secondary react-btn" title="React">
+                            👍
+                        </button>
+                    </div>` : '';
+        div.innerHTML = `
+            <div class="d-flex justify-content-start align-items-flex-start">
+                <div class="chat-avatar">🤖</div>
+                <div class="chat-bubble chat-bubble-assistant">
+                    <small class="chat-bubble-label">AI Assistant</small>
+                    <div class="chat-bubble-body">${html}</div>
+                    ${withActions ? '<div class="chat-bubble-time">Just now</div>' : ''}
+                    ${actions}
+                </div>
+            </div>
+        `;
+        return div;
+    }
+
+    // --- Live updates -------------------------------------------------------
+    // With a WebSocket open, messages from other tabs (and streamed assistant
+    // tokens) are pushed to this page. Without one, plain HTTP is used.
+    let sessionId = form.dataset.sessionId;
+    let socket = null;
+    let retryDelay = 1000;
+    const pending = {};     // client_message_id -> loading bubble of our own sends
+    const ownIds = new Set();
+    const streams = {};     // user message id -> {div, text} of a reply being streamed
+
+    function newClientId() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    function renderText(text) {
+        return escapeHtml(text).replace(/\n/g, '<br>');
+    }
+
+    function connect() {
+        if (!sessionId || !('WebSocket' in window)) return;
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const ws = new WebSocket(`${scheme}://${window.location.host}${form.dataset.wsPath}${sessionId}/`);
+        ws.onopen = () => { socket = ws; retryDelay = 1000; };
+        ws.onmessage = (e) => handleEvent(JSON.parse(e.data));
+        ws.onclose = () => {
+            socket = null;
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    function finishSend(clientId) {
+        delete pending[clientId];
+        sendBtn.disabled = false;
+        input.focus();
+    }
+
+    function handleEvent(evt) {
+        const own = evt.client_message_id && ownIds.has(evt.client_message_id);
+        if (evt.type === 'error') {
+            if (own && pending[evt.client_message_id]) {
+                pending[evt.client_message_id].remove();
+                finishSend(evt.client_message_id);
+            }
+            alert('Error: ' + evt.error);
+            return;
+        }
+        if (evt.type === 'message' && evt.role === 'user') {
+            if (own) {
+                // Our own message: reuse the loading bubble for the streamed reply
+                if (pending[evt.client_message_id]) {
+                    streams[evt.id] = {div: pending[evt.client_message_id], text: ''};
+                }
+                return;
+            }
+            messagesContainer.appendChild(userBubble(evt.content));
+            streams[evt.id] = {div: assistantBubble('Thinking... ⏳', false), text: ''};
+            messagesContainer.appendChild(streams[evt.id].div);
+        } else if (evt.type === 'token') {
+            const stream = streams[evt.in_reply_to];
+            if (!stream) return;
+            stream.text += evt.token;
+            stream.div.querySelector('.chat-bubble-body').innerHTML = renderText(stream.text);
+        } else if (evt.type === 'message' && evt.role === 'assistant') {
+            const bubble = assistantBubble(renderText(evt.content), true);
+            const stream = streams[evt.in_reply_to];
+            const placeholder = stream ? stream.div : (own ? pending[evt.client_message_id] : null);
+            if (placeholder && placeholder.isConnected) {
+                placeholder.replaceWith(bubble);
+            } else {
+                messagesContainer.appendChild(bubble);
+            }
+            delete streams[evt.in_reply_to];
+            if (own) finishSend(evt.client_message_id);
+        }
+    }
+
+    // A send that times out or is still being answered is retried with the
+    // same client_message_id, so the server replies once (idempotency.py).
+    const SEND_RETRIES = 3;
+
+    function sendOverHttp(message, clientId, attempt = 0) {
+        let retrying = false;
+        function retry() {
+            retrying = true;
+            setTimeout(() => sendOverHttp(message, clientId, attempt + 1), 1000 * 2 ** attempt);
+        }
+
+        fetch(sendUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
+            },
+            body: JSON.stringify({ message: message, client_message_id: clientId })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.pending && attempt < SEND_RETRIES) {
+                retry();
+                return;
+            }
+            if (data.success && data.session_url && window.location.pathname !== data.session_url) {
+                sendUrl = data.send_url;
+                sessionId = String(data.session_id);
+                window.history.replaceState(null, '', data.session_url);
+                connect();
+            }
+            const loadingDiv = pending[clientId];
+            if (!loadingDiv) return;  // already delivered over the socket
+            if (data.success) {
+                loadingDiv.replaceWith(assistantBubble(renderText(data.ai_response), true));
+                setTimeout(scrollToBottom, 50);
+            } else {
+                loadingDiv.remove();
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            if (attempt < SEND_RETRIES && pending[clientId]) {
+                retry();
+                return;
+            }
+            if (pending[clientId]) pending[clientId].remove();
+            alert('Error sending message');
+        })
+        .finally(() => {
+            if (!retrying && pending[clientId]) finishSend(clientId);
+        });
+    }
+
+    form.addEventListener('submit', function(e) {
+        e.preventDefault();
+
+        const message = input.value.trim();
+        if (!message || sendBtn.disabled) return;  // one send at a time (Enter key repeats)
+
+        sendBtn.disabled = true;
+        messagesContainer.appendChild(userBubble(message));
+        input.value = '';
+
+        const clientId = newClientId();
+        ownIds.add(clientId);
+        pending[clientId] = assistantBubble('Thinking... ⏳', false);
+        messagesContainer.appendChild(pending[clientId]);
+
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify({ type: 'message', message: message, client_message_id: clientId }));
+        } else {
+            sendOverHttp(message, clientId);
+        }
+    });
+
+    connect();
+    input.focus();
+});
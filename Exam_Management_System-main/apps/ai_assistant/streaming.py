@@ -0,0 +1,92 @@
+"""
+Streaming JSON / NDJSON responses for generators.
+
+The encoders below write one item at a time, so a response never holds
+more than the item being sent, and the first items reach the client while
+later ones are still being generated. An error part-way through can no
+longer change the status code; it is reported in the body instead (an
+"error" key, or an {"error": ...} line).
+
+Under ASGI (daphne, the UvicornWorker) Django reads a sync iterator to
+the end before it sends anything, so streaming_response() hands it an
+async iterator instead. That iterator pulls each chunk from the sync
+generator in the request's sync thread, so the ORM calls inside it work
+as they do under WSGI.
+"""
+import json
+from typing import AsyncIterator, Dict, Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+NDJSON = 'application/x-ndjson'
+
+
+def wants_ndjson(request) -> bool:
+    return NDJSON in request.headers.get('Accept', '') or request.GET.get('format') == 'ndjson'
+
+
+def ndjson_lines(items: Iterable, done: bool = True) -> Iterator[str]:
+    """One JSON document per line, then {"done": true, "count": n}"""
+    count = 0
+    try:
+        for item in items:
+            count += 1
+            yield json.dumps(item) + '\n'
+    except Exception as e:
+        yield json.dumps({'error': str(e), 'count': count}) + '\n'
+        return
+    if done:
+        yield json.dumps({'done': True, 'count': count}) + '\n'
+
+
+def json_list(key: str, items: Iterable) -> Iterator[str]:
+    """{"<key>": [item, ...]} written item by item"""
+    yield f'{{{json.dumps(key)}: ['
+    error = None
+    try:
+        for i, item in enumerate(items):
+            yield (', ' if i else '') + json.dumps(item)
+    except Exception as e:
+        error = str(e)
+    yield ']' + (f', "error": {json.dumps(error)}' if error else '') + '}'
+
+
+def json_text(key: str, fields: Dict, text_key: str, pieces: Iterable[str], separator: str = '\n') -> Iterator[str]:
+    """{"<key>": {**fields, "<text_key>": "piece<separator>piece..."}} written piece by piece"""
+    head = json.dumps({**fields, text_key: ''})[:-2]  # open string value: {"title": "...", "content": "
+    yield f'{{{json.dumps(key)}: {head}'
+    error = None
+    try:
+        for i, piece in enumerate(pieces):
+            yield json.dumps((separator if i else '') + piece)[1:-1]
+    except Exception as e:
+        error = str(e)
+    yield '"}' + (f', "error": {json.dumps(error)}' if error else '') + '}'
+
+
+async def async_chunks(chunks: Iterable[str]) -> AsyncIterator[str]:
+    """chunks as an async iterator, each chunk produced in the request's sync thread"""
+    iterator = iter(chunks)
+    end = object()  # StopIteration cannot cross sync_to_async
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await next_chunk(iterator, end)
+            if chunk is end:
+                return
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:  # the client went away: let the generator clean up
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def streaming_response(request, chunks: Iterable[str], content_type: str = 'application/json') -> StreamingHttpResponse:
+    if isinstance(request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass chunks through as they come
+    return response
@@ -0,0 +1,53 @@
+"""
+Factories for building test data quickly.
+
+The bulk helpers insert rows with bulk_create (one query per batch) and
+then fold the messages into the session counters, the way
+ChatMessage.save does for single rows.
+"""
+import itertools
+from typing import List, Optional, Sequence
+
+from django.contrib.auth import get_user_model
+
+from ..models import ChatSession, ChatMessage
+
+_sequence = itertools.count(1)
+
+
+def make_user(username: Optional[str] = None, password: str = 'testpass', **extra):
+    username = username or f'user{next(_sequence)}'
+    return get_user_model().objects.create_user(username=username, password=password, **extra)
+
+
+def make_staff(username: Optional[str] = None, **extra):
+    return make_user(username, is_staff=True, **extra)
+
+
+def make_session(user=None, title: str = 'Test Chat', **extra) -> ChatSession:
+    return ChatSession.objects.create(user=user or make_user(), title=title, **extra)
+
+
+def make_sessions(user, count: int, title: str = 'Exam Assistant Chat') -> List[ChatSession]:
+    ChatSession.objects.bulk_create(
+        [ChatSession(user=user, title=title) for _ in range(count)], batch_size=500
+    )
+    return list(user.chat_sessions.order_by('-id')[:count])
+
+
+def make_messages(session: ChatSession, contents: Sequence[str], roles: Sequence[str] = ('user', 'assistant')) -> List[ChatMessage]:
+    """Insert messages alternating through roles, oldest first"""
+    messages = ChatMessage.objects.bulk_create(
+        [ChatMessage(session=session, role=role, content=content)
+         for content, role in zip(contents, itertools.cycle(roles))],
+        batch_size=500,
+    )
+    ChatSession.record_messages(session.id, messages)
+    return messages
+
+
+def make_conversation(session: ChatSession, turns: int = 5) -> List[ChatMessage]:
+    contents = []
+    for i in range(turns):
+        contents += [f'question {i}', f'answer {i}']
+    return make_messages(session, contents)
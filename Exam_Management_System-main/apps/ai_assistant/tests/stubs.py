@@ -0,0 +1,53 @@
+"""
+Deterministic stand-in for the OpenAI provider.
+
+StubLLM replaces utils.get_openai_response, utils.stream_ai_response's
+upstream and services._use_openai, so tests exercise the "API key present"
+paths without network access, and replies are predictable:
+"[stub] <prompt>".
+"""
+import os
+from contextlib import ExitStack
+from unittest import mock
+
+
+class StubLLM:
+    def __init__(self, reply_prefix: str = '[stub] '):
+        self.reply_prefix = reply_prefix
+        self.calls = []
+
+    def reply(self, prompt: str) -> str:
+        self.calls.append(prompt)
+        return f'{self.reply_prefix}{prompt}'
+
+    # Signatures mirror the functions being replaced
+    def get_openai_response(self, user_message, session, api_key):
+        return self.reply(user_message)
+
+    def use_openai(self, prompt, max_tokens=200):
+        return self.reply(prompt)
+
+    def stream(self, user_message, session):
+        for word in self.reply(user_message).split(' '):
+            yield word + ' '
+
+    def patch(self) -> ExitStack:
+        """Install the stub (and a fake API key) until the returned stack is closed"""
+        stack = ExitStack()
+        stack.enter_context(mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'stub-key'}))
+        # consumers first: importing it copies utils.stream_ai_response, which
+        # must still be the real function at that point
+        stack.enter_context(mock.patch('apps.ai_assistant.consumers.stream_ai_response', self.stream))
+        stack.enter_context(mock.patch('apps.ai_assistant.utils.get_openai_response', self.get_openai_response))
+        stack.enter_context(mock.patch('apps.ai_assistant.utils.stream_ai_response', self.stream))
+        stack.enter_context(mock.patch('apps.ai_assistant.services._use_openai', self.use_openai))
+        return stack
+
+
+class StubLLMMixin:
+    """TestCase mixin: every test runs against a fresh StubLLM available as self.llm"""
+
+    def setUp(self):
+        super().setUp()
+        self.llm = StubLLM()
+        self.addCleanup(self.llm.patch().close)
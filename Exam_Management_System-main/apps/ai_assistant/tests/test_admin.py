@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .. import admin as chat_admin
+from ..models import ChatMessage, ChatSession
+from ..pagination import EstimatedCountPaginator
+from .factories import make_conversation, make_session, make_sessions, make_user
+
+
+class AdminChangelistTestCase(TestCase):
+    def setUp(self):
+        self.admin = make_user(is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        user = make_user()
+        make_conversation(make_session(user), turns=2)
+        few = (self.changelist_queries('/admin/ai_assistant/chatsession/'),
+               self.changelist_queries('/admin/ai_assistant/chatmessage/'))
+        for session in make_sessions(make_user(), 40):
+            make_conversation(session, turns=2)
+        many = (self.changelist_queries('/admin/ai_assistant/chatsession/'),
+                self.changelist_queries('/admin/ai_assistant/chatmessage/'))
+        self.assertEqual(few, many)
+
+    def test_user_filter_takes_username_or_id(self):
+        alice, bob = make_user('alice'), make_user('bob')
+        make_session(alice, title='Alice chat')
+        make_session(bob, title='Bob chat')
+        response = self.client.get('/admin/ai_assistant/chatsession/', {'user': 'alice'})
+        self.assertContains(response, 'Alice chat')
+        self.assertNotContains(response, 'Bob chat')
+        response = self.client.get('/admin/ai_assistant/chatsession/', {'user': bob.id})
+        self.assertContains(response, 'Bob chat')
+        self.assertNotContains(response, 'Alice chat')
+
+    def test_user_filter_uses_the_autocomplete_view(self):
+        alice = make_user('alice')
+        response = self.client.get('/admin/ai_assistant/chatmessage/', {'user': 'alice'})
+        self.assertContains(response, 'class="admin-autocomplete"')
+        self.assertContains(response, f'<option value="{alice.id}" selected>alice</option>', html=True)
+        self.assertContains(response, 'autocomplete.js')
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'ai_assistant', 'model_name': 'chatsession', 'field_name': 'user', 'term': 'ali'})
+        self.assertEqual(response.json()['results'], [{'id': str(alice.id), 'text': 'alice'}])
+
+    def test_batched_delete_stops_at_time_limit(self):
+        sessions = make_sessions(make_user(), 5)
+        make_conversation(sessions[0], turns=3)
+        url = '/admin/ai_assistant/chatmessage/'
+        ids = list(ChatMessage.objects.values_list('id', flat=True))
+        with mock.patch.object(chat_admin, 'BULK_ACTION_SECONDS', 0), \
+                mock.patch.object(chat_admin, 'BULK_ACTION_BATCH_SIZE', 2):
+            response = self.client.post(url, {'action': 'delete_in_batches', '_selected_action': ids}, follow=True)
+        self.assertContains(response, 'run the action again')
+        self.assertEqual(ChatMessage.objects.count(), 4)
+        sessions[0].refresh_from_db()
+        self.assertEqual(sessions[0].message_count, 4)
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    def test_unfiltered_count_uses_table_statistics(self):
+        make_sessions(make_user(), 30)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        ChatSession.objects.filter(pk__in=list(ChatSession.objects.values_list('pk', flat=True)[:10])).delete()
+        paginator = EstimatedCountPaginator(ChatSession.objects.all(), 10)
+        paginator.estimate_threshold = 5
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 30)  # the statistics, not the 20 rows left
+
+    def test_filtered_count_is_capped(self):
+        user = make_user()
+        make_sessions(user, 30)
+        paginator = EstimatedCountPaginator(ChatSession.objects.filter(user=user), 10)
+        paginator.count_limit = 25
+        self.assertEqual(paginator.count, 25)
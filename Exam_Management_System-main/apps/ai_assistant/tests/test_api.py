@@ -0,0 +1,112 @@
+import gzip
+from unittest import mock
+
+from django.test import TestCase
+
+from .. import services
+from ..api.views import ApiViewSet
+from ..models import PracticeTest, Prediction, WeakArea
+from .factories import make_messages, make_session, make_user
+
+API = '/ai_assistant/api/v1'
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.session = make_session(self.user)
+        make_messages(self.session, [f'message {i}' for i in range(5)])
+        self.client.force_login(self.user)
+        self.messages_url = f'{API}/sessions/{self.session.id}/messages/'
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(f'{API}/sessions/').status_code, 403)
+
+    def test_only_own_rows_are_visible(self):
+        other = make_session(make_user())
+        make_messages(other, ['not yours'])
+        self.assertEqual(self.client.get(f'{API}/sessions/{other.id}/messages/').status_code, 404)
+        ids = [s['id'] for s in self.client.get(f'{API}/sessions/').json()['results']]
+        self.assertEqual(ids, [self.session.id])
+
+    def test_messages_page_with_a_cursor_and_new_ones_appear_on_the_next_link(self):
+        page = self.client.get(self.messages_url, {'page_size': 3}).json()
+        self.assertEqual([m['content'] for m in page['results']], ['message 0', 'message 1', 'message 2'])
+        last = self.client.get(page['next']).json()
+        self.assertEqual([m['content'] for m in last['results']], ['message 3', 'message 4'])
+
+    def test_sparse_fields(self):
+        results = self.client.get(self.messages_url, {'fields': 'id,role'}).json()['results']
+        self.assertEqual(set(results[0]), {'id', 'role'})
+        response = self.client.get(self.messages_url, {'fields': 'id,nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nope', response.json()['fields'][0])
+
+    def test_polling_messages_gets_a_304_until_something_changes(self):
+        response = self.client.get(self.messages_url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(3):  # auth session, user, chat session: no message rows
+            poll = self.client.get(self.messages_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(poll.status_code, 304)
+
+        make_messages(self.session, ['new'])
+        poll = self.client.get(self.messages_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(poll.status_code, 200)
+        self.assertEqual(len(poll.json()['results']), 6)
+        # Lists ignore If-Modified-Since: a message written in the same second would be missed
+        poll = self.client.get(self.messages_url, HTTP_IF_MODIFIED_SINCE=poll['Last-Modified'])
+        self.assertEqual(poll.status_code, 200)
+
+    def test_list_and_detail_etags(self):
+        Prediction.objects.create(session=self.session, predicted_score=70, confidence=0.6)
+        response = self.client.get(f'{API}/predictions/')
+        self.assertEqual(response.json()['results'][0]['predicted_score'], 70)
+        self.assertEqual(self.client.get(f'{API}/predictions/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Prediction.objects.all().delete()
+        self.assertEqual(self.client.get(f'{API}/predictions/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        detail = self.client.get(f'{API}/sessions/{self.session.id}/')
+        self.assertEqual(detail.json()['message_count'], 5)
+        self.assertEqual(
+            self.client.get(f'{API}/sessions/{self.session.id}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 304
+        )
+
+    def test_practice_test_being_generated_is_not_cached_stale(self):
+        with mock.patch.object(services, 'SAVE_CHUNK', 2):
+            pieces = services.save_practice_test(self.session, 'Algebra', (f'Q{i}' for i in range(1, 5)))
+            next(pieces), next(pieces), next(pieces)  # the first chunk is saved
+            test = PracticeTest.objects.get()
+            url = f'{API}/practice-tests/{test.id}/'
+            partial = self.client.get(url)
+            self.assertEqual(partial.json()['content'], 'Q1\nQ2')
+            list(pieces)
+        complete = self.client.get(url, HTTP_IF_NONE_MATCH=partial['ETag'])
+        self.assertEqual(complete.status_code, 200)
+        self.assertEqual(complete.json()['content'], 'Q1\nQ2\nQ3\nQ4')
+
+    def test_filters(self):
+        WeakArea.objects.create(session=self.session, topic='algebra', severity=3)
+        WeakArea.objects.create(session=self.session, topic='optics', severity=2)
+        results = self.client.get(f'{API}/weak-areas/', {'topic': 'optics'}).json()['results']
+        self.assertEqual([w['topic'] for w in results], ['optics'])
+        roles = {m['role'] for m in self.client.get(self.messages_url, {'role': 'user'}).json()['results']}
+        self.assertEqual(roles, {'user'})
+
+    def test_gzip_with_weak_etag(self):
+        make_messages(self.session, ['long message ' * 50])
+        response = self.client.get(self.messages_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn(b'long message', gzip.decompress(response.content))
+        revalidated = self.client.get(self.messages_url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_a_viewset_must_scope_its_queryset(self):
+        class Unscoped(ApiViewSet):
+            serializer_class = None
+
+        with self.assertRaises(TypeError):
+            Unscoped()
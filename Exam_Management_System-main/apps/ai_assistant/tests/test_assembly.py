@@ -0,0 +1,60 @@
+import itertools
+import json
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ..assembly import PaperAssembler, PaperSpec, QuestionPool
+
+
+class PaperAssemblyTestCase(SimpleTestCase):
+    def setUp(self):
+        self.pool = QuestionPool.synthetic(1200, topics=4, seed=3)
+        self.spec = PaperSpec(
+            topic_counts={label: 5 for label in self.pool.topic_labels.tolist()},
+            difficulty_mix={'easy': 10, 'medium': 6, 'hard': 4},
+            total_marks=60,
+            max_overlap=0.2,
+        )
+
+    def test_variants_satisfy_every_constraint(self):
+        variants = list(PaperAssembler(self.pool, self.spec, seed=1).generate(300))
+        self.assertEqual([v.index for v in variants], list(range(300)))
+        row = {qid: i for i, qid in enumerate(self.pool.ids.tolist())}
+        papers = []
+        for v in variants:
+            rows = [row[q] for q in v.question_ids]
+            self.assertEqual(len(set(rows)), 20)
+            self.assertEqual(Counter(self.pool.topic_labels[self.pool.topics[rows]].tolist()),
+                             Counter(self.spec.topic_counts))
+            self.assertEqual(Counter(self.pool.difficulty_labels[self.pool.difficulties[rows]].tolist()),
+                             Counter(self.spec.difficulty_mix))
+            self.assertEqual(v.total_marks, 60)
+            self.assertEqual(int(self.pool.marks[rows].sum()), 60)
+            papers.append(set(v.question_ids))
+        worst = max(len(a & b) for a, b in itertools.combinations(papers, 2))
+        self.assertLessEqual(worst, 4)
+
+    def test_same_seed_same_variants(self):
+        first = list(PaperAssembler(self.pool, self.spec, seed=9).generate(20))
+        second = list(PaperAssembler(self.pool, self.spec, seed=9).generate(20))
+        self.assertEqual(first, second)
+
+    def test_infeasible_specs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            PaperAssembler(self.pool, self.spec._replace(difficulty_mix={'easy': 20, 'hard': 1}))
+        with self.assertRaises(ValueError):
+            PaperAssembler(self.pool, self.spec._replace(topic_counts={'topic-0': 5, 'nope': 1}))
+        impossible = self.spec._replace(total_marks=5000)
+        with self.assertRaises(ValueError):
+            list(PaperAssembler(self.pool, impossible, seed=1).generate(5))
+
+    def test_command_streams_json_lines(self):
+        out = StringIO()
+        call_command('assemble_papers', synthetic=800, count=25, per_topic=3, total_marks=80, tolerance=2,
+                     max_overlap=0.5, seed=2, stdout=out, stderr=StringIO())
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(lines), 25)
+        self.assertTrue(all(len(line['question_ids']) == 30 and abs(line['total_marks'] - 80) <= 2 for line in lines))
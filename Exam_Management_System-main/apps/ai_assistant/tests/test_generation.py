@@ -0,0 +1,106 @@
+import itertools
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import services, streaming
+from ..models import PracticeTest
+from .factories import make_session, make_user
+
+
+def body(response) -> str:
+    return b''.join(response.streaming_content).decode()
+
+
+@override_settings(AI_ASSISTANT_MAX_GENERATED_QUESTIONS=50, AI_ASSISTANT_MAX_PRACTICE_QUESTIONS=20)
+class StreamingGenerationTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.session = make_session(self.user)
+        self.client.force_login(self.user)
+        self.questions_url = f'/ai_assistant/chat/{self.session.id}/generate_questions/'
+        self.practice_url = f'/ai_assistant/chat/{self.session.id}/generate_practice/'
+
+    def post(self, url, data, **extra):
+        return self.client.post(url, json.dumps(data), content_type='application/json', **extra)
+
+    def test_questions_stream_as_json(self):
+        response = self.post(self.questions_url, {'subject': 'Physics', 'count': 30})
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)  # WSGI keeps the sync iterator
+        questions = json.loads(body(response))['questions']
+        self.assertEqual(len(questions), 30)
+        self.assertEqual(questions[29]['text'], 'Physics sample question 30 (difficulty medium)')
+
+    async def test_asgi_streams_chunk_by_chunk(self):
+        # Django drains sync iterators under ASGI before sending; the view must hand it an async one
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.post(self.questions_url, {'count': 3}, content_type='application/json',
+                                                ACCEPT=streaming.NDJSON)
+        self.assertTrue(response.is_async)
+        parts = [part async for part in response.streaming_content]
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(json.loads(parts[-1]), {'done': True, 'count': 3})
+
+        # The practice test is saved from inside the generator: the ORM runs in the sync thread
+        response = await self.async_client.post(self.practice_url, {'topics': ['Algebra'], 'num_questions': 3},
+                                                content_type='application/json')
+        content = json.loads(''.join([part.decode() async for part in response.streaming_content]))
+        saved = await PracticeTest.objects.aget(session=self.session)
+        self.assertEqual(saved.content, content['practice_test']['content'])
+
+    def test_questions_stream_as_ndjson(self):
+        response = self.post(self.questions_url, {'count': 3}, HTTP_ACCEPT=streaming.NDJSON)
+        self.assertEqual(response['Content-Type'], streaming.NDJSON)
+        lines = [json.loads(line) for line in body(response).splitlines()]
+        self.assertEqual([line.get('id') for line in lines[:3]], [1, 2, 3])
+        self.assertEqual(lines[-1], {'done': True, 'count': 3})
+
+    def test_counts_are_capped(self):
+        for count in (51, 0, 'many'):
+            response = self.post(self.questions_url, {'count': count})
+            self.assertEqual(response.status_code, 400, count)
+        response = self.post(self.practice_url, {'topics': ['Algebra'], 'num_questions': 21})
+        self.assertEqual(response.json()['error'], 'num_questions must be between 1 and 20')
+        self.assertEqual(self.post(self.practice_url, {'topics': []}).status_code, 400)
+
+    def test_practice_test_streams_and_is_saved_in_chunks(self):
+        with mock.patch.object(services, 'SAVE_CHUNK', 4):
+            response = self.post(self.practice_url, {'topics': ['Algebra', 'Optics'], 'num_questions': 10})
+            test = json.loads(body(response))['practice_test']
+        self.assertEqual(test['title'], 'Practice Test: Algebra, Optics')
+        lines = test['content'].split('\n')
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(lines[0], 'Q1: Sample question on Optics')
+        self.assertEqual(PracticeTest.objects.get(session=self.session).content, test['content'])
+
+    def test_practice_test_as_ndjson(self):
+        response = self.post(self.practice_url, {'topics': ['Algebra'], 'num_questions': 2}, HTTP_ACCEPT=streaming.NDJSON)
+        lines = [json.loads(line) for line in body(response).splitlines()]
+        self.assertEqual(lines[0], {'title': 'Practice Test: Algebra'})
+        self.assertEqual([line['content'] for line in lines[1:3]], ['Q1: Sample question on Algebra',
+                                                                     'Q2: Sample question on Algebra'])
+
+
+class GeneratorTestCase(SimpleTestCase):
+    def test_generation_is_lazy(self):
+        first = list(itertools.islice(services.iter_questions('Math', count=10 ** 9, use_openai=False), 2))
+        self.assertEqual([q['id'] for q in first], [1, 2])
+
+    def test_provider_is_asked_in_chunks_and_templates_fill_in(self):
+        replies = iter(['first ten', ''])
+        with mock.patch.object(services, '_use_openai', lambda prompt, max_tokens=200: next(replies)):
+            questions = list(services.iter_questions('Math', count=25))
+        self.assertEqual(questions[0], {'text': 'first ten'})
+        self.assertEqual([q['id'] for q in questions[1:]], list(range(11, 26)))
+
+    def test_errors_midway_are_reported_in_the_body(self):
+        def items():
+            yield {'id': 1}
+            raise RuntimeError('provider went away')
+
+        self.assertEqual(json.loads(''.join(streaming.json_list('questions', items()))),
+                         {'questions': [{'id': 1}], 'error': 'provider went away'})
+        text = json.loads(''.join(streaming.json_text('t', {'title': 'x'}, 'content', iter(['a', 'b"\n']))))
+        self.assertEqual(text, {'t': {'title': 'x', 'content': 'a\nb"\n'}})
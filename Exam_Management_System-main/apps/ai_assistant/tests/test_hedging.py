@@ -0,0 +1,171 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import hedging, utils
+from .factories import make_session, make_staff, make_user
+
+SLO = {
+    'ENABLED': True,
+    'DEADLINES': {'chat': 0.5, 'chat_stream': 0.5},
+    'MIN_HEDGE_DELAY': 0.05,
+    'BREAKER_MIN_CALLS': 3,
+    'BREAKER_COOLDOWN': 0.1,
+}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class Upstream:
+    """Scripted provider: each call takes the next (delay, reply or exception)"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            delay, result = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@override_settings(AI_ASSISTANT_LLM_SLO=SLO)
+class HedgedCallTestCase(SimpleTestCase):
+    def setUp(self):
+        hedging.reset()
+        self.addCleanup(hedging.reset)
+
+    def outcomes(self, endpoint='chat'):
+        return {k: v for k, v in hedging.metrics()[endpoint]['outcomes'].items() if v}
+
+    def test_fast_answer_wins_without_a_hedge(self):
+        upstream = Upstream((0, 'upstream'))
+        self.assertEqual(hedging.call('chat', upstream, lambda: 'local'), 'upstream')
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual(self.outcomes(), {'primary': 1})
+
+    def test_local_answer_at_the_deadline(self):
+        start = time.monotonic()
+        reply = hedging.call('chat', Upstream((2, 'too late')), lambda: 'local')
+        self.assertEqual(reply, 'local')
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(self.outcomes(), {'deadline': 1})
+
+    def test_slow_attempt_is_hedged(self):
+        discarded = []
+        upstream = Upstream((0.4, 'slow'), (0, 'fast'))
+        reply = hedging.call('chat', upstream, lambda: 'local', discard=discarded.append)
+        self.assertEqual(reply, 'fast')
+        self.assertEqual(self.outcomes(), {'hedge': 1})
+        self.assertTrue(wait_for(lambda: discarded == ['slow']))
+
+    def test_failed_attempt_is_retried_at_once(self):
+        upstream = Upstream((0, RuntimeError('503')), (0, 'second try'))
+        self.assertEqual(hedging.call('chat', upstream, lambda: 'local'), 'second try')
+        upstream = Upstream((0, RuntimeError('503')))
+        self.assertEqual(hedging.call('chat', upstream, lambda: 'local'), 'local')
+        self.assertEqual(self.outcomes(), {'hedge': 1, 'error': 1})
+
+    def test_breaker_skips_a_failing_provider_until_a_trial_succeeds(self):
+        failing = Upstream((0, RuntimeError('down')))
+        for _ in range(2):
+            hedging.call('chat', failing, lambda: 'local')  # 2 calls x 2 attempts
+        breaker = hedging._endpoints['chat'].breaker
+        self.assertTrue(wait_for(lambda: breaker.state == 'open'))
+
+        calls = failing.calls
+        self.assertEqual(hedging.call('chat', failing, lambda: 'local'), 'local')
+        self.assertEqual(failing.calls, calls)
+        self.assertEqual(self.outcomes()['open'], 1)
+
+        self.assertTrue(wait_for(lambda: breaker.state == 'half-open'))
+        self.assertEqual(hedging.call('chat', Upstream((0, 'back')), lambda: 'local'), 'back')
+        self.assertTrue(wait_for(lambda: breaker.state == 'closed'))
+
+    def test_trial_call_is_not_hedged(self):
+        breaker = hedging._endpoint('chat', hedging.get_config()).breaker
+        breaker.opened_at = time.monotonic() - 1
+        upstream = Upstream((0.3, 'slow'), (0, 'hedge'))
+        self.assertEqual(hedging.call('chat', upstream, lambda: 'local'), 'slow')
+        self.assertEqual(upstream.calls, 1)
+        self.assertTrue(wait_for(lambda: breaker.state == 'closed'))
+
+    def test_only_the_trial_settles_a_half_open_breaker(self):
+        breaker = hedging.CircuitBreaker(min_calls=1, cooldown=0)
+        breaker.record(False)
+        self.assertEqual(breaker.allow(), (True, True))
+        breaker.record(True)  # started before the breaker opened
+        self.assertEqual(breaker.allow(), (False, False))
+        breaker.record(False, trial=True)
+        self.assertEqual(breaker.state, 'half-open')  # reopened, with no cooldown
+        self.assertEqual(breaker.allow(), (True, True))
+        breaker.record(True, trial=True)
+        self.assertEqual((breaker.state, breaker.allow()), ('closed', (True, False)))
+
+    @override_settings(AI_ASSISTANT_LLM_SLO={'ENABLED': False})
+    def test_disabled_waits_and_falls_back_on_errors_only(self):
+        self.assertEqual(hedging.call('chat', Upstream((0.05, 'upstream')), lambda: 'local'), 'upstream')
+        self.assertEqual(hedging.call('chat', Upstream((0, RuntimeError())), lambda: 'local'), 'local')
+        self.assertEqual(hedging.metrics(), {})
+
+
+class FakeOpenAI:
+    def __init__(self, delay, text='upstream reply'):
+        self.delay = delay
+        self.text = text
+        self.ChatCompletion = SimpleNamespace(create=self.create)
+
+    def create(self, stream=False, **kwargs):
+        time.sleep(self.delay)
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta={'content': word})])
+                         for word in (' upstream', ' reply')])
+        return SimpleNamespace(choices=[SimpleNamespace(message={'content': self.text})])
+
+
+@override_settings(AI_ASSISTANT_LLM_SLO=SLO)
+class ChatSLOTestCase(TestCase):
+    def setUp(self):
+        hedging.reset()
+        self.addCleanup(hedging.reset)
+        self.session = make_session(make_user())
+        self.local = utils.get_local_ai_response('How do I prepare?', self.session)
+
+    def test_slow_provider_is_replaced_by_the_local_answer(self):
+        with mock.patch.object(utils, 'get_openai', return_value=FakeOpenAI(delay=2)):
+            start = time.monotonic()
+            self.assertEqual(utils.get_openai_response('How do I prepare?', self.session, 'key'), self.local)
+            self.assertEqual(''.join(self._stream('How do I prepare?')), self.local)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_fast_provider_answers(self):
+        with mock.patch.object(utils, 'get_openai', return_value=FakeOpenAI(delay=0)):
+            self.assertEqual(utils.get_openai_response('hi', self.session, 'key'), 'upstream reply')
+            self.assertEqual(''.join(self._stream('hi')), 'upstream reply')
+
+    def _stream(self, text):
+        with mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'key'}):
+            return list(utils.stream_ai_response(text, self.session))
+
+
+class LLMMetricsViewTestCase(TestCase):
+    def test_staff_only(self):
+        self.client.force_login(make_user())
+        self.assertEqual(self.client.get('/ai_assistant/metrics/llm/').status_code, 403)
+        self.client.force_login(make_staff())
+        response = self.client.get('/ai_assistant/metrics/llm/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('endpoints', response.json())
@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import idempotency, views
+from ..models import ChatMessage, ChatSession
+from .factories import make_session, make_user
+
+
+@override_settings(AI_ASSISTANT_IDEMPOTENCY={'WAIT_SECONDS': 0, 'POLL_SECONDS': 0.01, 'STALE_SECONDS': 90})
+class IdempotentSendTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.session = make_session(self.user)
+        self.client.force_login(self.user)
+        self.url = f'/ai_assistant/send/{self.session.id}/'
+        patcher = mock.patch.object(views, 'get_ai_response', wraps=views.get_ai_response)
+        self.llm = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, message='How do I prepare?', client_message_id='c-1', url=None):
+        return self.client.post(url or self.url, json.dumps({'message': message, 'client_message_id': client_message_id}),
+                                content_type='application/json')
+
+    def test_resend_gets_the_first_reply(self):
+        first = self.send().json()
+        again = self.send().json()
+        self.assertEqual(self.llm.call_count, 1)
+        self.assertEqual(again['ai_response'], first['ai_response'])
+        self.assertEqual((first['duplicate'], again['duplicate']), (False, True))
+        user_msg, ai_msg = ChatMessage.objects.filter(session=self.session)
+        self.assertEqual(user_msg.client_message_id, 'c-1')
+        self.assertEqual(ai_msg.in_reply_to, user_msg)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 2)
+
+        self.send(client_message_id='c-2')
+        self.assertEqual(self.llm.call_count, 2)
+
+    def test_resent_first_message_of_a_draft_reuses_its_chat(self):
+        first = self.send(url='/ai_assistant/send/').json()
+        again = self.send(url='/ai_assistant/send/').json()
+        self.assertEqual(again['session_id'], first['session_id'])
+        self.assertEqual(ChatSession.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.llm.call_count, 1)
+
+    def test_resend_waits_for_a_reply_in_progress(self):
+        user_msg = self.session.messages.create(role='user', content='hi', client_message_id='c-1')
+        self.assertEqual(self.send('hi').status_code, 202)
+        self.assertTrue(self.send('hi').json()['pending'])
+
+        def answered_meanwhile(seconds):
+            self.session.messages.create(role='assistant', content='hello there', in_reply_to=user_msg)
+
+        with override_settings(AI_ASSISTANT_IDEMPOTENCY={'WAIT_SECONDS': 5, 'POLL_SECONDS': 0.01}), \
+                mock.patch.object(idempotency.time, 'sleep', side_effect=answered_meanwhile) as sleep:
+            response = self.send('hi').json()
+        self.assertEqual(response['ai_response'], 'hello there')
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(self.llm.call_count, 0)
+
+    def test_abandoned_message_is_answered_by_the_resend(self):
+        user_msg = self.session.messages.create(role='user', content='hi', client_message_id='c-1')
+        ChatMessage.objects.filter(id=user_msg.id).update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.send('hi').json()
+        self.assertEqual(response['duplicate'], False)
+        self.assertEqual(self.llm.call_count, 1)
+        self.assertEqual(ChatMessage.objects.get(role='assistant').in_reply_to_id, user_msg.id)
+
+    def test_simultaneous_copies_insert_once(self):
+        real = idempotency.find_sent
+        with mock.patch.object(idempotency, 'find_sent', side_effect=[None, None]):
+            self.assertEqual(self.send().status_code, 200)
+            # The second copy missed the first one and hits the unique constraint
+            with mock.patch.object(idempotency, 'find_sent', side_effect=[None, real(self.user, 'c-1', self.session)]):
+                response = self.send()
+        self.assertTrue(response.json()['duplicate'])
+        self.assertEqual(ChatMessage.objects.filter(role='user').count(), 1)
+
+    def test_ids_are_checked(self):
+        self.send('first')
+        response = self.send('something else')
+        self.assertEqual(response.status_code, 409)
+        for bad in ('x' * 65, 12):
+            self.assertEqual(self.send(client_message_id=bad).status_code, 400)
+        # Other users' messages never match
+        other = make_user()
+        self.client.force_login(other)
+        response = self.send('first', url='/ai_assistant/send/')
+        self.assertFalse(response.json()['duplicate'])
+
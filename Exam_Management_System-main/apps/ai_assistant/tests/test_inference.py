@@ -0,0 +1,133 @@
+import multiprocessing
+import socket
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import inference, intents, utils
+from ..retrieval import RetrievalModel
+from .factories import make_session, make_user
+
+TINY_MODEL = str(Path(inference.__file__).resolve().parent / 'local_models' / 'tiny_chat.json')
+
+
+def free_address():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return f'127.0.0.1:{s.getsockname()[1]}'
+
+
+class MicroBatcherTestCase(SimpleTestCase):
+    def test_concurrent_requests_share_batches(self):
+        seen = []
+
+        def predict_batch(texts, task):
+            seen.append(len(texts))
+            time.sleep(0.01)
+            return [f'{task}:{text}' for text in texts]
+
+        batcher = inference.MicroBatcher(predict_batch, max_batch=8, max_wait_ms=20)
+        replies, done = {}, threading.Semaphore(0)
+
+        def callback(i):
+            def reply(ok, value):
+                replies[i] = (ok, value)
+                done.release()
+            return reply
+
+        for i in range(20):
+            batcher.submit(str(i), 'chat', callback(i))
+        for _ in range(20):
+            done.acquire(timeout=5)
+        batcher.close()
+
+        self.assertEqual(replies, {i: (True, f'chat:{i}') for i in range(20)})
+        self.assertLessEqual(max(seen), 8)
+        self.assertLess(batcher.stats['batches'], 20)
+
+    def test_model_errors_reach_every_caller(self):
+        def predict_batch(texts, task):
+            raise ValueError('boom')
+
+        batcher = inference.MicroBatcher(predict_batch, max_wait_ms=0)
+        result = []
+        batcher.submit('hi', 'chat', lambda ok, value: result.append((ok, value)))
+        batcher.close()
+        self.assertEqual(result, [(False, 'boom')])
+
+
+class RetrievalModelTestCase(SimpleTestCase):
+    def test_tiny_model_answers_like_the_rules(self):
+        model = RetrievalModel(TINY_MODEL)
+        replies = model.predict_batch(['How do I prepare for my exams?', 'xyzzy'], 'chat')
+        self.assertEqual(replies, [intents.PREPARATION_TIPS, intents.DEFAULT_REPLY])
+
+
+class InferenceServerTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.address = free_address()
+        cls.process = multiprocessing.get_context('spawn').Process(
+            target=inference.serve, args=(TINY_MODEL, cls.address, b'test-key'),
+            kwargs={'max_wait_ms': 20}, daemon=True,
+        )
+        cls.process.start()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(inference.parse_address(cls.address), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.process.terminate()
+        cls.process.join()
+        super().tearDownClass()
+
+    def test_concurrent_clients_share_one_connection(self):
+        client = inference.InferenceClient(self.address, b'test-key', timeout=10)
+        self.addCleanup(client.close)
+        self.assertTrue(client.supports('chat'))
+        self.assertFalse(client.supports('generate'))
+
+        replies = [None] * 16
+
+        def ask(i):
+            replies[i] = client.predict('how do i prepare' if i % 2 else 'hello there')
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(replies[1], intents.PREPARATION_TIPS)
+        self.assertTrue(all(reply == replies[i % 2] for i, reply in enumerate(replies)))
+
+    def test_wrong_authkey_is_refused(self):
+        client = inference.InferenceClient(self.address, b'wrong', timeout=1)
+        with self.assertRaises(inference.InferenceUnavailable):
+            client.predict('hello')
+
+
+@override_settings(AI_ASSISTANT_LOCAL_MODEL={'ENABLED': True, 'ADDRESS': '127.0.0.1:1', 'TIMEOUT': 1})
+class LocalModelFallbackTestCase(TestCase):
+    def setUp(self):
+        self.session = make_session(make_user())
+        patcher = mock.patch.object(inference, '_client', (None, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rules_answer_when_the_server_is_down(self):
+        reply = utils.get_ai_response('How do I prepare for exams?', self.session)
+        self.assertEqual(reply, utils.get_local_ai_response('How do I prepare for exams?', self.session))
+
+    def test_server_reply_is_used(self):
+        with mock.patch.object(inference, 'local_model_response', return_value='from the model'):
+            self.assertEqual(utils.get_ai_response('hi', self.session), 'from the model')
+            self.assertEqual(''.join(utils.stream_ai_response('hi', self.session)), 'from the model')
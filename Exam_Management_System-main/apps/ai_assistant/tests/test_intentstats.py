@@ -0,0 +1,127 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import inference, intentstats, utils
+from ..models import ChatMessage, IntentRollup
+from .factories import make_session, make_staff, make_user
+from .test_hedging import FakeOpenAI
+
+
+class IntentStatsTestCase(TestCase):
+    def setUp(self):
+        intentstats.reset()
+        self.addCleanup(intentstats.reset)
+        self.session = make_session(make_user())
+
+    def test_replies_are_counted_by_intent_and_source(self):
+        utils.get_local_ai_response('How do I prepare for exams?', self.session)
+        utils.get_local_ai_response('How should I prepare?', self.session)
+        utils.get_local_ai_response('qwerty', self.session)
+        with mock.patch.object(utils, 'get_openai', return_value=FakeOpenAI(delay=0)):
+            utils.get_openai_response('How do I prepare?', self.session, 'key')
+        with mock.patch.object(inference, 'local_model_response', return_value='model reply'):
+            utils.get_local_model_response('qwerty', self.session)
+
+        hour = intentstats.hour_of()
+        prepare = utils.get_local_ai_intent('How do I prepare?', self.session)[0]
+        self.assertEqual(intentstats.get_counter().pending(), {
+            (hour, prepare, 'rule'): 2,
+            (hour, 'default', 'rule'): 1,
+            (hour, prepare, 'openai'): 1,
+            (hour, 'default', 'local_model'): 1,
+        })
+
+    def test_provider_failures_count_as_rule_replies(self):
+        failing = FakeOpenAI(delay=0)
+        failing.ChatCompletion.create = mock.Mock(side_effect=RuntimeError('down'))
+        with mock.patch.object(utils, 'get_openai', return_value=failing):
+            utils.get_openai_response('qwerty', self.session, 'key')
+        self.assertEqual(list(intentstats.get_counter().pending().values()), [1])
+        self.assertEqual(list(intentstats.get_counter().pending())[0][2], 'rule')
+
+    def test_flush_adds_to_hourly_rows(self):
+        for _ in range(3):
+            utils.get_local_ai_response('qwerty', self.session)
+        self.assertEqual(intentstats.flush(), 1)
+        utils.get_local_ai_response('qwerty', self.session)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(intentstats.flush(), 1)
+        self.assertEqual([q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']], ['UPDATE'])
+        self.assertEqual(intentstats.flush(), 0)
+        row = IntentRollup.objects.get()
+        self.assertEqual((row.intent, row.source, row.count), ('default', 'rule', 4))
+        self.assertEqual(row.hour, intentstats.hour_of())
+
+    def test_failed_flush_keeps_the_counts(self):
+        utils.get_local_ai_response('qwerty', self.session)
+        with mock.patch.object(intentstats, 'apply', side_effect=DatabaseError('locked')):
+            self.assertEqual(intentstats.flush(), 0)
+        self.assertEqual(intentstats.flush(), 1)
+        self.assertEqual(IntentRollup.objects.get().count, 1)
+
+    def test_report_merges_rows_and_unflushed_counts(self):
+        now = timezone.now()
+        IntentRollup.objects.create(hour=intentstats.hour_of(now - timedelta(hours=3)), intent='default',
+                                    source='rule', count=5)
+        IntentRollup.objects.create(hour=intentstats.hour_of(now - timedelta(hours=3)), intent='exam_schedule',
+                                    source='openai', count=3)
+        IntentRollup.objects.create(hour=intentstats.hour_of(now - timedelta(days=3)), intent='default',
+                                    source='rule', count=100)
+        utils.get_local_ai_response('qwerty', self.session)
+
+        report = intentstats.report(now - timedelta(hours=24), now, by_hour=True)
+        self.assertEqual(report['total'], 9)
+        self.assertEqual(report['intents'][0], {'intent': 'default', 'count': 6, 'share': 0.6667,
+                                                'sources': {'rule': 6}})
+        self.assertEqual(report['default_share'], 0.6667)
+        self.assertEqual(report['sources'], {'rule': 6, 'openai': 3})
+        self.assertEqual([h['count'] for h in report['hours']], [8, 1])
+        self.assertEqual(intentstats.report(now - timedelta(hours=24), now, source='openai')['total'], 3)
+
+    @override_settings(AI_ASSISTANT_INTENT_STATS={'ENABLED': False})
+    def test_disabled_counts_nothing(self):
+        utils.get_local_ai_response('qwerty', self.session)
+        self.assertIsNone(intentstats.get_counter())
+        self.assertEqual(intentstats.flush(), 0)
+
+
+class IntentReportViewTestCase(TestCase):
+    url = '/ai_assistant/analytics/intents/'
+
+    def setUp(self):
+        intentstats.reset()
+        self.addCleanup(intentstats.reset)
+
+    def test_staff_only(self):
+        self.client.force_login(make_user())
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_chat_replies_show_up_without_reading_messages(self):
+        user = make_user()
+        self.client.force_login(user)
+        for text in ('hello', 'qwerty'):
+            self.client.post('/ai_assistant/send/', json.dumps({'message': text}), content_type='application/json')
+        intentstats.flush()
+
+        self.client.force_login(make_staff())
+        with mock.patch.object(ChatMessage.objects, 'get_queryset', side_effect=AssertionError('messages read')):
+            response = self.client.get(self.url, {'by_hour': '1'})
+        data = response.json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['default_share'], 0.5)
+        self.assertEqual(len(data['hours']), 1)
+
+    def test_bad_parameters(self):
+        self.client.force_login(make_staff())
+        self.assertEqual(self.client.get(self.url, {'source': 'cache'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': 'yesterday'}).status_code, 400)
+        response = self.client.get(self.url, {'start': '2024-05-02', 'end': '2024-05-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'start': '2024-05-01', 'end': '2024-05-02T12:00'})
+        self.assertEqual(response.json()['total'], 0)
@@ -0,0 +1,178 @@
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .. import calibration, irt, questionbank, services
+from ..models import QuestionCalibration, StudentAbility
+from .factories import make_user
+
+
+class IrtFitTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.responses, cls.truth = irt.Responses.synthetic(3000, 150, 60, seed=7)
+        cls.fit = irt.fit(cls.responses)
+
+    def test_recovers_simulated_parameters(self):
+        ability, difficulty, discrimination = self.truth
+        self.assertTrue(self.fit.converged)
+        self.assertGreater(np.corrcoef(self.fit.ability, ability)[0, 1], 0.9)
+        self.assertGreater(np.corrcoef(self.fit.difficulty, difficulty)[0, 1], 0.97)
+        self.assertGreater(np.corrcoef(self.fit.discrimination, discrimination)[0, 1], 0.7)
+        self.assertTrue((self.fit.ability_se > 0).all())
+
+    def test_unanimous_answers_stay_finite(self):
+        responses = irt.Responses([1, 1, 2, 2], [10, 11, 10, 11], [1, 1, 1, 1])
+        fit = irt.fit(responses)
+        self.assertTrue(np.isfinite(fit.ability).all() and np.isfinite(fit.difficulty).all())
+
+    def test_warm_start_converges_faster_and_masks_hold_parameters(self):
+        again = irt.fit(self.responses, warm=self.fit)
+        self.assertLess(again.iterations, self.fit.iterations)
+
+        move = np.zeros(self.responses.shape[1], bool)
+        move[:10] = True
+        partial = irt.fit(self.responses, warm=self.fit, update_questions=move,
+                          update_students=np.zeros(self.responses.shape[0], bool))
+        np.testing.assert_array_equal(partial.difficulty[10:], self.fit.difficulty[10:])
+        np.testing.assert_array_equal(partial.ability, self.fit.ability)
+
+    def test_single_student_ability(self):
+        b, a = self.fit.difficulty, self.fit.discrimination
+        rows = self.responses.students == 0
+        theta, se = irt.ability_from_answers(b[self.responses.questions[rows]], a[self.responses.questions[rows]],
+                                             self.responses.correct[rows])
+        self.assertAlmostEqual(theta, self.fit.ability[0], delta=0.05)
+        self.assertGreater(se, 0)
+
+    def test_selection_targets_success_probability(self):
+        b, a = self.fit.difficulty, self.fit.discrimination
+        picked = irt.select_items(1.0, b, a, 10, target=0.7, rng=np.random.default_rng(0))
+        self.assertEqual(len(set(picked.tolist())), 10)
+        chance = irt.probability(1.0, b[picked], a[picked])
+        self.assertLess(np.abs(chance - 0.7).max(), 0.15)
+
+        exclude = np.zeros(len(b), bool)
+        exclude[picked] = True
+        again = irt.select_items(1.0, b, a, 10, target=0.7, exclude=exclude, randomesque=1)
+        self.assertFalse(set(again.tolist()) & set(picked.tolist()))
+        best = irt.select_items(0.0, b, a, 5, randomesque=1)
+        self.assertEqual(best.tolist(), np.argsort(-irt.information(0.0, b, a), kind='stable')[:5].tolist())
+        with self.assertRaises(ValueError):
+            irt.select_items(0.0, b, a, len(b) + 1)
+
+
+class CalibrationTestCase(TestCase):
+    def setUp(self):
+        questionbank.reset()
+        self.addCleanup(questionbank.reset)
+        self.users = [make_user() for _ in range(40)]
+        rng = np.random.default_rng(3)
+        ability = np.linspace(-2, 2, len(self.users))
+        difficulty = np.linspace(-2, 2, 20)
+        rows = [(user.pk, 100 + j, rng.random() < irt.probability(ability[i], difficulty[j], 1.0))
+                for i, user in enumerate(self.users) for j in range(20)]
+        self.responses = irt.Responses(*zip(*rows))
+
+    def test_answers_are_graded_by_marks_then_key(self):
+        self.assertTrue(calibration.is_correct(4, 4, 'B', 'A'))
+        self.assertFalse(calibration.is_correct(2, 4, 'A', 'A'))
+        self.assertTrue(calibration.is_correct(None, 4, ' a ', 'A'))
+        self.assertFalse(calibration.is_correct(None, 4, 'A', ''))
+
+    def test_refit_stores_and_reuses_parameters(self):
+        self.assertIsNone(calibration.load_responses())  # no exams app here
+        with mock.patch.object(calibration, 'load_responses', return_value=self.responses):
+            result = calibration.refit()
+            self.assertEqual((result['questions'], result['students'], result['responses']), (20, 40, 800))
+            again = calibration.refit()
+        self.assertLess(again['iterations'], result['iterations'])
+        stored = calibration.stored_fit()
+        self.assertEqual(sorted(stored.question_ids.tolist()), list(range(100, 120)))
+        easiest = QuestionCalibration.objects.order_by('difficulty').first().question_id
+        self.assertIn(easiest, (100, 101, 102))
+        strongest = StudentAbility.objects.order_by('-ability').first()
+        self.assertIn(strongest.user, self.users[-10:])
+
+    def test_incremental_refit_only_touches_new_answers(self):
+        with mock.patch.object(calibration, 'load_responses', return_value=self.responses):
+            calibration.refit()
+        before = dict(QuestionCalibration.objects.values_list('question_id', 'difficulty'))
+        new = irt.Responses([self.users[0].pk] * 3, [100, 101, 102], [1, 1, 1])
+        involved = irt.Responses(*zip(*[(s, q, y) for s, q, y in zip(
+            self.responses.student_labels[self.responses.students], self.responses.question_labels[self.responses.questions],
+            self.responses.correct) if s == self.users[0].pk or q in (100, 101, 102)]))
+        with mock.patch.object(calibration, 'load_responses', side_effect=[new, involved]) as load:
+            result = calibration.refit(incremental=True)
+        self.assertIn('answered_at__gt', str(load.call_args_list[0]))
+        self.assertEqual((result['questions'], result['students']), (3, 1))
+        after = dict(QuestionCalibration.objects.values_list('question_id', 'difficulty'))
+        self.assertEqual({q for q in after if after[q] != before[q]} - {100, 101, 102}, set())
+
+    def test_graded_result_updates_the_students_ability(self):
+        with mock.patch.object(calibration, 'load_responses', return_value=self.responses):
+            calibration.refit()
+        user = self.users[0]
+        strong = irt.Responses([user.pk] * 20, range(100, 120), [1] * 20)
+        with mock.patch.object(calibration, 'load_responses', return_value=strong):
+            ability = calibration.update_ability(user.pk)
+        self.assertGreater(ability.ability, 1.0)
+        self.assertEqual(ability.responses, 20)
+
+    def test_practice_tests_target_the_students_level(self):
+        with mock.patch.object(calibration, 'load_responses', return_value=self.responses):
+            calibration.refit()
+        questions = [SimpleNamespace(id=100 + j, subject_id=1 + j % 2, marks=1) for j in range(20)]
+        weak, strong = self.users[0], self.users[-1]
+        papers = {}
+        for user in (weak, strong):
+            papers[user] = calibration.adaptive_paper(user, questions, {'1': 2, '2': 2}, np.random.default_rng(0))
+            self.assertEqual(len(set(papers[user])), 4)
+            self.assertEqual(sorted((qid - 100) % 2 for qid in papers[user]), [0, 0, 1, 1])
+        difficulty = dict(QuestionCalibration.objects.values_list('question_id', 'difficulty'))
+        self.assertLess(np.mean([difficulty[q] for q in papers[weak]]),
+                        np.mean([difficulty[q] for q in papers[strong]]))
+        self.assertIsNone(calibration.adaptive_paper(make_user(), questions, {'1': 2}))
+        self.assertIsNone(calibration.adaptive_paper(weak, questions, {'1': 11}))
+
+    def test_question_bank_uses_the_adaptive_paper(self):
+        user = self.users[0]
+        questions = [SimpleNamespace(id=100 + j, subject_id=1, marks=1) for j in range(20)]
+        Question = mock.Mock()
+        Question.objects.filter.return_value.only.return_value = questions
+        with mock.patch.object(questionbank.apps, 'get_model', return_value=Question), \
+                mock.patch.object(calibration, 'adaptive_paper', return_value=[105, 104]) as adaptive:
+            self.assertEqual(services._question_bank_paper(['Optics'], 2, user), [105, 104])
+        adaptive.assert_called_once_with(user, questions, {'1': 2}, calibrated=mock.ANY)
+
+    def test_question_bank_is_read_once_per_generation(self):
+        with mock.patch.object(calibration, 'load_responses', return_value=self.responses):
+            calibration.refit()
+        user = self.users[0]
+        questions = [SimpleNamespace(id=100 + j, subject_id=1 + j % 2, marks=1) for j in range(20)]
+        Question = mock.Mock()
+        Question.objects.filter.return_value.only.return_value = questions
+        with mock.patch.object(questionbank.apps, 'get_model', return_value=Question):
+            self.assertEqual(len(services._question_bank_paper(['Optics', 'Algebra'], 4, user)), 4)
+            with self.assertNumQueries(1):  # the user's ability
+                self.assertEqual(len(services._question_bank_paper(['Algebra', 'Optics'], 4, user)), 4)
+            self.assertEqual(Question.objects.filter.call_count, 1)
+            questionbank.invalidate()
+            services._question_bank_paper(['Optics', 'Algebra'], 4, user)
+            self.assertEqual(Question.objects.filter.call_count, 2)
+
+    def test_command_needs_the_exams_app(self):
+        with self.assertRaises(CommandError):
+            call_command('calibrate_questions', stdout=StringIO())
+        out = StringIO()
+        with mock.patch.object(calibration, '_response_model', return_value=object()), \
+                mock.patch.object(calibration, 'load_responses', return_value=self.responses):
+            call_command('calibrate_questions', stdout=out)
+        self.assertIn('20 questions and 40 students calibrated from 800 answers', out.getvalue())
+        self.assertTrue(QuestionCalibration.objects.filter(fitted_at__lte=timezone.now()).exists())
@@ -0,0 +1,87 @@
+from importlib import import_module
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ..models import ChatSession, ChatMessage
+
+User = get_user_model()
+backfill_0003 = import_module('apps.ai_assistant.migrations.0003_chatsession_message_summary')
+
+
+class ChatSessionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.session = ChatSession.objects.create(user=self.user, title='Test Chat')
+
+    def test_chat_session_creation(self):
+        self.assertEqual(self.session.user, self.user)
+        self.assertEqual(self.session.title, 'Test Chat')
+
+    def test_chat_message_creation(self):
+        message = ChatMessage.objects.create(
+            session=self.session,
+            role='user',
+            content='Hello AI'
+        )
+        self.assertEqual(message.session, self.session)
+        self.assertEqual(message.role, 'user')
+        self.assertEqual(message.content, 'Hello AI')
+
+
+class SessionSummaryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='summaryuser', password='testpass')
+        self.session = ChatSession.objects.create(user=self.user, title='Exam Assistant Chat')
+
+    def test_counters_follow_new_messages(self):
+        ChatMessage.objects.create(session=self.session, role='user', content='When is my  next exam?')
+        ChatMessage.objects.create(session=self.session, role='assistant', content='Check the dashboard.')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 2)
+        self.assertEqual(self.session.last_message_preview, 'Check the dashboard.')
+        self.assertIsNotNone(self.session.last_message_at)
+
+    def test_title_comes_from_first_user_message(self):
+        ChatMessage.objects.create(session=self.session, role='user', content='How do I prepare for calculus?')
+        ChatMessage.objects.create(session=self.session, role='user', content='Something else')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.title, 'How do I prepare for calculus?')
+
+    def test_custom_title_is_kept(self):
+        session = ChatSession.objects.create(user=self.user, title='Revision plan')
+        ChatMessage.objects.create(session=session, role='user', content='Hello')
+        session.refresh_from_db()
+        self.assertEqual(session.title, 'Revision plan')
+
+    def test_backfill_titles_old_sessions_in_one_query_per_batch(self):
+        old = ChatSession.objects.create(user=self.user, title='Exam Assistant Chat')
+        named = ChatSession.objects.create(user=self.user, title='Revision plan')
+        for session in (old, named):
+            ChatMessage.objects.create(session=session, role='assistant', content='Hi, how can I help?')
+            ChatMessage.objects.create(session=session, role='user', content='How do I  prepare for calculus?')
+            ChatMessage.objects.create(session=session, role='assistant', content='Practice daily.')
+        ChatSession.objects.filter(pk__in=[old.pk, named.pk]).update(
+            title='Exam Assistant Chat', message_count=0, last_message_at=None, last_message_preview='')
+        ChatSession.objects.filter(pk=named.pk).update(title='Revision plan')
+        # Read one batch, write it, read the (empty) next batch
+        with self.assertNumQueries(3):
+            backfill_0003.backfill_message_summary(django_apps, None)
+        old.refresh_from_db()
+        named.refresh_from_db()
+        self.assertEqual(old.title, 'How do I prepare for calculus?')
+        self.assertEqual(named.title, 'Revision plan')
+        self.assertEqual((old.message_count, old.last_message_preview), (3, 'Practice daily.'))
+
+    def test_session_list_is_cursor_paginated(self):
+        from ..pagination import paginate_sessions
+        for i in range(4):
+            ChatSession.objects.create(user=self.user, title=f'Chat {i}')
+        with self.assertNumQueries(1):
+            first, cursor = paginate_sessions(self.user, page_size=3)
+        self.assertEqual(len(first), 3)
+        rest, next_cursor = paginate_sessions(self.user, cursor, page_size=3)
+        self.assertEqual(len(rest), 2)
+        self.assertIsNone(next_cursor)
+        self.assertFalse({s.id for s in first} & {s.id for s in rest})
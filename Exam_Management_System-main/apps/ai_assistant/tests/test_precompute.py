@@ -0,0 +1,126 @@
+import json
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .. import precompute, services
+from ..models import ChatSession, PracticeTest, Prediction
+from .factories import make_user
+from .test_generation import body
+
+
+def at(clock: str) -> datetime:
+    hours, minutes = map(int, clock.split(':'))
+    return timezone.make_aware(datetime(2024, 5, 1, hours, minutes))
+
+
+class SchedulingTestCase(SimpleTestCase):
+    def test_off_peak_windows(self):
+        self.assertTrue(precompute.in_off_peak(at('01:00'), ['01:00-06:00']))
+        self.assertFalse(precompute.in_off_peak(at('06:00'), ['01:00-06:00']))
+        self.assertFalse(precompute.in_off_peak(at('12:30'), ['01:00-06:00']))
+        self.assertTrue(precompute.in_off_peak(at('12:30'), ['01:00-06:00', '12:00-13:00']))
+
+    def test_windows_may_wrap_midnight(self):
+        for clock, inside in (('23:30', True), ('00:15', True), ('05:59', True), ('21:00', False)):
+            self.assertEqual(precompute.in_off_peak(at(clock), ['22:00-06:00']), inside, clock)
+
+    def test_rate_limiter_spaces_out_calls(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = precompute.RateLimiter(60, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(sleeps, [1.0, 1.0, 1.0])
+        self.assertEqual(now[0], 3.0)
+
+    def test_no_exams_app_means_no_jobs(self):
+        self.assertEqual(precompute.upcoming_jobs(), [])
+
+
+class PrecomputeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.job = precompute.Job(self.user.pk, 7, 'Optics', timezone.now() + timedelta(hours=10))
+
+    def test_job_prepares_artifacts_once(self):
+        self.assertEqual(precompute.precompute_job(self.job, practice_questions=5), 'prepared')
+        session = ChatSession.objects.get(user=self.user)
+        self.assertTrue(session.title.startswith('Exam prep: Optics'))
+        self.assertTrue(Prediction.objects.filter(session=session, exam_id=7).exists())
+        self.assertTrue(session.weak_areas.exists())
+        self.assertEqual(session.practice_tests.get().content.count('\n'), 4)
+
+        self.assertEqual(precompute.precompute_job(self.job, practice_questions=5), 'skipped')
+        self.assertEqual(ChatSession.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(PracticeTest.objects.count(), 1)
+
+    def test_generate_practice_serves_the_prepared_test_once(self):
+        precompute.precompute_job(self.job, practice_questions=5)
+        prepared = PracticeTest.objects.get()
+        session = self.user.chat_sessions.create(title='Tonight')
+        self.client.force_login(self.user)
+        url = f'/ai_assistant/chat/{session.id}/generate_practice/'
+
+        def post(num_questions):
+            response = self.client.post(url, json.dumps({'topics': ['Optics'], 'num_questions': num_questions}),
+                                        content_type='application/json')
+            return json.loads(body(response))['practice_test']['content']
+
+        with mock.patch.object(services, 'iter_practice_test', side_effect=AssertionError('generated')):
+            self.assertEqual(post(5), prepared.content)
+        self.assertEqual(session.practice_tests.get().content, prepared.content)
+        prepared.refresh_from_db()
+        self.assertIsNotNone(prepared.served_at)
+
+        # Asked again: generated afresh, and the prepared test stays put so the job is not redone
+        with mock.patch.object(services, 'iter_practice_test', return_value=iter(['fresh'] * 5)) as generate:
+            self.assertEqual(post(5), '\n'.join(['fresh'] * 5))
+        generate.assert_called_once()
+        self.assertEqual(session.practice_tests.count(), 2)
+        self.assertEqual(precompute.precompute_job(self.job, practice_questions=5), 'skipped')
+
+        # A different size is generated as before
+        self.assertEqual(len(post(3).split('\n')), 3)
+        self.assertEqual(PracticeTest.objects.count(), 4)
+
+    def test_run_counts_outcomes_and_stops_when_asked(self):
+        other = precompute.Job(make_user().pk, 8, 'Algebra', self.job.starts_at)
+        missing = precompute.Job(10 ** 6, 9, 'Algebra', self.job.starts_at)
+        reported = []
+        counts = precompute.run([self.job, self.job, missing, other], workers=0, per_minute=0,
+                                report=lambda job, outcome: reported.append(outcome))
+        self.assertEqual(counts, {'prepared': 2, 'skipped': 1, 'failed': 1})
+        self.assertTrue(reported[2].startswith('failed: '))
+
+        counts = precompute.run([other], workers=0, per_minute=0, should_stop=lambda: True)
+        self.assertEqual(counts, {'prepared': 0, 'skipped': 0, 'failed': 0})
+
+    @override_settings(AI_ASSISTANT_PRECOMPUTE={'WORKERS': 0, 'JOBS_PER_MINUTE': 0, 'PRACTICE_QUESTIONS': 3})
+    def test_command_runs_one_pass(self):
+        out = StringIO()
+        with mock.patch.object(precompute, 'upcoming_jobs', return_value=[self.job]):
+            call_command('precompute_exam_prep', '--once', '--ignore-window', stdout=out)
+            self.assertIn('1 prepared, 0 already prepared, 0 failed', out.getvalue())
+            call_command('precompute_exam_prep', '--once', '--ignore-window', '--dry-run', stdout=out)
+        self.assertIn(f'user {self.user.pk}: exam 7 (Optics)', out.getvalue())
+        self.assertEqual(PracticeTest.objects.get().content.count('\n'), 2)
+
+    @override_settings(AI_ASSISTANT_PRECOMPUTE={'OFF_PEAK': []})
+    def test_command_waits_for_the_window(self):
+        out = StringIO()
+        with mock.patch.object(precompute, 'upcoming_jobs') as jobs:
+            call_command('precompute_exam_prep', '--once', stdout=out)
+        jobs.assert_not_called()
+        self.assertIn('Outside the off-peak windows', out.getvalue())
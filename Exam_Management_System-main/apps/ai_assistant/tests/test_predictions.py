@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import predictions
+from ..models import Prediction
+from .factories import make_session, make_user
+
+
+class PredictionCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.session = make_session(self.user)
+        self.client.force_login(self.user)
+        self.url = f'/ai_assistant/chat/{self.session.id}/predict_results/'
+        self.results = []
+        patcher = mock.patch.object(predictions, 'prediction_inputs',
+                                    lambda student_id, exam_id: {'exam_id': exam_id, 'results': list(self.results)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_calls_store_one_prediction(self):
+        first = self.client.get(self.url, {'exam': 4}).json()['prediction']
+        with self.assertNumQueries(3), \
+                mock.patch.object(predictions, '_cache_is_shared', return_value=True):
+            # auth session, user, chat session; no prediction queries
+            second = self.client.get(self.url, {'exam': 4}).json()['prediction']
+        self.assertEqual(first, second)
+        self.assertEqual(Prediction.objects.count(), 1)
+        self.client.get(self.url)  # another exam is another prediction
+        self.assertEqual(Prediction.objects.count(), 2)
+
+    def test_conditional_request_gets_304(self):
+        response = self.client.get(self.url, {'exam': 4})
+        self.assertIn('no-cache', response['Cache-Control'])
+        revalidated = self.client.get(self.url, {'exam': 4}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_new_results_invalidate(self):
+        response = self.client.get(self.url, {'exam': 4})
+        self.results = [[1, 95.0], [2, 90.0]]
+        predictions.invalidate(self.user.id)
+        updated = self.client.get(self.url, {'exam': 4}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated['ETag'], response['ETag'])
+        self.assertGreater(updated.json()['prediction']['predicted_score'],
+                           response.json()['prediction']['predicted_score'])
+        self.assertEqual(Prediction.objects.count(), 2)
+
+    def test_per_process_cache_notices_results_graded_by_other_workers(self):
+        first = predictions.get_prediction(self.session, exam_id=4)
+        self.results = [[1, 95.0]]  # graded in another worker: this process's generation was not bumped
+        with mock.patch.object(predictions, 'baseline_model', wraps=predictions.baseline_model) as model:
+            updated = predictions.get_prediction(self.session, exam_id=4)
+            self.assertEqual(predictions.get_prediction(self.session, exam_id=4), updated)
+        self.assertEqual(model.call_count, 1)
+        self.assertNotEqual(updated['input_hash'], first['input_hash'])
+        with mock.patch.object(predictions, '_cache_is_shared', return_value=True):
+            # A shared cache is trusted: the signal bumped the generation every worker sees
+            self.results = []
+            self.assertEqual(predictions.get_prediction(self.session, exam_id=4), updated)
+
+    def test_expired_cache_reuses_stored_row(self):
+        first = predictions.get_prediction(self.session, exam_id=4)
+        cache.clear()
+        self.assertEqual(predictions.get_prediction(self.session, exam_id=4)['id'], first['id'])
+        self.assertEqual(Prediction.objects.count(), 1)
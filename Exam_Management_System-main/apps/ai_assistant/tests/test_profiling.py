@@ -0,0 +1,72 @@
+import cProfile
+import pstats
+import shutil
+import tempfile
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import TestCase, override_settings
+
+from ..profiling import ProfilingMiddleware, collapsed_stacks, get_store
+from .factories import make_session, make_staff, make_user
+
+
+class ProfilingMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.settings_override = override_settings(AI_ASSISTANT_PROFILING={
+            'ENABLED': True, 'DIRECTORY': self.directory, 'MAX_PROFILES': 2, 'TRACEMALLOC': True,
+        })
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def _get(self, user, **headers):
+        session = make_session(user)
+        self.client.force_login(user)
+        return self.client.get(f'/ai_assistant/chat/{session.id}/', headers=headers)
+
+    def test_disabled_middleware_is_removed(self):
+        with override_settings(AI_ASSISTANT_PROFILING={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+    def test_staff_header_records_profile(self):
+        response = self._get(make_staff(), **{'X-Profile-Request': '1'})
+        profile_id = response['X-Profile-Id']
+        [meta] = get_store().list()
+        self.assertEqual(meta['id'], profile_id)
+        self.assertTrue(meta['has_memory'])
+
+        listing = self.client.get('/admin/ai_assistant/profiles/')
+        self.assertContains(listing, profile_id)
+        download = self.client.get(f'/admin/ai_assistant/profiles/{profile_id}/collapsed/')
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(b';', b''.join(download.streaming_content))
+
+    def test_header_is_ignored_for_students(self):
+        response = self._get(make_user(), **{'X-Profile-Request': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(get_store().list(), [])
+        self.assertEqual(self.client.get('/admin/ai_assistant/profiles/').status_code, 302)
+
+    def test_store_keeps_newest_profiles(self):
+        staff = make_staff()
+        ids = [self._get(staff, **{'X-Profile-Request': '1'})['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual([p['id'] for p in get_store().list()], ids[:0:-1])
+
+
+class CollapsedStacksTestCase(TestCase):
+    def test_stacks_end_in_leaf_function(self):
+        def leaf():
+            return sum(range(20000))
+
+        def root():
+            return leaf()
+
+        profiler = cProfile.Profile()
+        profiler.runcall(root)
+        lines = collapsed_stacks(pstats.Stats(profiler))
+        self.assertTrue(any('root (' in line and 'leaf (' in line for line in lines))
+        for line in lines:
+            stack, value = line.rsplit(' ', 1)
+            self.assertGreater(int(value), 0)
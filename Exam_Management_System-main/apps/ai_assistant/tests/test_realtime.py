@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+
+from ..models import ChatSession
+
+User = get_user_model()
+
+
+class ChatSocketTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='socketuser', password='testpass')
+        self.session = ChatSession.objects.create(user=self.user, title='Live Chat')
+
+    def _communicator(self, user):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from ..routing import websocket_urlpatterns
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/ai_assistant/chat/{self.session.id}/'
+        )
+        communicator.scope['user'] = user
+        return communicator
+
+    async def test_message_is_pushed_to_every_tab(self):
+        sender, other = self._communicator(self.user), self._communicator(self.user)
+        self.assertTrue((await sender.connect())[0])
+        self.assertTrue((await other.connect())[0])
+
+        await sender.send_json_to({'type': 'message', 'message': 'hello', 'client_message_id': 'abc'})
+        events = [await other.receive_json_from(timeout=5) for _ in range(3)]
+
+        self.assertEqual([e['type'] for e in events], ['message', 'token', 'message'])
+        self.assertEqual(events[0]['content'], 'hello')
+        self.assertEqual(events[2]['role'], 'assistant')
+        self.assertEqual(events[2]['in_reply_to'], events[0]['id'])
+        self.assertEqual(events[2]['content'], events[1]['token'])
+        await sender.disconnect()
+        await other.disconnect()
+
+    async def test_other_users_cannot_subscribe(self):
+        from asgiref.sync import sync_to_async
+        stranger = await sync_to_async(User.objects.create_user)(username='stranger', password='testpass')
+        connected, _ = await self._communicator(stranger).connect()
+        self.assertFalse(connected)
+
+    async def test_resent_message_is_answered_once(self):
+        from asgiref.sync import sync_to_async
+        sender = self._communicator(self.user)
+        self.assertTrue((await sender.connect())[0])
+        for _ in range(2):
+            await sender.send_json_to({'type': 'message', 'message': 'hello', 'client_message_id': 'abc'})
+            while (event := await sender.receive_json_from(timeout=5))['type'] != 'message' or event['role'] != 'assistant':
+                pass
+            self.assertEqual(event['client_message_id'], 'abc')
+        roles = await sync_to_async(lambda: list(self.session.messages.values_list('role', flat=True)))()
+        self.assertEqual(roles, ['user', 'assistant'])
+
+        # The same id with other text is refused, as over HTTP
+        await sender.send_json_to({'type': 'message', 'message': 'goodbye', 'client_message_id': 'abc'})
+        event = await sender.receive_json_from(timeout=5)
+        self.assertEqual(event, {'type': 'error', 'client_message_id': 'abc',
+                                 'error': 'client_message_id was already used for another message'})
+        self.assertEqual(await sync_to_async(self.session.messages.count)(), 2)
+        await sender.disconnect()
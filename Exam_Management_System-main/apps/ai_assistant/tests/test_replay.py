@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from .. import replay
+from ..intents import PREPARATION_TIPS
+from .factories import make_messages, make_session, make_staff, make_user
+
+SHOUTING = 'apps.ai_assistant.tests.test_replay.shouting'
+
+
+def shouting(message, is_staff):
+    """The rule engine, changed for questions about exams"""
+    reply = replay.rule_reply(message, is_staff)
+    return reply.upper() if 'exam' in message.lower() else reply
+
+
+class ReplayFileTestCase(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_journal_segments_replay_their_user_messages(self):
+        with open(self.path('segment.jsonl'), 'w') as f:
+            f.write(json.dumps({'id': 7, 'role': 'user', 'content': 'How should I study?'}) + '\n\n')
+            f.write(json.dumps({'id': 8, 'role': 'assistant', 'content': PREPARATION_TIPS}) + '\n')
+        self.assertEqual(list(replay.file_messages(self.path('segment.jsonl'))),
+                         [replay.Message(7, 'How should I study?', False)])
+
+    def test_export_round_trip(self):
+        messages = [replay.Message(1, 'When is my next exam?', False), replay.Message(2, 'export reports', True)]
+        self.assertEqual(replay.export_messages(messages, self.path('chats.jsonl.gz')), 2)
+        self.assertEqual(list(replay.file_messages(self.path('chats.jsonl.gz'))), messages)
+
+    def test_engines_agree_unless_changed(self):
+        messages = [replay.Message(i, text, i % 3 == 0) for i, text in enumerate(
+            ['When is my next exam?', 'How  should I STUDY?', 'hello', 'exam rules', 'attendance'] * 20)]
+        seen = []
+        report = replay.run(messages, ['rule', 'cached', 'stub', SHOUTING], workers=0, chunk_size=7,
+                            on_diff=seen.append, max_diffs=2)
+        summary = report.summary()
+        self.assertEqual(summary['messages'], 100)
+        differ = {engine['engine']: engine['differ'] for engine in summary['engines']}
+        self.assertEqual(differ, {'rule': 0, 'cached': 0, 'stub': 0, SHOUTING: 40})
+        self.assertEqual(len(seen), 40)
+        self.assertEqual(len(report.diffs), 2)
+        self.assertEqual(seen[0]['replies'][SHOUTING], seen[0]['replies']['rule'].upper())
+        self.assertTrue(all(len(values) == 100 for values in report.latencies.values()))
+
+    def test_worker_pool_matches_a_single_process(self):
+        messages = [replay.Message(i, text, False) for i, text in enumerate(['exam tips', 'my marks', 'hi'] * 50)]
+        inline = replay.run(messages, ['rule', SHOUTING], workers=0).summary()
+        pooled = replay.run(messages, ['rule', SHOUTING], workers=2, chunk_size=10).summary()
+        self.assertEqual(pooled['messages'], 150)
+        self.assertEqual([e['differ'] for e in pooled['engines']], [e['differ'] for e in inline['engines']])
+
+    def test_engine_errors_are_counted(self):
+        with self.assertRaises(ValueError):
+            replay.run([], ['rule', 'no.such.engine'], workers=0)
+        with self.assertRaises(ValueError):
+            replay.run([], ['rule', 'rule'], workers=0)
+        failing = [('rule', replay.rule_reply), ('broken', lambda message, is_staff: 1 / 0)]
+        result = replay.replay_chunk([replay.Message(1, 'hi', False)], failing)
+        self.assertEqual(result['errors'], {'broken': 1})
+        self.assertEqual(result['differ'], {'broken': 1})
+
+
+class ReplayCommandTestCase(TestCase):
+    def test_replays_the_database(self):
+        student, staff = make_session(make_user()), make_session(make_staff())
+        make_messages(student, ['When is my next exam?', 'reply', 'hello', 'reply'])
+        make_messages(staff, ['How do I create an exam?', 'reply'])
+        messages = list(replay.db_messages())
+        self.assertEqual([(m.content, m.is_staff) for m in messages],
+                         [('When is my next exam?', False), ('hello', False), ('How do I create an exam?', True)])
+        self.assertEqual(len(list(replay.db_messages(limit=1))), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            export, diffs = os.path.join(directory, 'chats.jsonl'), os.path.join(directory, 'diffs.jsonl')
+            out = StringIO()
+            call_command('replay_chat_log', export=export, stdout=out)
+            self.assertIn('3 messages written', out.getvalue())
+
+            out = StringIO()
+            call_command('replay_chat_log', file=export, engines=['rule', SHOUTING], workers=0, diffs=diffs, stdout=out)
+            output = out.getvalue()
+            self.assertIn('Replayed 3 messages through 2 engines', output)
+            self.assertIn('2 replies (66.67%) differ from rule', output)
+            with open(diffs) as f:
+                self.assertEqual([json.loads(line)['content'] for line in f],
+                                 ['When is my next exam?', 'How do I create an exam?'])
+
+        with self.assertRaises(CommandError):
+            call_command('replay_chat_log', engines=['nonsense'], workers=0, stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'Cannot read /nonexistent.jsonl'):
+            call_command('replay_chat_log', file='/nonexistent.jsonl', workers=0, stdout=StringIO())
@@ -0,0 +1,116 @@
+import random
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .. import rollups
+from ..models import CohortRollup, Prediction, WeakArea
+from .factories import make_session, make_staff, make_user
+
+
+class HistogramTestCase(SimpleTestCase):
+    def test_merged_quantiles_are_within_one_bin(self):
+        rng = random.Random(7)
+        values = [rng.uniform(0, 100) for _ in range(5000)]
+        parts = [rollups.Histogram('prediction.score') for _ in range(4)]
+        for i, value in enumerate(values):
+            parts[i % 4].add(value)
+        merged = rollups.Histogram('prediction.score')
+        for part in parts:
+            merged.merge(part.bins)
+        values.sort()
+        for q in rollups.QUANTILES:
+            self.assertAlmostEqual(merged.quantile(q), values[int(q * len(values)) - 1], delta=1.0)
+
+    def test_quantile_is_clamped_to_observed_range(self):
+        histogram = rollups.Histogram('weak_area.severity')
+        for _ in range(3):
+            histogram.add(3)
+        self.assertEqual(histogram.quantile(0.5, 3, 3), 3)
+        self.assertIsNone(rollups.Histogram('weak_area.severity').quantile(0.5))
+
+
+class CohortRollupTestCase(TestCase):
+    def setUp(self):
+        self.alice = make_session(make_user())
+        self.bob = make_session(make_user())
+        cohorts = {self.alice.user_id: ('CSE', 3), self.bob.user_id: ('ECE', 5)}
+        patcher = mock.patch.object(rollups, 'cohorts_for_users',
+                                    lambda ids: {i: cohorts[i] for i in ids if i in cohorts})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_data(self):
+        for score in (40, 60, 80):
+            Prediction.objects.create(session=self.alice, exam_id=7, predicted_score=score, confidence=0.5)
+        Prediction.objects.create(session=self.bob, exam_id=7, predicted_score=90, confidence=0.9)
+        WeakArea.objects.create(session=self.alice, topic='Algebra', severity=4)
+        WeakArea.objects.create(session=self.bob, topic='Algebra', severity=2)
+        WeakArea.objects.create(session=self.bob, topic='Grammar', severity=5)
+
+    def test_writes_update_rollups_incrementally(self):
+        self.write_data()
+        today = timezone.localdate()
+        summary = rollups.summarize('prediction.score', today, today, group_by='cohort')
+        self.assertEqual((summary['count'], summary['mean'], summary['min'], summary['max']), (4, 67.5, 40, 90))
+        self.assertEqual([(g['department'], g['semester'], g['count']) for g in summary['groups']],
+                         [('CSE', 3, 3), ('ECE', 5, 1)])
+        algebra = rollups.summarize('weak_area.severity', today, today, topic='Algebra')
+        self.assertEqual((algebra['count'], algebra['mean']), (2, 3.0))
+
+    def test_concurrent_folds_are_not_lost(self):
+        key = ('prediction.score', timezone.localdate(), 'CSE', 3, 7, '')
+        rollups.apply([(key, 50)])
+        interleaved = []
+
+        class Racing(rollups.Histogram):
+            # Another worker folds its value between this one's read and its write
+            def __init__(self, *args):
+                super().__init__(*args)
+                if not interleaved:
+                    interleaved.append(True)
+                    rollups._fold(key, [10.0])
+
+        with mock.patch.object(rollups, 'Histogram', Racing):
+            rollups.apply([(key, 95), (key, 70)])
+        row = CohortRollup.objects.get()
+        self.assertEqual((row.count, row.total, row.minimum, row.maximum), (4, 225.0, 10.0, 95.0))
+        self.assertEqual(sum(row.histogram), 4)
+
+    def test_rebuild_matches_incremental(self):
+        self.write_data()
+        incremental = sorted(CohortRollup.objects.values_list(*rollups.KEY_FIELDS, 'count', 'total', 'histogram'))
+        call_command('rebuild_rollups', stdout=StringIO())
+        rebuilt = sorted(CohortRollup.objects.values_list(*rollups.KEY_FIELDS, 'count', 'total', 'histogram'))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_summary_cost_does_not_grow_with_data(self):
+        for _ in range(50):
+            Prediction.objects.create(session=self.alice, exam_id=7, predicted_score=50, confidence=0.5)
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            summary = rollups.summarize('prediction.score', today - timedelta(days=29), today, group_by='day')
+        self.assertEqual(summary['count'], 50)
+        self.assertEqual(CohortRollup.objects.filter(metric='prediction.score').count(), 1)
+
+
+class CohortAnalyticsViewTestCase(TestCase):
+    url = '/ai_assistant/analytics/cohorts/'
+
+    def test_staff_get_summary(self):
+        Prediction.objects.create(session=make_session(), exam_id=3, predicted_score=70, confidence=0.8)
+        self.client.force_login(make_staff())
+        data = self.client.get(self.url, {'metric': 'prediction.score', 'exam': 3, 'group_by': 'exam'}).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['groups'], [dict(exam_id=3, count=1, mean=70.0, min=70.0, max=70.0, p50=70.0, p90=70.0, p99=70.0)])
+
+    def test_rejects_students_and_bad_input(self):
+        self.client.force_login(make_user())
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(make_staff())
+        self.assertEqual(self.client.get(self.url, {'metric': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2020-01-01', 'end': '2026-01-01'}).status_code, 400)
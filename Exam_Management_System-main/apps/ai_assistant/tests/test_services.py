@@ -0,0 +1,40 @@
+import json
+
+from django.test import TestCase
+
+from .. import services
+from ..models import PracticeTest
+from .factories import make_conversation, make_session, make_sessions, make_user
+from .stubs import StubLLMMixin
+
+
+class StubbedProviderTestCase(StubLLMMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.session = make_session(self.user)
+        self.client.force_login(self.user)
+
+    def test_send_message_uses_stub(self):
+        response = self.client.post(f'/ai_assistant/send/{self.session.id}/',
+                                    data=json.dumps({'message': 'Explain limits'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['ai_response'], '[stub] Explain limits')
+        self.assertEqual(self.llm.calls, ['Explain limits'])
+
+    def test_practice_test_uses_stub(self):
+        test = services.generate_practice_test(self.session, ['Algebra'], num_questions=2)
+        self.assertTrue(test['content'].startswith('[stub] Create a 2-question practice test'))
+        self.assertEqual(PracticeTest.objects.filter(session=self.session).count(), 1)
+
+
+class BulkFactoryTestCase(TestCase):
+    def test_session_list_with_many_sessions(self):
+        user = make_user()
+        sessions = make_sessions(user, 250)
+        make_conversation(sessions[0], turns=3)
+        self.client.force_login(user)
+        with self.assertNumQueries(3):  # session, user, one page of sessions
+            response = self.client.get('/ai_assistant/sessions/')
+        self.assertContains(response, '6 messages')
+        self.assertIsNotNone(response.context['next_cursor'])
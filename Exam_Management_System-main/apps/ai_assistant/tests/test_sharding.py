@@ -0,0 +1,199 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .. import sharding, writebehind
+from ..models import ChatMessage, ChatSession, Prediction, WeakArea
+from .factories import make_conversation, make_session, make_user
+
+SHARDS = ['chat_0', 'chat_1', 'chat_2']
+SHARDING = {'ENABLED': True, 'SHARDS': SHARDS, 'ID_BLOCK': 10}
+
+
+class HashRingTestCase(SimpleTestCase):
+    def test_users_spread_evenly(self):
+        ring = sharding.HashRing(SHARDS)
+        placed = [ring.node_for(user_id) for user_id in range(10000)]
+        for shard in SHARDS:
+            self.assertGreater(placed.count(shard), 2500, shard)
+
+    def test_a_new_shard_only_takes_users_over(self):
+        before = sharding.HashRing(SHARDS)
+        after = sharding.HashRing(SHARDS + ['chat_3'])
+        moved = [user_id for user_id in range(10000) if before.node_for(user_id) != after.node_for(user_id)]
+        self.assertEqual({after.node_for(user_id) for user_id in moved}, {'chat_3'})
+        self.assertLess(len(moved), 3500)
+
+    def test_off_means_default(self):
+        self.assertEqual(sharding.shard_for_user(7), 'default')
+        self.assertEqual(sharding.databases(), ['default'])
+
+
+@override_settings(AI_ASSISTANT_SHARDING=SHARDING)
+class ShardedChatTestCase(TestCase):
+    """Three SQLite files as shards, next to the default test database"""
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.settings[alias] = connections.configure_settings({
+                'default': connections.settings['default'],
+                alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'{cls.directory}/{alias}.sqlite3'},
+            })[alias]
+        with override_settings(AI_ASSISTANT_SHARDING=SHARDING):
+            call_command('migrate_chat_shards', verbosity=0, stdout=StringIO())
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        sharding.reset()
+        self.user = make_user()
+        self.shard = sharding.shard_for_user(self.user)
+
+    def stored_in(self, model, pk):
+        return [alias for alias in sharding.databases() if model.objects.using(alias).filter(pk=pk).exists()]
+
+    def test_shards_hold_only_chat_tables(self):
+        tables = connections['chat_0'].introspection.table_names()
+        self.assertIn('ai_assistant_chatmessage', tables)
+        self.assertNotIn('ai_assistant_cohortrollup', tables)
+        self.assertNotIn('auth_user', tables)
+
+    def test_related_managers_route_to_the_users_shard(self):
+        session = self.user.chat_sessions.create(title='Sharded')
+        message = session.messages.create(role='user', content='hello')
+        area = session.weak_areas.create(topic='optics')
+        self.assertEqual(self.stored_in(ChatSession, session.id), [self.shard])
+        self.assertEqual(self.stored_in(ChatMessage, message.id), [self.shard])
+        self.assertEqual(self.stored_in(WeakArea, area.id), [self.shard])
+        session = self.user.chat_sessions.get(id=session.id)
+        self.assertEqual((session.message_count, session.last_message_preview), (1, 'hello'))
+        self.assertEqual(session.user, self.user)
+
+    def test_ids_are_unique_across_shards(self):
+        users = [make_user() for _ in range(12)]
+        self.assertEqual(len({sharding.shard_for_user(user) for user in users}), 3)
+        ids = [user.chat_sessions.create().id for user in users for _ in range(3)]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_views_read_and_write_the_users_shard(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/ai_assistant/send/', json.dumps({'message': 'What is an exam?'}),
+                                    content_type='application/json')
+        session_id = response.json()['session_id']
+        self.assertEqual(self.stored_in(ChatSession, session_id), [self.shard])
+        self.assertEqual(self.client.get(f'/ai_assistant/chat/{session_id}/').status_code, 200)
+        response = self.client.get(f'/ai_assistant/api/v1/sessions/{session_id}/messages/')
+        self.assertEqual([m['role'] for m in response.json()['results']], ['user', 'assistant'])
+        response = self.client.get(f'/ai_assistant/api/v1/weak-areas/?session={session_id}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_predictions_are_stored_with_the_session(self):
+        session = self.user.chat_sessions.create()
+        self.client.force_login(self.user)
+        response = self.client.get(f'/ai_assistant/chat/{session.id}/predict_results/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Prediction.objects.using(self.shard).filter(session_id=session.id).exists())
+
+    def test_rebalance_moves_unsharded_chats_and_keeps_ids(self):
+        with override_settings(AI_ASSISTANT_SHARDING={'ENABLED': False}):
+            session = make_session(self.user)
+            messages = make_conversation(session, turns=3)
+            WeakArea.objects.create(session=session, topic='algebra')
+        self.assertEqual(sharding.misplaced_users('default'), [self.user.pk])
+
+        out = StringIO()
+        call_command('rebalance_chat_shards', stdout=out)
+        self.assertIn('1 users moved (8 rows)', out.getvalue())
+        self.assertEqual(self.stored_in(ChatSession, session.id), [self.shard])
+        moved = self.user.chat_sessions.get(id=session.id)
+        self.assertEqual([m.id for m in moved.messages.all()], [m.id for m in messages])
+        self.assertEqual(moved.message_count, 6)
+        self.assertEqual(sharding.misplaced_users('default'), [])
+
+        # Moving again (an interrupted run repeated) replaces the copies
+        sharding.move_user(self.user.pk, self.shard, 'chat_0' if self.shard != 'chat_0' else 'chat_1')
+        sharding.move_user(self.user.pk, 'chat_0' if self.shard != 'chat_0' else 'chat_1', self.shard)
+        self.assertEqual(ChatMessage.objects.using(self.shard).filter(session_id=session.id).count(), 6)
+
+    def test_purge_fans_out_to_every_shard(self):
+        users = [make_user() for _ in range(6)]
+        sessions = [user.chat_sessions.create() for user in users]
+        kept = sessions[0]
+        kept.messages.create(role='user', content='hi')
+        for session in sessions:
+            ChatSession.objects.using(session._state.db).filter(id=session.id).update(
+                updated_at=timezone.now() - timedelta(days=2))
+        call_command('purge_empty_chat_sessions', stdout=StringIO())
+        self.assertEqual(sharding.count(ChatSession.objects.all()), 1)
+        self.assertEqual(sharding.find(ChatSession.objects.all(), kept.id), kept)
+
+    def test_deleting_a_user_deletes_their_sharded_chats(self):
+        session = self.user.chat_sessions.create()
+        session.messages.create(role='user', content='hi')
+        self.user.delete()
+        self.assertEqual(self.stored_in(ChatSession, session.id), [])
+        self.assertFalse(ChatMessage.objects.using(self.shard).exists())
+
+    def test_write_behind_stores_each_message_in_its_shard(self):
+        buffer = writebehind.MessageBuffer(max_batch=1000, flush_seconds=3600, id_block=10)
+        self.addCleanup(buffer.close)
+        users = [make_user() for _ in range(6)]
+        sessions = [user.chat_sessions.create() for user in users]
+        sent = [buffer.add(session, 'user', f'hello {i}') for i, session in enumerate(sessions)]
+        self.assertEqual(buffer.flush(), len(sent))
+        for session, message in zip(sessions, sent):
+            self.assertEqual(self.stored_in(ChatMessage, message.id), [session._state.db])
+            self.assertEqual(self.user.chat_sessions.model.objects.using(session._state.db)
+                             .get(id=session.id).message_count, 1)
+
+    def test_admin_lists_a_shard_and_finds_rows_anywhere(self):
+        session = self.user.chat_sessions.create(title='In a shard')
+        staff = make_user(is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.get(f'/admin/ai_assistant/chatsession/?shard={self.shard}')
+        self.assertContains(response, 'In a shard')
+        response = self.client.get(f'/admin/ai_assistant/chatmessage/?user={self.user.username}')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/admin/ai_assistant/chatsession/{session.id}/change/')
+        self.assertContains(response, 'In a shard')
+
+    def test_admin_loads_the_users_of_a_shard_page_at_once(self):
+        staff = make_user(is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+
+        def user_queries(url):
+            with CaptureQueriesContext(connections['default']) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(ctx.captured_queries)
+
+        def chat():
+            session = self.user.chat_sessions.create()
+            session.messages.create(role='user', content='hi')
+
+        chat()
+        urls = [f'/admin/ai_assistant/{model}/?shard={self.shard}' for model in ('chatsession', 'chatmessage')]
+        few = [user_queries(url) for url in urls]
+        for _ in range(10):
+            chat()
+        self.assertEqual([user_queries(url) for url in urls], few)
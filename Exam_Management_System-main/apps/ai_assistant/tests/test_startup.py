@@ -0,0 +1,78 @@
+import os
+import runpy
+import subprocess
+import sys
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from .. import intents
+from ..importtime import parse_importtime, total_us
+from ..warmup import warm_up
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _weakrefset
+import time:       300 |        420 |   abc
+import time:        80 |        500 | django
+"""
+
+
+class ImportTimeTestCase(SimpleTestCase):
+    def test_parse_importtime(self):
+        records = parse_importtime(SAMPLE)
+        self.assertEqual([r.module for r in records], ['_weakrefset', 'abc', 'django'])
+        self.assertEqual([r.depth for r in records], [2, 1, 0])
+        self.assertEqual(total_us(records), 500)
+
+    def test_cold_start_does_not_import_provider_sdk(self):
+        # Regression check: the OpenAI SDK must stay a lazy import
+        out = StringIO()
+        call_command('profile_imports', 'apps.ai_assistant.views', 'apps.ai_assistant.services',
+                     forbid=['openai'], top=5, stdout=out)
+        self.assertIn('within limits', out.getvalue())
+
+    def test_rule_engine_runs_without_django_settings(self):
+        # Regression check: the scripts/quick_*_test.py scripts use the rule engine without django.setup()
+        env = {k: v for k, v in os.environ.items() if k != 'DJANGO_SETTINGS_MODULE'}
+        code = ("from apps.ai_assistant.utils import get_ai_response, get_local_ai_response; "
+                "print(get_local_ai_response('exam tips', None) == get_ai_response('exam tips', None))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.stdout.strip(), 'True', result.stderr)
+
+    def test_budget_is_enforced(self):
+        with self.assertRaises(CommandError):
+            call_command('profile_imports', 'apps.ai_assistant.views', budget_ms=0.001, stdout=StringIO())
+
+
+class WarmUpTestCase(SimpleTestCase):
+    def test_warm_up_compiles_intents(self):
+        intents.compiled_rules.cache_clear()
+        timings = warm_up()
+        self.assertEqual(list(timings)[:4], ['intents', 'models', 'urls', 'templates'])
+        self.assertEqual(intents.compiled_rules.cache_info().currsize, 2)
+
+
+class ServingConfigTestCase(SimpleTestCase):
+    path = str(Path(settings.BASE_DIR) / 'gunicorn.conf.py')
+
+    def load(self, **env):
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(self.path)
+
+    def test_defaults_preload_threaded_wsgi(self):
+        config = self.load()
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertEqual(config['wsgi_app'], 'exam_system.wsgi:application')
+
+    def test_tuning_from_environment(self):
+        config = self.load(WEB_CONCURRENCY='3', GUNICORN_THREADS='8', GUNICORN_KEEPALIVE='15',
+                           GUNICORN_WORKER_CLASS='uvicorn.workers.UvicornWorker')
+        self.assertEqual((config['workers'], config['threads'], config['keepalive']), (3, 8, 15))
+        self.assertEqual(config['wsgi_app'], 'exam_system.asgi:application')
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+
+from ..models import ChatSession, ChatMessage
+
+User = get_user_model()
+
+
+class ChatViewTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.session = ChatSession.objects.create(user=self.user, title='Test Chat')
+
+    def test_chat_view_requires_login(self):
+        response = self.client.get(f'/ai_assistant/chat/{self.session.id}/')
+        self.assertEqual(response.status_code, 302)  # Redirect to login
+
+    def test_chat_view_authenticated(self):
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(f'/ai_assistant/chat/{self.session.id}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class DraftSessionTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='draftuser', password='testpass')
+        self.client.login(username='draftuser', password='testpass')
+
+    def test_visiting_chat_does_not_create_session(self):
+        response = self.client.get('/ai_assistant/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/ai_assistant/new/')
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ChatSession.objects.filter(user=self.user).exists())
+
+    def test_first_message_creates_session(self):
+        response = self.client.post('/ai_assistant/send/', data='{"message": "hello"}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        session = ChatSession.objects.get(user=self.user)
+        self.assertEqual(response.json()['session_id'], session.id)
+        self.assertEqual(session.messages.count(), 2)
+
+    def test_empty_session_is_reused(self):
+        empty = ChatSession.objects.create(user=self.user, title='Exam Assistant Chat')
+        response = self.client.get('/ai_assistant/')
+        self.assertRedirects(response, f'/ai_assistant/chat/{empty.id}/')
+        self.assertEqual(ChatSession.objects.filter(user=self.user).count(), 1)
+
+    def test_purge_command_keeps_sessions_with_messages(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        empty = ChatSession.objects.create(user=self.user, title='Exam Assistant Chat')
+        used = ChatSession.objects.create(user=self.user, title='Exam Assistant Chat')
+        ChatMessage.objects.create(session=used, role='user', content='hi')
+        old = timezone.now() - timedelta(days=2)
+        ChatSession.objects.filter(id__in=[empty.id, used.id]).update(updated_at=old)
+        call_command('purge_empty_chat_sessions', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(ChatSession.objects.values_list('id', flat=True)), [used.id])
+
+
+class ChatFragmentCacheTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='cacheuser', password='testpass')
+        self.client.login(username='cacheuser', password='testpass')
+        self.session = ChatSession.objects.create(user=self.user, title='Cached Chat')
+        self.first = ChatMessage.objects.create(session=self.session, role='user', content='original text')
+
+    def test_message_list_is_cached_until_a_new_message(self):
+        url = f'/ai_assistant/chat/{self.session.id}/'
+        self.assertContains(self.client.get(url), 'original text')
+        ChatMessage.objects.filter(id=self.first.id).update(content='edited text')
+        self.assertContains(self.client.get(url), 'original text')
+        ChatMessage.objects.create(session=self.session, role='assistant', content='a reply')
+        response = self.client.get(url)
+        self.assertContains(response, 'edited text')
+        self.assertContains(response, 'a reply')
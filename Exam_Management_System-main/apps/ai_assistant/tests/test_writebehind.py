@@ -0,0 +1,129 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from .. import writebehind
+from ..models import ChatMessage, ChatSession
+from .factories import make_messages, make_session, make_user
+
+
+class MessageBufferTestCase(TestCase):
+    def setUp(self):
+        self.session = make_session(make_user())
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir, True)
+        # Flushed explicitly from the test thread, inside the test transaction
+        self.buffer = writebehind.MessageBuffer(self.journal_dir, max_batch=1000, flush_seconds=3600, id_block=10)
+        self.addCleanup(self.buffer.close)
+
+    def test_messages_are_numbered_then_stored_in_one_flush(self):
+        sent = [self.buffer.add(self.session, role, text)
+                for role, text in (('user', 'hello'), ('assistant', 'hi!'), ('user', 'bye'))]
+        self.assertEqual(len({m.id for m in sent}), 3)
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(self.buffer.pending(self.session.id), sent)
+
+        with self.assertNumQueries(5):  # live sessions, savepoint, insert, counters, release
+            self.assertEqual(self.buffer.flush(), 3)
+        stored = list(self.session.messages.all())
+        self.assertEqual([(m.id, m.content, m.created_at) for m in stored],
+                         [(m.id, m.content, m.created_at) for m in sent])
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.message_count, self.session.last_message_preview), (3, 'bye'))
+        self.assertEqual(self.buffer.pending(self.session.id), [])
+        self.assertEqual(list(writebehind.Path(self.journal_dir).iterdir()), [])
+
+    def test_reserved_ids_are_never_reused_by_direct_inserts(self):
+        buffered = self.buffer.add(self.session, 'user', 'buffered')
+        direct = ChatMessage.objects.create(session=self.session, role='assistant', content='direct')
+        self.assertGreater(direct.id, buffered.id + 9)
+        self.buffer.flush()
+        self.assertEqual(self.session.messages.count(), 2)
+
+    def test_messages_of_deleted_sessions_are_dropped(self):
+        other = make_session(self.session.user)
+        self.buffer.add(other, 'user', 'gone')
+        self.buffer.add(self.session, 'user', 'kept')
+        other.delete()
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_reads_merge_buffered_and_stored_messages(self):
+        make_messages(self.session, ['stored question', 'stored answer'])
+        with mock.patch.object(writebehind, '_buffer', (writebehind.os.getpid(), self.buffer)):
+            self.buffer.add(self.session, 'user', 'buffered question')
+            contents = [m.content for m in writebehind.session_messages(self.session)]
+            recent = [m.content for m in writebehind.recent_messages(self.session, 2)]
+        self.assertEqual(contents, ['stored question', 'stored answer', 'buffered question'])
+        self.assertEqual(recent, ['stored answer', 'buffered question'])
+
+    def test_abandoned_journal_is_replayed_once(self):
+        self.buffer.add(self.session, 'user', 'one')
+        self.buffer.add(self.session, 'assistant', 'two')
+        # A crash: the process's journal lock goes away, its buffer with it
+        self.buffer.journal.rotate()[0].close()
+        self.buffer._pending = []
+
+        self.assertEqual(writebehind.replay(self.journal_dir), (1, 2))
+        self.assertEqual([m.content for m in self.session.messages.all()], ['one', 'two'])
+        self.assertEqual(ChatSession.objects.get(id=self.session.id).message_count, 2)
+        self.assertEqual(writebehind.replay(self.journal_dir), (0, 0))
+
+    def test_replay_skips_stored_rows_and_torn_lines(self):
+        stored = make_messages(self.session, ['already stored'])[0]
+        entry = {'id': stored.id + 100, 'session_id': self.session.id, 'role': 'user',
+                 'content': 'lost', 'created_at': stored.created_at.isoformat()}
+        with open(f'{self.journal_dir}/messages-1-1.jsonl', 'w') as f:
+            f.write(writebehind._entry(stored) + json.dumps(entry) + '\n{"id": 9')
+        self.assertEqual(writebehind.replay(self.journal_dir), (1, 1))
+        self.assertEqual(self.session.messages.count(), 2)
+
+    def test_held_segments_are_not_replayed(self):
+        self.buffer.add(self.session, 'user', 'in flight')
+        self.assertEqual(writebehind.replay(self.journal_dir), (0, 0))
+        self.assertFalse(ChatMessage.objects.exists())
+
+
+class WriteBehindViewTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.session = make_session(self.user)
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(writebehind, '_buffer', (None, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(AI_ASSISTANT_WRITE_BEHIND={'ENABLED': True, 'FLUSH_SECONDS': 3600, 'MAX_BATCH': 1000})
+    def test_send_message_replies_before_storing(self):
+        response = self.client.post(f'/ai_assistant/send/{self.session.id}/',
+                                    json.dumps({'message': 'How do I prepare?'}), content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(ChatMessage.objects.exists())
+
+        page = self.client.get(f'/ai_assistant/chat/{self.session.id}/')
+        self.assertContains(page, 'How do I prepare?')
+
+        buffer = writebehind.get_buffer()
+        buffer.close()
+        self.assertEqual(list(self.session.messages.values_list('role', flat=True)), ['user', 'assistant'])
+        self.assertEqual(buffer.stats['stored'], 2)
+
+    @override_settings(AI_ASSISTANT_WRITE_BEHIND={'ENABLED': True, 'FLUSH_SECONDS': 3600, 'MAX_BATCH': 1000})
+    def test_resends_find_the_buffered_reply(self):
+        url = f'/ai_assistant/send/{self.session.id}/'
+        body = json.dumps({'message': 'How do I prepare?', 'client_message_id': 'c-1'})
+        first = self.client.post(url, body, content_type='application/json').json()
+        # The client id is checked on insert, so that message is not buffered
+        user_msg = ChatMessage.objects.get()
+        self.assertEqual(user_msg.client_message_id, 'c-1')
+
+        again = self.client.post(url, body, content_type='application/json').json()
+        self.assertEqual((again['ai_response'], again['duplicate']), (first['ai_response'], True))
+
+        reply = writebehind.get_buffer().pending(self.session.id)[0]
+        restored = writebehind._message(writebehind._entry(reply))
+        self.assertEqual(restored.in_reply_to_id, user_msg.id)
+        writebehind.get_buffer().close()
+        self.assertEqual(ChatMessage.objects.get(role='assistant').in_reply_to_id, user_msg.id)
@@ -1,12 +1,21 @@
-from django.urls import path
+from django.contrib import admin
+from django.urls import include, path
 from . import views
 
 app_name = 'ai_assistant'
 
+# Staff-only request profiles (see profiling.py), served by the admin site
+# under /admin/ai_assistant/ (exam_system/urls.py)
+admin_urlpatterns = ([
+    path('profiles/', admin.site.admin_view(views.profile_list), name='profile_list'),
+    path('profiles/<str:profile_id>/<str:kind>/', admin.site.admin_view(views.profile_download), name='profile_download'),
+], 'ai_assistant_admin')
+
 urlpatterns = [
     path('', views.chat_view, name='chat_list'),
     path('chat/<int:session_id>/', views.chat_view, name='chat'),
     path('new/', views.new_chat, name='new_chat'),
+    path('send/', views.send_message, name='send_draft_message'),
     path('send/<int:session_id>/', views.send_message, name='send_message'),
     path('delete/<int:session_id>/', views.delete_session, name='delete_session'),
     path('sessions/', views.chat_list, name='chat_sessions'),
@@ -14,4 +23,12 @@ urlpatterns = [
     path('chat/<int:session_id>/generate_questions/', views.generate_questions_view, name='generate_questions'),
     path('chat/<int:session_id>/predict_results/', views.predict_results_view, name='predict_results'),
     path('chat/<int:session_id>/generate_practice/', views.generate_practice_view, name='generate_practice'),
+    # Versioned REST API (see api/views.py)
+    path('api/v1/', include(('apps.ai_assistant.api.urls', 'api-v1'))),
+    # Staff-only cohort analytics (see rollups.py)
+    path('analytics/cohorts/', views.cohort_analytics, name='cohort_analytics'),
+    # Staff-only counts of replies by intent and source (see intentstats.py)
+    path('analytics/intents/', views.intent_report, name='intent_report'),
+    # Staff-only LLM latency SLO counters (see hedging.py)
+    path('metrics/llm/', views.llm_metrics, name='llm_metrics'),
 ]
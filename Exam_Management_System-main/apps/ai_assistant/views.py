@@ -1,38 +1,81 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib import admin
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from datetime import date, datetime, timedelta
+import itertools
 import json
 import os
-from .models import ChatSession, ChatMessage
 from .forms import ChatMessageForm
 from .utils import get_ai_response
-from . import services
+from .pagination import SESSION_LIST_FIELDS, paginate_sessions
+from .realtime import broadcast_message
+from .profiling import get_store
+from . import hedging, idempotency, intentstats, precompute, predictions, rollups, services, sharding, streaming, writebehind
+
+SIDEBAR_SESSION_LIMIT = 10
+SESSION_PAGE_SIZE = 20
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_MAX_DAYS = 366
+INTENT_REPORT_DEFAULT_HOURS = 24
+DEFAULT_GENERATION_LIMIT = 100
+
+
+def _latest_empty_session(user):
+    """Most recent session the user opened but never wrote in, if any"""
+    return (
+        user.chat_sessions.filter(message_count=0)
+        .order_by('-updated_at', '-id')
+        .only('id')
+        .first()
+    )
 
 
 @login_required
 def chat_view(request, session_id=None):
     """Main chat interface"""
     if session_id:
-        session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+        session = get_object_or_404(request.user.chat_sessions, id=session_id)
     else:
-        # Create new session
-        session = ChatSession.objects.create(
-            user=request.user,
-            title="Exam Assistant Chat"
-        )
-        return redirect('ai_assistant:chat', session_id=session.id)
-
-    messages = session.messages.all()
+        # Reuse an empty session if the user has one; otherwise render a draft
+        # chat with no database row until the first message is sent.
+        empty = _latest_empty_session(request.user)
+        if empty is not None:
+            return redirect('ai_assistant:chat', session_id=empty.id)
+        session = None
+
+    # Querysets stay lazy: they are only evaluated when the cached fragments
+    # in chat.html miss, which the cheap version keys below decide.
+    chat_messages = writebehind.session_messages(session) if session else []
+    last_message_id = (
+        session.messages.order_by('-id').values_list('id', flat=True).first() if session else None
+    )
+    if session and writebehind.enabled():
+        # Buffered messages are numbered out of order and not stored yet
+        last_message_id = f'{last_message_id}.{session.message_count}.{len(writebehind.pending_messages(session.id))}'
+    user_sessions = request.user.chat_sessions.only(*SESSION_LIST_FIELDS)[:SIDEBAR_SESSION_LIMIT]
+    sidebar_state = request.user.chat_sessions.aggregate(newest=Max('updated_at'), total=Count('id'))
+    sidebar_stamp = f"{sidebar_state['newest'].timestamp() if sidebar_state['newest'] else 0}-{sidebar_state['total']}"
     form = ChatMessageForm()
-    user_sessions = request.user.chat_sessions.all()[:10]
 
     context = {
         'session': session,
-        'messages': messages,
+        # Not 'messages': that name belongs to django.contrib.messages in base.html
+        'chat_messages': chat_messages,
+        'last_message_id': last_message_id,
         'form': form,
         'user_sessions': user_sessions,
+        'sidebar_stamp': sidebar_stamp,
+        'fragment_cache_seconds': getattr(settings, 'AI_ASSISTANT_FRAGMENT_CACHE_SECONDS', 300),
     }
 
     return render(request, 'ai_assistant/chat.html', context)
@@ -40,39 +83,64 @@ def chat_view(request, session_id=None):
 
 @login_required
 @require_http_methods(["POST"])
-def send_message(request, session_id):
-    """Handle message sending via AJAX"""
-    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+def send_message(request, session_id=None):
+    """Handle message sending via AJAX.
+
+    Without a session_id the chat is still a draft: the session row is
+    created together with the first user message. A message resent with
+    the same client_message_id is answered with the reply to the first
+    copy, waiting for it if it is still being generated (idempotency.py).
+    """
+    if session_id:
+        session = get_object_or_404(request.user.chat_sessions, id=session_id)
+    else:
+        session = None
 
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '').strip()
+        client_message_id = data.get('client_message_id')
 
         if not user_message:
             return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+        if client_message_id is not None and not idempotency.valid_client_id(client_message_id):
+            return JsonResponse({'error': f'client_message_id must be a string of at most '
+                                          f'{idempotency.MAX_CLIENT_ID_LENGTH} characters'}, status=400)
 
-        # Save user message
-        user_msg = ChatMessage.objects.create(
-            session=session,
-            role='user',
-            content=user_message
-        )
+        # Save user message (and the draft session it belongs to). Outside a
+        # transaction it may only be buffered (writebehind.py).
+        if client_message_id:
+            user_msg, created = idempotency.claim(request.user, session, user_message, client_message_id)
+            session = user_msg.session
+            if not created:
+                if user_msg.content != user_message:
+                    return JsonResponse({'error': 'client_message_id was already used for another message'},
+                                        status=409)
+                ai_msg = idempotency.wait_for_reply(user_msg)
+                if ai_msg is not None:
+                    return _sent_response(session, user_msg, ai_msg, duplicate=True)
+                if not idempotency.is_stale(user_msg):
+                    return JsonResponse({'error': 'The reply to this message is still being written, try again',
+                                         'pending': True}, status=202)
+                # Whoever was answering it gave up: answer it here
+        elif session is None:
+            with transaction.atomic(using=sharding.shard_for_user(request.user)):
+                session = request.user.chat_sessions.create(title="Exam Assistant Chat")
+                user_msg = writebehind.create_message(session, 'user', user_message)
+        else:
+            user_msg = writebehind.create_message(session, 'user', user_message)
+
+        # Let other open tabs on this session show the message too
+        broadcast_message(user_msg, client_message_id)
 
         # Get AI response
         ai_response_text = get_ai_response(user_message, session)
 
         # Save AI response
-        ai_msg = ChatMessage.objects.create(
-            session=session,
-            role='assistant',
-            content=ai_response_text
-        )
-
-        return JsonResponse({
-            'user_message': user_msg.content,
-            'ai_response': ai_msg.content,
-            'success': True
-        })
+        ai_msg = writebehind.create_message(session, 'assistant', ai_response_text, in_reply_to=user_msg)
+        broadcast_message(ai_msg, client_message_id, in_reply_to=user_msg.id)
+
+        return _sent_response(session, user_msg, ai_msg)
 
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
@@ -80,69 +148,239 @@ def send_message(request, session_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _sent_response(session, user_msg, ai_msg, duplicate: bool = False):
+    return JsonResponse({
+        'user_message': user_msg.content,
+        'ai_response': ai_msg.content,
+        'session_id': session.id,
+        'session_url': reverse('ai_assistant:chat', args=[session.id]),
+        'send_url': reverse('ai_assistant:send_message', args=[session.id]),
+        'duplicate': duplicate,
+        'success': True
+    })
+
+
 @login_required
 def new_chat(request):
-    """Create a new chat session"""
-    session = ChatSession.objects.create(
-        user=request.user,
-        title="Exam Assistant Chat"
-    )
-    return redirect('ai_assistant:chat', session_id=session.id)
+    """Start a new chat; the session row is only written on the first message"""
+    return redirect('ai_assistant:chat_list')
 
 
 @login_required
 @require_http_methods(["POST"])
 def delete_session(request, session_id):
     """Delete a chat session"""
-    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    session = get_object_or_404(request.user.chat_sessions, id=session_id)
     session.delete()
     return redirect('ai_assistant:chat_list')
 
 
 @login_required
 def chat_list(request):
-    """List all chat sessions for the user"""
-    sessions = request.user.chat_sessions.all()
-    context = {'sessions': sessions}
+    """List the user's chat sessions, newest first, one cursor page at a time"""
+    sessions, next_cursor = paginate_sessions(
+        request.user, request.GET.get('cursor'), SESSION_PAGE_SIZE
+    )
+    context = {'sessions': sessions, 'next_cursor': next_cursor}
     return render(request, 'ai_assistant/chat_list.html', context)
 
 
+def _bounded_count(value, setting: str, name: str) -> int:
+    """A requested item count, checked against its server-side cap; raises ValueError"""
+    limit = getattr(settings, setting, DEFAULT_GENERATION_LIMIT)
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+    if not 1 <= count <= limit:
+        raise ValueError(f'{name} must be between 1 and {limit}')
+    return count
+
+
 @login_required
 @require_http_methods(["POST"])
 def generate_questions_view(request, session_id):
-    """Generate questions for a subject via AI service"""
-    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    """
+    Generate questions for a subject via AI service.
+
+    The response is streamed as the questions are generated: the usual
+    {"questions": [...]} JSON, or one question per line with
+    Accept: application/x-ndjson. count is capped by
+    AI_ASSISTANT_MAX_GENERATED_QUESTIONS.
+    """
+    session = get_object_or_404(request.user.chat_sessions, id=session_id)
     try:
         data = json.loads(request.body)
         subject = data.get('subject', 'General')
         difficulty = data.get('difficulty', 'medium')
-        count = int(data.get('count', 5))
-        questions = services.generate_questions(subject, difficulty, count)
-        return JsonResponse({'questions': questions})
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        count = _bounded_count(data.get('count', 5), 'AI_ASSISTANT_MAX_GENERATED_QUESTIONS', 'count')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    questions = services.iter_questions(subject, difficulty, count)
+    if streaming.wants_ndjson(request):
+        return streaming.streaming_response(request, streaming.ndjson_lines(questions), streaming.NDJSON)
+    return streaming.streaming_response(request, streaming.json_list('questions', questions))
 
 
 @login_required
+@require_http_methods(["GET"])
 def predict_results_view(request, session_id):
-    """Return a mock ML prediction for a student/exam"""
-    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    """
+    Predicted result for the student (and optional ?exam=) of a session.
+
+    Repeat calls are served from the prediction cache and carry an ETag, so
+    polling clients can revalidate with If-None-Match and get a 304.
+    """
+    session = get_object_or_404(request.user.chat_sessions, id=session_id)
     try:
-        res = services.predict_results(session=session)
-        return JsonResponse({'prediction': res})
+        exam_id = request.GET.get('exam')
+        res = services.predict_results(session=session, exam_id=int(exam_id) if exam_id else None)
+    except ValueError:
+        return JsonResponse({'error': 'exam must be an integer'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    etag = predictions.etag(res)
+    response = get_conditional_response(request, etag=etag) or JsonResponse({'prediction': res})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
 @require_http_methods(["POST"])
 def generate_practice_view(request, session_id):
-    session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    """
+    Generate and save a practice test, streaming it as it is written.
+
+    The body is the usual {"practice_test": {"title", "content"}} JSON, or
+    with Accept: application/x-ndjson a {"title"} line followed by one
+    {"content"} line per piece. num_questions is capped by
+    AI_ASSISTANT_MAX_PRACTICE_QUESTIONS; the test is saved in chunks. A
+    test prepared before the student's exam (precompute.py) is served once,
+    copied into this session.
+    """
+    session = get_object_or_404(request.user.chat_sessions, id=session_id)
     try:
         data = json.loads(request.body)
-        topics = data.get('topics', [])
-        num_questions = int(data.get('num_questions', 10))
-        test = services.generate_practice_test(session, topics, num_questions)
-        return JsonResponse({'practice_test': test})
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        topics = [str(topic) for topic in data.get('topics', []) if str(topic).strip()]
+        num_questions = _bounded_count(data.get('num_questions', 10), 'AI_ASSISTANT_MAX_PRACTICE_QUESTIONS',
+                                       'num_questions')
+        if not topics:
+            raise ValueError('topics must list at least one topic')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    title = services.practice_test_title(topics)
+    prepared = precompute.take_prepared_practice_test(request.user, session, topics, num_questions)
+    if prepared is not None:
+        # Made ahead of the student's exam by `manage.py precompute_exam_prep`, now saved in this session
+        pieces = iter(prepared.content.split('\n'))
+    else:
+        pieces = services.save_practice_test(
+            session, title, services.iter_practice_test(topics, num_questions, user=request.user))
+    if streaming.wants_ndjson(request):
+        lines = itertools.chain([{'title': title}], ({'content': piece} for piece in pieces))
+        return streaming.streaming_response(request, streaming.ndjson_lines(lines), streaming.NDJSON)
+    return streaming.streaming_response(request, streaming.json_text('practice_test', {'title': title}, 'content', pieces))
+
+
+@staff_member_required
+def profile_list(request):
+    """Stored request profiles, newest first (staff only)"""
+    context = dict(admin.site.each_context(request), title='Request profiles', profiles=get_store().list())
+    return render(request, 'ai_assistant/profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, profile_id, kind):
+    """Download one file of a stored profile: prof, collapsed, mem or meta"""
+    path = get_store().path(profile_id, kind)
+    if path is None or not path.exists():
+        raise Http404('No such profile')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
+@login_required
+@require_http_methods(["GET"])
+def cohort_analytics(request):
+    """
+    Aggregate predictions / weak areas by cohort, topic and day (staff only).
+
+    Query: metric, start, end (ISO dates), department, semester, exam, topic
+    and group_by (day, cohort, exam or topic). Served from CohortRollup.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    params = request.GET
+    metric = params.get('metric', 'prediction.score')
+    group_by = params.get('group_by') or None
+    if metric not in rollups.METRICS:
+        return JsonResponse({'error': f'Unknown metric, expected one of {sorted(rollups.METRICS)}'}, status=400)
+    if group_by and group_by not in rollups.GROUPS:
+        return JsonResponse({'error': f'Unknown group_by, expected one of {sorted(rollups.GROUPS)}'}, status=400)
+    try:
+        end = date.fromisoformat(params['end']) if params.get('end') else timezone.localdate()
+        start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+        filters = {}
+        if params.get('department'):
+            filters['department'] = params['department']
+        if params.get('semester'):
+            filters['semester'] = int(params['semester'])
+        if params.get('exam'):
+            filters['exam_id'] = int(params['exam'])
+        if params.get('topic'):
+            filters['topic'] = params['topic']
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not timedelta(0) <= end - start < timedelta(days=ANALYTICS_MAX_DAYS):
+        return JsonResponse({'error': f'start must be on or before end, at most {ANALYTICS_MAX_DAYS} days apart'}, status=400)
+
+    summary = rollups.summarize(metric, start, end, group_by, **filters)
+    return JsonResponse(dict(summary, metric=metric, start=start.isoformat(), end=end.isoformat(), filters=filters))
+
+
+@login_required
+@require_http_methods(["GET"])
+def intent_report(request):
+    """
+    What students ask: replies per intent and source (staff only).
+
+    Query: start, end (ISO dates or datetimes, default the last
+    INTENT_REPORT_DEFAULT_HOURS hours), source and by_hour=1 for hourly
+    totals. Served from IntentRollup (intentstats.py).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    params = request.GET
+    source = params.get('source') or None
+    if source and source not in intentstats.SOURCES:
+        return JsonResponse({'error': f'Unknown source, expected one of {list(intentstats.SOURCES)}'}, status=400)
+    try:
+        end = _report_time(params['end']) if params.get('end') else timezone.now()
+        start = _report_time(params['start']) if params.get('start') else end - timedelta(hours=INTENT_REPORT_DEFAULT_HOURS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not timedelta(0) < end - start <= timedelta(days=ANALYTICS_MAX_DAYS):
+        return JsonResponse({'error': f'start must be before end, at most {ANALYTICS_MAX_DAYS} days apart'}, status=400)
+
+    summary = intentstats.report(start, end, source, by_hour=params.get('by_hour') == '1')
+    return JsonResponse(dict(summary, start=start.isoformat(), end=end.isoformat(), source=source))
+
+
+def _report_time(value: str):
+    when = datetime.fromisoformat(value)
+    return timezone.make_aware(when) if timezone.is_naive(when) else when
+
+
+@login_required
+@require_http_methods(["GET"])
+def llm_metrics(request):
+    """How this process answered LLM calls per endpoint: provider, hedge or local fallback (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return JsonResponse({'pid': os.getpid(), 'slo_enabled': hedging.enabled(), 'endpoints': hedging.metrics()})
@@ -0,0 +1,66 @@
+"""
+Worker warm-up.
+
+Runs the one-off work that would otherwise land on the first request a
+worker serves: compiling the intent rules, filling the model metadata and
+URL resolver caches, compiling the hot templates, importing the provider
+SDK when a key is configured, and any extra hooks listed in
+settings.AI_ASSISTANT_WARMUP_HOOKS (dotted paths to callables).
+
+Nothing here opens a database connection, so it is safe to run in a
+pre-fork master (see gunicorn.conf.py): workers inherit the warm caches
+copy-on-write instead of each paying for them.
+"""
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+
+from . import intents, providers
+
+WARMUP_TEMPLATES = ['base.html', 'ai_assistant/chat.html', 'ai_assistant/chat_list.html']
+
+
+def warm_up(verbose: bool = False) -> dict:
+    """Run every warm-up step once; returns the time each took, in milliseconds"""
+    timings = {}
+
+    def step(name, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f'AI assistant warm-up step {name} failed: {e}')
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def compile_intents():
+        intents.compiled_rules(False)
+        intents.compiled_rules(True)
+        intents.match_intent('hello')
+
+    def load_models():
+        for model in apps.get_models():
+            model._meta.get_fields()
+
+    def load_templates():
+        for name in getattr(settings, 'AI_ASSISTANT_WARMUP_TEMPLATES', WARMUP_TEMPLATES):
+            get_template(name)
+
+    step('intents', compile_intents)
+    step('models', load_models)
+    step('urls', lambda: get_resolver().reverse_dict)
+    step('templates', load_templates)
+    api_key = os.getenv('OPENAI_API_KEY')
+    if api_key:
+        step('openai', lambda: providers.get_openai(api_key))
+    for path in getattr(settings, 'AI_ASSISTANT_WARMUP_HOOKS', []):
+        step(path, import_string(path))
+
+    if verbose:
+        for name, ms in timings.items():
+            print(f'warm-up {name}: {ms} ms')
+    return timings
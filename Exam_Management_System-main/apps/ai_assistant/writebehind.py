@@ -0,0 +1,381 @@
+"""
+Write-behind persistence for chat messages.
+
+With AI_ASSISTANT_WRITE_BEHIND['ENABLED'], chat messages are not inserted
+one by one while the user waits. create_message() instead:
+
+1. numbers the message from a block of ids reserved from the table's own
+   primary key sequence (one write per ID_BLOCK messages), so broadcasts
+   and replies can refer to it straight away;
+2. appends it to this process's journal (JOURNAL_DIR, one line per
+   message, fsynced unless FSYNC is off) and to an in-memory buffer.
+
+A background thread stores the buffer with one bulk_create and one
+counter UPDATE per session (ChatSession.record_messages) whenever
+MAX_BATCH messages are waiting or FLUSH_SECONDS have passed. Each flush
+starts a new journal segment and deletes the previous one once its rows
+are committed.
+
+Journal segments are flock()ed by the process writing them. When a
+process starts buffering, it replays every segment nobody holds, i.e.
+those left behind by a crashed worker, skipping rows that were already
+stored. `manage.py replay_message_journal` does the same on demand.
+
+Reads in the writing process merge the buffer into the stored messages
+(session_messages, recent_messages). Other processes see a message once it
+is flushed, at most FLUSH_SECONDS later.
+
+Inside a transaction, on databases without a sequence to reserve ids
+from (anything but SQLite and PostgreSQL), and for messages carrying a
+client message id (idempotency.py), messages are written through.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from heapq import merge
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: live segments can't be told apart, so only replay on demand
+    fcntl = None
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+from . import sharding
+from .models import ChatMessage, ChatSession
+
+DEFAULTS = {
+    'ENABLED': False,
+    'JOURNAL_DIR': None,
+    'MAX_BATCH': 200,
+    'FLUSH_SECONDS': 0.5,
+    'ID_BLOCK': 100,
+    'FSYNC': True,
+}
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+SEGMENT_GLOB = 'messages-*.jsonl'
+
+
+def get_config() -> dict:
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AI_ASSISTANT_WRITE_BEHIND', {}))
+    return config
+
+
+def _order(message: ChatMessage):
+    return message.created_at, message.id
+
+
+def reserve_ids(count: int, using: str = 'default') -> Optional[List[int]]:
+    """Take count ids from ChatMessage's primary key sequence; None if the database has none we can advance"""
+    return sharding.reserve_ids(ChatMessage, count, using)
+
+
+def store(messages: Iterable[ChatMessage], skip_existing: bool = False) -> int:
+    """
+    Insert numbered messages and fold them into their sessions' counters.
+
+    Messages of sessions deleted in the meantime are dropped; with
+    skip_existing, so are ids already in the table (journal replay).
+    Returns how many rows were inserted.
+    """
+    by_database = defaultdict(list)
+    for message in messages:
+        by_database[message._state.db or 'default'].append(message)
+    return sum(_store(using, batch, skip_existing) for using, batch in by_database.items())
+
+
+def _store(using: str, messages: List[ChatMessage], skip_existing: bool) -> int:
+    """store() for the messages of one database (shard, see sharding.py)"""
+    live = set(ChatSession.objects.using(using).filter(id__in={m.session_id for m in messages})
+               .values_list('id', flat=True))
+    messages = [m for m in messages if m.session_id in live]
+    if skip_existing and messages:
+        existing = set(ChatMessage.objects.using(using).filter(id__in=[m.id for m in messages])
+                       .values_list('id', flat=True))
+        messages = [m for m in messages if m.id not in existing]
+    if not messages:
+        return 0
+
+    by_session = defaultdict(list)
+    for message in sorted(messages, key=_order):
+        by_session[message.session_id].append(message)
+    with transaction.atomic(using=using):
+        ChatMessage.objects.using(using).bulk_create(messages)
+        for session_id, session_messages in by_session.items():
+            ChatSession.record_messages(session_id, session_messages)
+    return len(messages)
+
+
+# -- journal --------------------------------------------------------------
+
+def _entry(message: ChatMessage) -> str:
+    return json.dumps({
+        'id': message.id,
+        'session_id': message.session_id,
+        'role': message.role,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'client_message_id': message.client_message_id,
+        'in_reply_to_id': message.in_reply_to_id,
+        'db': message._state.db or 'default',
+    }) + '\n'
+
+
+def _message(line: str) -> ChatMessage:
+    entry = json.loads(line)
+    entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+    using = entry.pop('db', 'default')
+    message = ChatMessage(**entry)
+    message._state.db = using
+    return message
+
+
+class Journal:
+    """This process's append-only journal, split into one segment per flush"""
+
+    def __init__(self, directory, fsync: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self._file = None
+        self._path = None
+
+    def append(self, message: ChatMessage):
+        if self._file is None:
+            name = f'{os.getpid()}-{time.time_ns()}.jsonl'
+            self._path = self.directory / f'messages-{name}'
+            if fcntl is None:
+                self._file = open(self._path, 'a', encoding='utf-8')
+            else:
+                segment = open(self.directory / f'new-{name}', 'a', encoding='utf-8')
+                fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # Only locked segments carry the name replay() looks for
+                os.rename(segment.name, self._path)
+                self._file = segment
+        self._file.write(_entry(message))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """Close the current segment to new entries; returns it (or None) for release()"""
+        segment = (self._file, self._path) if self._file is not None else None
+        self._file = self._path = None
+        return segment
+
+    @staticmethod
+    def release(segment):
+        """Delete a segment whose entries are all stored"""
+        file, path = segment
+        os.unlink(path)  # before closing, so no replay can lock it in between
+        file.close()
+
+
+def replay(directory, force: bool = False) -> Tuple[int, int]:
+    """
+    Store the entries of abandoned journal segments; returns (segments, rows stored).
+
+    A segment is abandoned when no process holds its lock. Without flock
+    (Windows) segments are only replayed with force, which must only be
+    used while no process is buffering.
+    """
+    directory = Path(directory)
+    if not directory.is_dir() or (fcntl is None and not force):
+        return 0, 0
+    segments = rows = 0
+    for path in sorted(directory.glob(SEGMENT_GLOB)):
+        try:
+            segment = open(path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            continue  # released while we listed the directory
+        with segment:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # its process is alive and still buffering
+            messages = []
+            for line in segment:
+                try:
+                    messages.append(_message(line))
+                except (ValueError, TypeError, KeyError):
+                    pass  # a line torn by the crash was never acknowledged
+            rows += store(messages, skip_existing=True)
+            segments += 1
+            os.unlink(path)
+    return segments, rows
+
+
+# -- buffer ---------------------------------------------------------------
+
+class MessageBuffer:
+    """Numbers, journals and buffers messages; a background thread stores them in batches"""
+
+    def __init__(self, journal_dir=None, max_batch: int = 200, flush_seconds: float = 0.5,
+                 id_block: int = 100, fsync: bool = True):
+        self.journal = Journal(journal_dir, fsync) if journal_dir else None
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self.id_block = id_block
+        self.stats = {'buffered': 0, 'stored': 0, 'flushes': 0, 'errors': 0}
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._ids: List[int] = []
+        self._pending: List[ChatMessage] = []
+        self._in_flight: List[ChatMessage] = []
+        self._segments = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='message-write-behind', daemon=True)
+        self._thread.start()
+
+    def add(self, session, role: str, content: str, **fields) -> ChatMessage:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Message buffer is closed')
+            if not self._ids:
+                self._ids = reserve_ids(self.id_block)
+            message = ChatMessage(id=self._ids.pop(0), session=session, role=role, content=content, **fields)
+            if self.journal is not None:
+                self.journal.append(message)
+            self._pending.append(message)
+            self.stats['buffered'] += 1
+            if len(self._pending) >= self.max_batch:
+                self._lock.notify_all()
+        return message
+
+    def pending(self, session_id: int) -> List[ChatMessage]:
+        """Messages of a session that may not be stored yet, oldest first"""
+        with self._lock:
+            return [m for m in self._in_flight + self._pending if m.session_id == session_id]
+
+    def flush(self) -> int:
+        """Store everything buffered so far; returns rows stored"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+                if self.journal is not None:
+                    segment = self.journal.rotate()
+                    if segment is not None:
+                        self._segments.append(segment)
+            if not batch:
+                return 0
+            try:
+                stored = store(batch)
+            except DatabaseError as e:
+                print('Chat message flush failed, will retry:', e)
+                connections.close_all()  # may be broken; the next flush reconnects
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._in_flight = []
+                    self.stats['errors'] += 1
+                return 0
+            with self._lock:
+                self._in_flight = []
+                segments, self._segments = self._segments, []
+                self.stats['stored'] += stored
+                self.stats['flushes'] += 1
+            for segment in segments:
+                Journal.release(segment)
+            return stored
+
+    def close(self):
+        """Stop the flusher after a last flush"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._lock.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._closed or len(self._pending) >= self.max_batch,
+                                    timeout=self.flush_seconds)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                print('Chat message flusher error:', e)
+            if closed:
+                connections.close_all()
+                return
+
+
+_buffer: Tuple[Optional[int], Optional[MessageBuffer]] = (None, None)
+_buffer_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(get_config()['ENABLED']) and connections['default'].vendor in SUPPORTED_VENDORS
+
+
+def get_buffer() -> Optional[MessageBuffer]:
+    """The calling process's buffer, started on first use; None when write-behind is off"""
+    global _buffer
+    if not enabled():
+        return None
+    pid, buffer = _buffer
+    if pid != os.getpid():
+        with _buffer_lock:
+            pid, buffer = _buffer
+            if pid != os.getpid():
+                config = get_config()
+                if config['JOURNAL_DIR']:
+                    segments, rows = replay(config['JOURNAL_DIR'])
+                    if segments:
+                        print(f'Replayed {rows} chat messages from {segments} abandoned journal segments')
+                buffer = MessageBuffer(config['JOURNAL_DIR'], config['MAX_BATCH'], config['FLUSH_SECONDS'],
+                                       config['ID_BLOCK'], config['FSYNC'])
+                atexit.register(buffer.close)
+                _buffer = (os.getpid(), buffer)
+    return buffer
+
+
+def create_message(session, role: str, content: str, **fields) -> ChatMessage:
+    """ChatMessage.objects.create, deferred to the buffer when write-behind is on"""
+    buffer = get_buffer()
+    # Inside a transaction the session row may not be committed yet (a draft
+    # chat's first message), so the flusher could not see it. A client
+    # message id must hit its unique constraint now (idempotency.py).
+    if (buffer is None or fields.get('client_message_id')
+            or connections[session._state.db or 'default'].in_atomic_block):
+        return session.messages.create(role=role, content=content, **fields)
+    return buffer.add(session, role, content, **fields)
+
+
+def pending_messages(session_id: int) -> List[ChatMessage]:
+    pid, buffer = _buffer
+    if buffer is None or pid != os.getpid():
+        return []
+    return buffer.pending(session_id)
+
+
+def _merge(stored: Iterable[ChatMessage], pending: List[ChatMessage]) -> Iterator[ChatMessage]:
+    seen = {m.id for m in pending}
+    # A message being flushed can show up both stored and pending
+    return merge((m for m in stored if m.id not in seen), pending, key=_order)
+
+
+def session_messages(session) -> Iterable[ChatMessage]:
+    """All messages of a session, oldest first, including buffered ones (lazy)"""
+    pending = pending_messages(session.id)
+    if not pending:
+        return session.messages.all()
+    return _merge(session.messages.order_by('created_at', 'id').iterator(), pending)
+
+
+def recent_messages(session, count: int) -> List[ChatMessage]:
+    """The newest count messages of a session, oldest first, including buffered ones"""
+    # Querysets don't support negative slicing: take the newest, then put them oldest first
+    stored = reversed(list(session.messages.order_by('-created_at', '-id')[:count]))
+    return list(_merge(stored, pending_messages(session.id)))[-count:]
@@ -0,0 +1,32 @@
+"""
+ASGI config for exam_system project.
+
+Serves regular HTTP through Django and the AI assistant's chat WebSockets
+through Channels.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
+
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from apps.ai_assistant.routing import websocket_urlpatterns  # noqa: E402
+from apps.ai_assistant.warmup import warm_up  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    ),
+})
+
+# Pay one-off initialisation costs now rather than on the first request
+warm_up()
@@ -21,6 +21,8 @@ ALLOWED_HOSTS = ['*']
 # Application definition
 
 INSTALLED_APPS = [
+    # Must come first: makes runserver serve ASGI (and the chat WebSockets)
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -46,6 +48,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Removes itself at startup unless AI_ASSISTANT_PROFILING['ENABLED']
+    'apps.ai_assistant.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'exam_system.urls'
@@ -67,6 +71,24 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'exam_system.wsgi.application'
+ASGI_APPLICATION = 'exam_system.asgi.application'
+
+# Channel layer used to push chat messages to every connected tab. The
+# in-process layer is enough for a single server process; set
+# CHANNEL_LAYER_REDIS_URL (requires channels_redis) to fan out across workers.
+if os.getenv('CHANNEL_LAYER_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('CHANNEL_LAYER_REDIS_URL')]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': os.getenv('CHANNEL_LAYER_BACKEND', 'channels.layers.InMemoryChannelLayer'),
+        }
+    }
 
 
 # Database
@@ -121,6 +143,174 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Outside DEBUG, collectstatic writes content-hashed copies (chat.3f2a1c.css),
+# so the web server can serve STATIC_ROOT with
+# "Cache-Control: max-age=31536000, immutable".
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exam-system',
+    }
+}
+
+# AI Assistant: lifetime of the cached chat message list / sidebar fragments.
+# Keys include the last message id, so new messages never serve stale HTML.
+AI_ASSISTANT_FRAGMENT_CACHE_SECONDS = int(os.getenv('AI_ASSISTANT_FRAGMENT_CACHE_SECONDS', '300'))
+
+# AI Assistant: how long a computed result prediction is served from cache
+# before its inputs are re-read (results written via signals invalidate sooner).
+# With the per-process LocMemCache above, every hit re-reads the inputs; a
+# shared cache (Redis, Memcached) lets hits skip the database.
+AI_ASSISTANT_PREDICTION_CACHE_SECONDS = int(os.getenv('AI_ASSISTANT_PREDICTION_CACHE_SECONDS', '3600'))
+
+# AI Assistant: most questions one request may ask generate_questions /
+# generate_practice to produce (responses stream, but generation still costs).
+AI_ASSISTANT_MAX_GENERATED_QUESTIONS = int(os.getenv('AI_ASSISTANT_MAX_GENERATED_QUESTIONS', '200'))
+AI_ASSISTANT_MAX_PRACTICE_QUESTIONS = int(os.getenv('AI_ASSISTANT_MAX_PRACTICE_QUESTIONS', '100'))
+
+# AI Assistant: seconds a worker keeps a subject set's question bank and
+# calibrations for practice tests (questionbank.py). Saved questions and new
+# calibration fits invalidate sooner, in every worker with a shared cache.
+AI_ASSISTANT_QUESTION_BANK_CACHE_SECONDS = int(os.getenv('AI_ASSISTANT_QUESTION_BANK_CACHE_SECONDS', '300'))
+
+# AI Assistant: extra callables (dotted paths) run by warmup.warm_up() before a
+# worker serves its first request, and the cold-start import budget enforced
+# by `manage.py profile_imports` (milliseconds, None to only report).
+AI_ASSISTANT_WARMUP_HOOKS = []
+
+# AI Assistant: opt-in request profiling (apps/ai_assistant/profiling.py).
+# Staff can force a profile with the X-Profile-Request header and browse
+# stored profiles in the admin at /admin/ai_assistant/profiles/.
+AI_ASSISTANT_PROFILING = {
+    'ENABLED': os.getenv('AI_ASSISTANT_PROFILING', '') == '1',
+    'SAMPLE_EVERY': int(os.getenv('AI_ASSISTANT_PROFILING_SAMPLE_EVERY', '0')),
+    'HEADER': 'X-Profile-Request',
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_PROFILES': 50,
+    'TRACEMALLOC': os.getenv('AI_ASSISTANT_PROFILING_TRACEMALLOC', '') == '1',
+}
+AI_ASSISTANT_IMPORT_BUDGET_MS = float(os.getenv('AI_ASSISTANT_IMPORT_BUDGET_MS')) if os.getenv('AI_ASSISTANT_IMPORT_BUDGET_MS') else None
+
+# AI Assistant: local CPU model (apps/ai_assistant/inference.py), served by
+# `manage.py run_inference_server` and shared by every web worker. Requests
+# arriving within MAX_WAIT_MS of each other run as one batch of up to MAX_BATCH.
+AI_ASSISTANT_LOCAL_MODEL = {
+    'ENABLED': os.getenv('AI_ASSISTANT_LOCAL_MODEL', '') == '1',
+    'PATH': os.getenv('AI_ASSISTANT_LOCAL_MODEL_PATH', str(BASE_DIR / 'apps/ai_assistant/local_models/tiny_chat.json')),
+    'CLASS': 'apps.ai_assistant.retrieval.RetrievalModel',
+    'ADDRESS': os.getenv('AI_ASSISTANT_LOCAL_MODEL_ADDRESS', '127.0.0.1:6010'),
+    'AUTHKEY': os.getenv('AI_ASSISTANT_LOCAL_MODEL_AUTHKEY', SECRET_KEY),
+    'MAX_BATCH': int(os.getenv('AI_ASSISTANT_LOCAL_MODEL_MAX_BATCH', '32')),
+    'MAX_WAIT_MS': float(os.getenv('AI_ASSISTANT_LOCAL_MODEL_MAX_WAIT_MS', '5')),
+    'TIMEOUT': float(os.getenv('AI_ASSISTANT_LOCAL_MODEL_TIMEOUT', '10')),
+}
+
+# AI Assistant: write-behind chat message persistence (apps/ai_assistant/writebehind.py).
+# Messages are journaled to JOURNAL_DIR and stored in batches by a background
+# thread; abandoned journals are replayed when a worker starts buffering.
+AI_ASSISTANT_WRITE_BEHIND = {
+    'ENABLED': os.getenv('AI_ASSISTANT_WRITE_BEHIND', '') == '1',
+    'JOURNAL_DIR': os.getenv('AI_ASSISTANT_WRITE_BEHIND_JOURNAL_DIR', str(BASE_DIR / 'message_journal')),
+    'MAX_BATCH': int(os.getenv('AI_ASSISTANT_WRITE_BEHIND_MAX_BATCH', '200')),
+    'FLUSH_SECONDS': float(os.getenv('AI_ASSISTANT_WRITE_BEHIND_FLUSH_SECONDS', '0.5')),
+    'ID_BLOCK': 100,
+    'FSYNC': os.getenv('AI_ASSISTANT_WRITE_BEHIND_FSYNC', '1') == '1',
+}
+
+# AI Assistant: latency SLO for OpenAI calls (apps/ai_assistant/hedging.py).
+# Past an endpoint's deadline (seconds) the local rule engine answers; a slow
+# attempt is hedged with a backup request, and a failing provider is skipped
+# while its circuit breaker is open. Staff see the counters at /ai_assistant/metrics/llm/.
+AI_ASSISTANT_LLM_SLO = {
+    'ENABLED': os.getenv('AI_ASSISTANT_LLM_SLO', '') == '1',
+    'DEADLINES': {
+        'chat': float(os.getenv('AI_ASSISTANT_LLM_CHAT_DEADLINE', '4')),
+        'chat_stream': float(os.getenv('AI_ASSISTANT_LLM_STREAM_DEADLINE', '3')),
+        'services': float(os.getenv('AI_ASSISTANT_LLM_SERVICES_DEADLINE', '8')),
+    },
+    'HEDGE_PERCENTILE': 0.9,
+    'MAX_HEDGES': 1,
+    'BREAKER_ERROR_RATE': 0.5,
+    'BREAKER_COOLDOWN': 30.0,
+}
+
+# AI Assistant: a chat message resent with the same client_message_id (double
+# submit, retry after a timeout) gets the first copy's reply instead of a new
+# one (apps/ai_assistant/idempotency.py). A resend waits up to WAIT_SECONDS for
+# a reply still being generated; after STALE_SECONDS it is answered afresh.
+AI_ASSISTANT_IDEMPOTENCY = {
+    'WAIT_SECONDS': float(os.getenv('AI_ASSISTANT_IDEMPOTENCY_WAIT_SECONDS', '20')),
+    'POLL_SECONDS': 0.2,
+    'STALE_SECONDS': float(os.getenv('AI_ASSISTANT_IDEMPOTENCY_STALE_SECONDS', '90')),
+}
+
+# AI Assistant: replies counted by question intent and source (rule engine,
+# local model or OpenAI) in per-process counters (apps/ai_assistant/intentstats.py),
+# flushed into hourly IntentRollup rows every FLUSH_SECONDS. Staff see them
+# at /ai_assistant/analytics/intents/.
+AI_ASSISTANT_INTENT_STATS = {
+    'ENABLED': os.getenv('AI_ASSISTANT_INTENT_STATS', '1') == '1',
+    'FLUSH_SECONDS': float(os.getenv('AI_ASSISTANT_INTENT_STATS_FLUSH_SECONDS', '60')),
+}
+
+# AI Assistant: item response theory calibration of exam questions and student
+# ability (apps/ai_assistant/calibration.py), fitted by `manage.py
+# calibrate_questions` (nightly, --incremental more often). Practice tests from
+# the question bank pick questions a student answers correctly with
+# probability TARGET_SUCCESS, drawn at random from the RANDOMESQUE times as
+# many best-matching questions as needed.
+AI_ASSISTANT_CALIBRATION = {
+    'TARGET_SUCCESS': float(os.getenv('AI_ASSISTANT_CALIBRATION_TARGET_SUCCESS', '0.7')),
+    'RANDOMESQUE': 3,
+    'MAX_ITERATIONS': 100,
+    'TOLERANCE': 1e-3,
+}
+
+# AI Assistant: pre-exam precomputation (apps/ai_assistant/precompute.py), run
+# by `manage.py precompute_exam_prep` (a long-running worker, or --once from
+# cron). Students with an exam within HORIZON_HOURS get their prediction,
+# weak areas and a practice test prepared during the OFF_PEAK windows (local time).
+AI_ASSISTANT_PRECOMPUTE = {
+    'HORIZON_HOURS': float(os.getenv('AI_ASSISTANT_PRECOMPUTE_HORIZON_HOURS', '24')),
+    'OFF_PEAK': os.getenv('AI_ASSISTANT_PRECOMPUTE_OFF_PEAK', '01:00-06:00').split(','),
+    'WORKERS': int(os.getenv('AI_ASSISTANT_PRECOMPUTE_WORKERS', '2')),
+    'JOBS_PER_MINUTE': float(os.getenv('AI_ASSISTANT_PRECOMPUTE_JOBS_PER_MINUTE', '120')),
+    'PRACTICE_QUESTIONS': 10,
+    'USE_OPENAI': os.getenv('AI_ASSISTANT_PRECOMPUTE_USE_OPENAI', '') == '1',
+    'POLL_SECONDS': 300,
+}
+
+# AI Assistant: chat data sharded by user across databases (apps/ai_assistant/sharding.py).
+# AI_ASSISTANT_CHAT_SHARDS=4 adds SQLite databases chat_0..chat_3 next to
+# db.sqlite3 (replace them with any database definitions). Then run
+# `manage.py migrate_chat_shards` and `manage.py rebalance_chat_shards`.
+AI_ASSISTANT_CHAT_SHARDS = int(os.getenv('AI_ASSISTANT_CHAT_SHARDS', '0'))
+for _shard in range(AI_ASSISTANT_CHAT_SHARDS):
+    DATABASES[f'chat_{_shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'chat_{_shard}.sqlite3',
+    }
+AI_ASSISTANT_SHARDING = {
+    'ENABLED': AI_ASSISTANT_CHAT_SHARDS > 0,
+    'SHARDS': [f'chat_{_shard}' for _shard in range(AI_ASSISTANT_CHAT_SHARDS)],
+    'VNODES': 64,
+    'ID_BLOCK': 100,
+}
+DATABASE_ROUTERS = ['apps.ai_assistant.sharding.ChatShardRouter']
+
 # Default primary key field type
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
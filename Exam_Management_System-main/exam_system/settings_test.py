@@ -0,0 +1,53 @@
+"""
+Settings for the test suite: in-memory SQLite, fast hashing, no network.
+
+Run the suite with pytest from this project directory (requirements-dev.txt):
+
+    python -m pytest                                   (parallel, see pytest.ini)
+    python -m pytest -n 0 apps/ai_assistant/tests/test_replay.py
+
+pytest.ini selects these settings. apps/ has no __init__.py, so the
+unittest loader behind `manage.py test` cannot find the tests; pytest
+imports them as namespace packages.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+# Never reach OpenAI from tests; use apps.ai_assistant.tests.stubs.StubLLM
+os.environ.pop('OPENAI_API_KEY', None)
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exam-system-tests',
+    }
+}
+
+CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
+
+# Templates reference static files that are never collected in tests
+STORAGES = {
+    **STORAGES,  # noqa: F405
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Reply counts are only stored by explicit intentstats.flush() calls
+AI_ASSISTANT_INTENT_STATS = {'ENABLED': True, 'FLUSH_SECONDS': 0}
+LOGGING = {'version': 1, 'disable_existing_loggers': True}
@@ -4,8 +4,11 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
+from apps.ai_assistant import urls as ai_assistant_urls
+
 urlpatterns = [
     path('', RedirectView.as_view(url='accounts/register/', permanent=False)),
+    path('admin/ai_assistant/', include(ai_assistant_urls.admin_urlpatterns)),
     path('admin/', admin.site.urls),
     path('accounts/', include('apps.accounts.urls')),
     path('attendance/', include('apps.attendance.urls')),
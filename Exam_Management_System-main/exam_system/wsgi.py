@@ -0,0 +1,19 @@
+"""
+WSGI config for exam_system project.
+
+Used by gunicorn (see gunicorn.conf.py). With preload_app the module is
+imported once in the master, so the warm-up below runs before workers fork.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
+
+application = get_wsgi_application()
+
+from apps.ai_assistant.warmup import warm_up  # noqa: E402
+
+# Pay one-off initialisation costs now rather than on the first request
+warm_up()
@@ -0,0 +1,58 @@
+"""
+Gunicorn configuration for production serving.
+
+    gunicorn                                    # threaded WSGI workers (exam_system.wsgi)
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn
+                                                # async ASGI workers (exam_system.asgi),
+                                                # also serves the chat WebSockets
+
+The app is preloaded in the master and warmed up there (see
+apps/ai_assistant/warmup.py), then the workers fork and share that memory
+copy-on-write. Everything is tunable from the environment:
+
+    GUNICORN_BIND           address to listen on (0.0.0.0:8000)
+    WEB_CONCURRENCY         worker processes (2 x CPUs + 1)
+    GUNICORN_THREADS        threads per WSGI worker (4; ignored by async workers)
+    GUNICORN_KEEPALIVE      seconds to hold idle keep-alive connections (5)
+    GUNICORN_TIMEOUT        seconds before a silent worker is restarted (60)
+    GUNICORN_MAX_REQUESTS   recycle a worker after this many requests (0 = never)
+    GUNICORN_WORKER_CLASS   gthread (default) or uvicorn.workers.UvicornWorker
+    GUNICORN_APP            override the application module
+"""
+import gc
+import multiprocessing
+import os
+
+ASYNC_WORKERS = ('uvicorn.workers.UvicornWorker',)
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+wsgi_app = os.getenv(
+    'GUNICORN_APP',
+    'exam_system.asgi:application' if worker_class in ASYNC_WORKERS else 'exam_system.wsgi:application',
+)
+
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # The app (and its warm-up) is loaded by now. Drop any database
+    # connection a warm-up hook opened, so no socket is shared across the
+    # fork, then move everything allocated so far out of the GC's reach:
+    # collections in the workers would otherwise touch (and un-share) it.
+    from django.db import connections
+
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+    server.log.info('App preloaded; %s workers x %s threads', server.cfg.workers, server.cfg.threads)
@@ -0,0 +1,80 @@
+"""
+Benchmark item response theory calibration (apps/ai_assistant/irt.py).
+
+    python scripts/bench_irt_calibration.py
+    python scripts/bench_irt_calibration.py --students 50000 --questions 5000 --per-student 60
+
+Simulates a cohort's answers, fits everyone from scratch, checks the
+estimates against the simulated parameters, folds a day of new answers
+in incrementally and times adaptive question selection.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# The engine needs no database, so Django is not set up here.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from apps.ai_assistant import irt  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--per-student', type=int, default=50)
+    parser.add_argument('--new-students', type=int, default=500, help='students answering again for the incremental fit')
+    parser.add_argument('--tolerance', type=float, default=1e-3)
+    parser.add_argument('--papers', type=int, default=10000, help='adaptive papers to select')
+    parser.add_argument('--paper-size', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    responses, (ability, difficulty, discrimination) = irt.Responses.synthetic(
+        args.students, args.questions, args.per_student, seed=args.seed)
+    print(f'{len(responses)} answers of {args.students} students to {args.questions} questions')
+
+    start = time.perf_counter()
+    fit = irt.fit(responses, tolerance=args.tolerance)
+    elapsed = time.perf_counter() - start
+    print(f'full fit: {elapsed:.2f} s, {fit.iterations} iterations, converged: {fit.converged}')
+    for name, estimate, truth in (('ability', fit.ability, ability), ('difficulty', fit.difficulty, difficulty),
+                                  ('discrimination', fit.discrimination, discrimination)):
+        print(f'  {name} correlation with the simulated values: {np.corrcoef(estimate, truth)[0, 1]:.3f}')
+
+    # A day later: some students answer questions they have not seen, and only they and those questions move
+    rng = np.random.default_rng(args.seed + 1)
+    who = rng.choice(args.students, args.new_students, replace=False)
+    s_new = np.repeat(who, 10)
+    q_new = rng.integers(args.questions, size=len(s_new))
+    p = irt.probability(ability[s_new], difficulty[q_new], discrimination[q_new])
+    y_new = rng.random(len(p)) < p
+    s_ids = np.concatenate([responses.student_labels[responses.students], s_new + 1])
+    q_ids = np.concatenate([responses.question_labels[responses.questions], q_new + 1])
+    combined = irt.Responses(s_ids, q_ids, np.concatenate([responses.correct, y_new]))
+    start = time.perf_counter()
+    involved = np.isin(combined.students, who) | np.isin(combined.questions, q_new)
+    subset = irt.Responses(s_ids[involved], q_ids[involved], combined.correct[involved])
+    update = irt.fit(subset, warm=fit, tolerance=args.tolerance,
+                     update_students=np.isin(subset.student_labels, who + 1),
+                     update_questions=np.isin(subset.question_labels, q_new + 1))
+    elapsed = time.perf_counter() - start
+    print(f'incremental fit of {len(s_new)} new answers ({len(subset)} answers involved): '
+          f'{elapsed:.2f} s, {update.iterations} iterations')
+    start = time.perf_counter()
+    full = irt.fit(combined, warm=fit, tolerance=args.tolerance)
+    elapsed = time.perf_counter() - start
+    print(f'warm full refit: {elapsed:.2f} s, {full.iterations} iterations')
+
+    start = time.perf_counter()
+    abilities = rng.normal(size=args.papers)
+    for theta in abilities:
+        irt.select_items(theta, fit.difficulty, fit.discrimination, args.paper_size, target=0.7, rng=rng)
+    elapsed = time.perf_counter() - start
+    print(f'{args.papers} adaptive papers of {args.paper_size}: {elapsed:.2f} s ({args.papers / elapsed:.0f} papers/s)')
+
+
+if __name__ == '__main__':
+    main()
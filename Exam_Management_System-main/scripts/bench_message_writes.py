@@ -0,0 +1,121 @@
+"""
+Benchmark chat message writes on SQLite, with and without the write-behind buffer.
+
+    python scripts/bench_message_writes.py
+    python scripts/bench_message_writes.py --messages 20000 --threads 16 --no-fsync
+
+Each mode writes the same messages from --threads threads into a fresh
+database file: "direct" with ChatMessage.objects.create (what send_message
+does without write-behind), "buffered" through
+apps/ai_assistant/writebehind.MessageBuffer with its journal. The buffered
+time includes the final flush, so both columns measure messages stored.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
+
+
+def setup_database(directory: str):
+    from django.conf import settings
+
+    settings.DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(directory, 'bench.sqlite3'),
+        'OPTIONS': {'timeout': 60},
+    }
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def run(mode: str, sessions, args, journal_dir: str) -> dict:
+    from django.db import connection
+    from apps.ai_assistant import writebehind
+    from apps.ai_assistant.models import ChatMessage
+
+    buffer = None
+    if mode == 'buffered':
+        buffer = writebehind.MessageBuffer(journal_dir, args.max_batch, args.flush_seconds, fsync=not args.no_fsync)
+        write = buffer.add
+    else:
+        def write(session, role, content):
+            return ChatMessage.objects.create(session=session, role=role, content=content)
+
+    per_thread = args.messages // args.threads
+    latencies = [[] for _ in range(args.threads)]
+
+    def worker(index):
+        try:
+            for i in range(per_thread):
+                session = sessions[(index + i * args.threads) % len(sessions)]
+                start = time.perf_counter()
+                write(session, 'user' if i % 2 == 0 else 'assistant', f'message {i} from thread {index}')
+                latencies[index].append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if buffer is not None:
+        buffer.close()
+    elapsed = time.perf_counter() - start
+
+    stored = ChatMessage.objects.count()
+    ChatMessage.objects.all().delete()
+    latency = sorted(x for per in latencies for x in per)
+    return {
+        'stored': stored,
+        'seconds': elapsed,
+        'per_second': stored / elapsed,
+        'p50_ms': statistics.median(latency) * 1000,
+        'p99_ms': latency[int(len(latency) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--max-batch', type=int, default=200)
+    parser.add_argument('--flush-seconds', type=float, default=0.5)
+    parser.add_argument('--no-fsync', action='store_true', help='do not fsync the journal after each message')
+    parser.add_argument('--modes', default='direct,buffered')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-messages-')
+    try:
+        setup_database(directory)
+        from django.contrib.auth import get_user_model
+        from apps.ai_assistant.models import ChatSession
+
+        user = get_user_model().objects.create_user(username='bench', password='bench-password')
+        ChatSession.objects.bulk_create([ChatSession(user=user, title=f'Bench {i}') for i in range(args.sessions)])
+        sessions = list(ChatSession.objects.all())
+
+        print(f'{args.messages} messages, {args.threads} threads, {args.sessions} sessions, SQLite file')
+        print(f"{'mode':<10} {'stored':>7} {'seconds':>8} {'msg/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in args.modes.split(','):
+            r = run(mode, sessions, args, os.path.join(directory, 'journal'))
+            print(f"{mode:<10} {r['stored']:>7} {r['seconds']:>8.2f} {r['per_second']:>9.0f} "
+                  f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
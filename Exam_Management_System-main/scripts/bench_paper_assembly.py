@@ -0,0 +1,80 @@
+"""
+Benchmark randomized paper assembly (apps/ai_assistant/assembly.py).
+
+    python scripts/bench_paper_assembly.py
+    python scripts/bench_paper_assembly.py --variants 10000 --pool 5000 --questions 40 --max-overlap 0.25
+
+Builds a synthetic pool, assembles the variants and checks every one of
+them against the constraints, including pairwise overlap.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+# The engine needs no database, so Django is not set up here.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from apps.ai_assistant.assembly import PaperAssembler, PaperSpec, QuestionPool  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', type=int, default=10000)
+    parser.add_argument('--pool', type=int, default=5000)
+    parser.add_argument('--topics', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=40, help='questions per paper (a multiple of --topics)')
+    parser.add_argument('--total-marks', type=int, default=120)
+    parser.add_argument('--tolerance', type=int, default=0)
+    parser.add_argument('--max-overlap', type=float, default=0.25)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    pool = QuestionPool.synthetic(args.pool, topics=args.topics, seed=args.seed)
+    per_topic = args.questions // args.topics
+    hard = args.questions // 5
+    spec = PaperSpec(
+        topic_counts={label: per_topic for label in pool.topic_labels},
+        difficulty_mix={'easy': args.questions - 2 * hard, 'medium': hard, 'hard': hard},
+        total_marks=args.total_marks,
+        marks_tolerance=args.tolerance,
+        max_overlap=args.max_overlap,
+    )
+    assembler = PaperAssembler(pool, spec, seed=args.seed)
+
+    start = time.perf_counter()
+    first = None
+    variants = []
+    for variant in assembler.generate(args.variants):
+        if first is None:
+            first = time.perf_counter() - start
+        variants.append(variant)
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(variants)} variants of {spec.size} questions from a pool of {len(pool)}')
+    print(f'first variant after {first * 1000:.1f} ms; all in {elapsed:.2f} s ({len(variants) / elapsed:.0f} variants/s)')
+    print('stats:', assembler.stats)
+
+    # Verify every constraint independently of the engine
+    index = {qid: i for i, qid in enumerate(pool.ids.tolist())}
+    membership = np.zeros((len(variants), len(pool)), dtype=np.float32)
+    for v in variants:
+        rows = [index[q] for q in v.question_ids]
+        membership[v.index, rows] = 1
+        topics = Counter(pool.topic_labels[pool.topics[rows]].tolist())
+        levels = Counter(pool.difficulty_labels[pool.difficulties[rows]].tolist())
+        assert topics == Counter(spec.topic_counts), topics
+        assert levels == Counter(spec.difficulty_mix), levels
+        assert abs(v.total_marks - spec.total_marks) <= spec.marks_tolerance
+        assert len(set(rows)) == spec.size
+    shared = membership @ membership.T
+    np.fill_diagonal(shared, 0)
+    print(f'max questions shared by two variants: {int(shared.max())} (limit {int(spec.max_overlap * spec.size)})')
+    assert shared.max() <= int(spec.max_overlap * spec.size)
+    print('all constraints hold')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Compare `runserver` against the production gunicorn setup under concurrent load.
+
+    python scripts/bench_serving.py --requests 2000 --concurrency 32
+    python scripts/bench_serving.py --servers gunicorn --path /ai_assistant/chat/ --path /admin/login/
+
+Each server is started on a free local port, the first response after it
+starts accepting connections is timed separately (cold start), then the
+paths are requested round-robin from --concurrency threads over keep-alive
+connections. Any response below 500 counts as a success, so login
+redirects are fine to benchmark.
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_command(name: str, port: int, args) -> list:
+    if name == 'runserver':
+        return [sys.executable, '-m', 'django', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(PROJECT_ROOT, 'gunicorn.conf.py'),
+               '--bind', f'127.0.0.1:{port}', '--access-logfile', os.devnull]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    if name == 'gunicorn-async':
+        command += ['--worker-class', 'uvicorn.workers.UvicornWorker', 'exam_system.asgi:application']
+    return command
+
+
+def request(conn: http.client.HTTPConnection, path: str) -> int:
+    conn.request('GET', path, headers={'Host': 'localhost'})
+    response = conn.getresponse()
+    response.read()
+    if response.getheader('Connection', '').lower() == 'close':
+        conn.close()
+    return response.status
+
+
+def wait_until_serving(port: int, path: str, timeout: float) -> float:
+    """Returns the latency (ms) of the first successful response"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                pass
+        except OSError:
+            time.sleep(0.05)
+            continue
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        start = time.perf_counter()
+        try:
+            request(conn, path)
+            return (time.perf_counter() - start) * 1000
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.05)
+        finally:
+            conn.close()
+    raise RuntimeError(f'server on port {port} did not start within {timeout}s')
+
+
+def run_load(port: int, paths: list, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        failed = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            try:
+                status = request(conn, paths[i % len(paths)])
+                if status >= 500:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': quantiles[49],
+        'p95': quantiles[94],
+        'p99': quantiles[98],
+        'errors': errors[0],
+    }
+
+
+def bench(name: str, args) -> dict:
+    port = free_port()
+    pythonpath = os.pathsep.join(filter(None, [PROJECT_ROOT, os.getenv('PYTHONPATH')]))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=args.settings, PYTHONPATH=pythonpath)
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(server_command(name, port, args), cwd=PROJECT_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=log)
+    try:
+        started = time.perf_counter()
+        try:
+            first_ms = wait_until_serving(port, args.path[0], args.startup_timeout)
+        except RuntimeError:
+            log.seek(0)
+            sys.stderr.write(log.read().decode(errors='replace')[-4000:])
+            raise
+        result = {'startup_s': time.perf_counter() - started, 'first_ms': first_ms}
+        run_load(port, args.path, min(args.requests, 50), args.concurrency)  # settle
+        result.update(run_load(port, args.path, args.requests, args.concurrency))
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', default=['runserver', 'gunicorn'],
+                        choices=['runserver', 'gunicorn', 'gunicorn-async'])
+    parser.add_argument('--path', action='append', help='path to request (repeatable); default /ai_assistant/')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, help='override WEB_CONCURRENCY for gunicorn')
+    parser.add_argument('--settings', default=os.getenv('DJANGO_SETTINGS_MODULE', 'exam_system.settings'))
+    parser.add_argument('--startup-timeout', type=float, default=30)
+    args = parser.parse_args()
+    args.path = args.path or ['/ai_assistant/']
+
+    print(f'{args.requests} requests, concurrency {args.concurrency}, paths {args.path}')
+    print(f'{"server":<16}{"startup s":>10}{"first ms":>10}{"req/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}')
+    for name in args.servers:
+        r = bench(name, args)
+        print(f'{name:<16}{r["startup_s"]:>10.2f}{r["first_ms"]:>10.1f}{r["rps"]:>10.0f}'
+              f'{r["p50"]:>9.1f}{r["p95"]:>9.1f}{r["p99"]:>9.1f}{r["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark chat message writes against the number of SQLite shards.
+
+    python scripts/bench_shard_writes.py
+    python scripts/bench_shard_writes.py --shards 1,2,4,8 --messages 8000 --processes 16
+
+For each shard count a fresh set of database files is created ('default'
+plus the shards, see apps/ai_assistant/sharding.py) and --processes
+processes (like web server workers) send messages into the sessions of
+--users users, the way send_message does without write-behind: one INSERT
+and one session counter UPDATE per message, each committed on its own.
+With one shard every writer queues for the same SQLite write lock; with
+more, writers of different users' chats commit in parallel, as far as
+there are cores (and disks) to run them on.
+
+Each shard count runs in its own process, since Django reads DATABASES once.
+"""
+import argparse
+import json
+import os
+import shutil
+import multiprocessing
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
+
+
+def setup_databases(directory: str, shard_count: int):
+    from django.conf import settings
+
+    def sqlite(name):
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, name), 'OPTIONS': {'timeout': 60}}
+
+    settings.DATABASES['default'] = sqlite('default.sqlite3')
+    shards = [f'chat_{i}' for i in range(shard_count)]
+    for alias in shards:
+        settings.DATABASES[alias] = sqlite(f'{alias}.sqlite3')
+    settings.AI_ASSISTANT_SHARDING = {'ENABLED': True, 'SHARDS': shards, 'ID_BLOCK': 1000}
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    call_command('migrate_chat_shards', verbosity=0, stdout=open(os.devnull, 'w'))
+
+
+def run_worker(args) -> dict:
+    directory = tempfile.mkdtemp(prefix='bench-shards-')
+    try:
+        setup_databases(directory, args.worker)
+        from django.contrib.auth import get_user_model
+        from django.db import connection, connections
+        from apps.ai_assistant import sharding
+
+        User = get_user_model()
+        User.objects.bulk_create([User(username=f'bench{i}') for i in range(args.users)])
+        sessions = [user.chat_sessions.create(title='Bench') for user in User.objects.all()]
+        per_shard = {alias: sum(s._state.db == alias for s in sessions) for alias in sharding.shards()}
+
+        per_process = args.messages // args.processes
+        connections.close_all()  # not shared with the forked workers
+
+        def worker(index, results):
+            latencies = []
+            for i in range(per_process):
+                session = sessions[(index + i * args.processes) % len(sessions)]
+                start = time.perf_counter()
+                session.messages.create(role='user' if i % 2 == 0 else 'assistant',
+                                        content=f'message {i} from process {index}')
+                latencies.append(time.perf_counter() - start)
+            results.put(latencies)
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(i, results)) for i in range(args.processes)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        latencies = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        from apps.ai_assistant.models import ChatMessage
+        stored = sharding.count(ChatMessage.objects.all())
+        connection.close()
+        latency = sorted(x for per in latencies for x in per)
+        return {
+            'shards': args.worker,
+            'stored': stored,
+            'seconds': elapsed,
+            'per_second': stored / elapsed,
+            'p50_ms': statistics.median(latency) * 1000,
+            'p99_ms': latency[int(len(latency) * 0.99) - 1] * 1000,
+            'users_per_shard': sorted(per_shard.values()),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', default='1,2,4,8', help='Shard counts to compare')
+    parser.add_argument('--messages', type=int, default=4000)
+    parser.add_argument('--processes', type=int, default=16)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    print(f'{args.messages} messages, {args.processes} processes, {args.users} users, SQLite files')
+    print(f"{'shards':>6} {'stored':>7} {'seconds':>8} {'msg/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    baseline = None
+    for count in [int(c) for c in args.shards.split(',')]:
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', str(count), '--messages', str(args.messages),
+             '--processes', str(args.processes), '--users', str(args.users)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        baseline = baseline or r['per_second']
+        print(f"{r['shards']:>6} {r['stored']:>7} {r['seconds']:>8.2f} {r['per_second']:>9.0f} "
+              f"{r['per_second'] / baseline:>7.2f}x {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,7 @@
 import os
 import sys
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
-# Ensure project root is on sys.path
+# Ensure project root is on sys.path (no django.setup(): the rule engine needs no database)
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import django
-django.setup()
 
 from types import SimpleNamespace
 from apps.ai_assistant.utils import get_local_ai_response
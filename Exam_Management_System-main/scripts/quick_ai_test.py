@@ -1,11 +1,9 @@
 import os
-import django
 import sys
 
-# Ensure project root is on sys.path so `exam_system` imports correctly
+# Ensure project root is on sys.path so `apps` imports correctly.
+# The rule engine needs no database, so Django is not set up here.
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_system.settings')
-django.setup()
 from apps.ai_assistant.utils import get_local_ai_response, get_ai_response
 
 questions = [